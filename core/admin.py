@@ -1 +1,9 @@
+from django.contrib import admin
 
+from core.models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('task', 'key', 'status', 'attempts', 'run_after', 'created_at')
+    list_filter = ('status', 'task')
@@ -0,0 +1,79 @@
+"""
+Read-replica routing for the project.
+
+Writes always go to the default database. Reads go to one of the aliases in
+DATABASE_REPLICAS only inside views decorated with @replica_reads, and only
+for GET and HEAD requests from clients that have not written recently. The
+replica is picked once per view, so all reads of a request see the same lag.
+ReadYourWritesMiddleware pins a client to the primary for
+READ_YOUR_WRITES_SECONDS after each unsafe request, so users see their own
+votes and edits even while the replicas lag behind.
+"""
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Callable, Iterator, List, Optional
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.http import HttpRequest
+
+# Replica serving the reads of the current block, None for the primary
+_replica_alias: ContextVar[Optional[str]] = ContextVar("replica_alias", default=None)
+
+
+def get_replica_aliases() -> List[str]:
+    """Return the configured read-replica database aliases."""
+    return list(getattr(settings, "DATABASE_REPLICAS", []))
+
+
+def get_read_alias() -> Optional[str]:
+    """Return the replica serving the reads of the current block, None for the primary."""
+    return _replica_alias.get()
+
+
+@contextmanager
+def use_replica(alias: Optional[str]) -> Iterator[None]:
+    """Serve the reads inside the block from the given replica, or from the primary if None."""
+    token = _replica_alias.set(alias)
+    try:
+        yield
+    finally:
+        _replica_alias.reset(token)
+
+
+@contextmanager
+def use_replicas(enabled: bool = True) -> Iterator[None]:
+    """Serve the reads inside the block from one replica, or from the primary if not enabled."""
+    replicas = get_replica_aliases()
+    with use_replica(random.choice(replicas) if enabled and replicas else None):
+        yield
+
+
+def replica_reads(view: Callable) -> Callable:
+    """Serve the reads of a view from a replica when the request allows it."""
+    @wraps(view)
+    def wrapper(request: HttpRequest, *args, **kwargs):
+        with use_replicas(getattr(request, "replica_reads_allowed", False)):
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class PrimaryReplicaRouter:
+    """Send writes to the primary and reads of replica-enabled views to a replica."""
+
+    def db_for_read(self, model, **hints):
+        return _replica_alias.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Every alias holds the same data, so objects may relate across them
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive the schema through replication
+        return db not in get_replica_aliases()
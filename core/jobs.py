@@ -0,0 +1,215 @@
+"""
+Background jobs for work that should not run inside a request.
+
+Functions decorated with @task can be enqueued as Job rows and are executed
+by the run_workers management command on a thread pool. Jobs enqueued with
+a key are deduplicated while pending, failed jobs are retried with
+exponential backoff, and jobs left running by a stopped worker are
+requeued after JOB_STALE_TIMEOUT seconds.
+
+Set JOB_QUEUE_EAGER = True to run jobs right after the enqueuing
+transaction commits instead, e.g. in development without a worker.
+"""
+
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Count, F, Min
+from django.utils import timezone
+
+from .models import Job
+
+DEFAULT_MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 10
+MAX_RETRY_DELAY = 60 * 60
+DEFAULT_STALE_TIMEOUT = 15 * 60
+
+TASKS: Dict[str, Callable[..., Any]] = {}
+
+
+def task(name: Optional[str] = None) -> Callable:
+    """Register a function so it can be enqueued by name."""
+    def decorator(func: Callable) -> Callable:
+        func.task_name = name or f"{func.__module__}.{func.__name__}"
+        TASKS[func.task_name] = func
+        return func
+    return decorator
+
+
+def enqueue(
+    func: Callable,
+    key: Optional[str] = None,
+    delay: float = 0,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    **payload: Any,
+) -> Optional[Job]:
+    """Queue a call of a registered task.
+
+    Args:
+        func: A function decorated with @task.
+        key: Deduplication key; nothing is queued while a job with the same
+            key is pending.
+        delay: Seconds to wait before the job may run.
+        max_attempts: Runs before the job is marked as failed.
+        **payload: JSON-serializable keyword arguments for the task.
+
+    Returns:
+        The new job, or None if it was merged into a pending one.
+    """
+    if getattr(settings, "JOB_QUEUE_EAGER", False):
+        transaction.on_commit(lambda: func(**payload))
+        return None
+
+    if key is not None and Job.objects.filter(key=key, status=Job.PENDING).exists():
+        return None
+    try:
+        with transaction.atomic():
+            return Job.objects.create(
+                task=func.task_name,
+                key=key,
+                payload=payload,
+                max_attempts=max_attempts,
+                run_after=timezone.now() + timedelta(seconds=delay),
+            )
+    except IntegrityError:
+        # Another request queued the same key in the meantime
+        return None
+
+
+def claim_jobs(limit: int) -> List[Job]:
+    """Mark up to limit due jobs as running and return them."""
+    now = timezone.now()
+    candidate_ids = list(
+        Job.objects.filter(status=Job.PENDING, run_after__lte=now)
+        .order_by("run_after", "id")
+        .values_list("id", flat=True)[:limit]
+    )
+    # The status check makes the claim safe when several workers poll at once
+    claimed_ids = [
+        job_id for job_id in candidate_ids
+        if Job.objects.filter(pk=job_id, status=Job.PENDING).update(
+            status=Job.RUNNING, locked_at=now, attempts=F("attempts") + 1
+        )
+    ]
+    return list(Job.objects.filter(pk__in=claimed_ids).order_by("run_after", "id"))
+
+
+def run_job(job: Job) -> bool:
+    """Execute a claimed job and return whether it succeeded."""
+    try:
+        func = TASKS.get(job.task)
+        if func is None:
+            raise LookupError(f"Unknown task '{job.task}'")
+        func(**job.payload)
+    except Exception:
+        _retry_or_fail(job, traceback.format_exc())
+        return False
+    job.delete()
+    return True
+
+
+def _run_in_worker_thread(job: Job) -> bool:
+    """Run a job and release the database connections of the worker thread."""
+    try:
+        return run_job(job)
+    except Exception:
+        # Bookkeeping failed; the job stays running until requeue_stale_jobs retries it
+        return False
+    finally:
+        connections.close_all()
+
+
+def _retry_or_fail(job: Job, error: str) -> None:
+    """Schedule another attempt with backoff, or mark the job as failed."""
+    job.last_error = error
+    job.locked_at = None
+    if job.attempts >= job.max_attempts:
+        job.status = Job.FAILED
+        job.save(update_fields=["status", "locked_at", "last_error"])
+        return
+
+    delay = min(RETRY_BASE_DELAY * 2 ** max(job.attempts - 1, 0), MAX_RETRY_DELAY)
+    job.status = Job.PENDING
+    job.run_after = timezone.now() + timedelta(seconds=delay)
+    try:
+        with transaction.atomic():
+            job.save(update_fields=["status", "run_after", "locked_at", "last_error"])
+    except IntegrityError:
+        # A newer job with the same key is pending and will redo the work
+        job.delete()
+
+
+def requeue_stale_jobs(timeout: Optional[float] = None) -> int:
+    """Retry jobs whose worker stopped while running them and return their number."""
+    timeout = timeout or getattr(settings, "JOB_STALE_TIMEOUT", DEFAULT_STALE_TIMEOUT)
+    stale_jobs = list(Job.objects.filter(
+        status=Job.RUNNING, locked_at__lt=timezone.now() - timedelta(seconds=timeout)
+    ))
+    for job in stale_jobs:
+        _retry_or_fail(job, "Worker stopped while running the job")
+    return len(stale_jobs)
+
+
+def get_queue_stats() -> Dict[str, Any]:
+    """Return the queue depth by status and the age of the oldest due job."""
+    now = timezone.now()
+    counts = dict(Job.objects.values_list("status").annotate(count=Count("id")).order_by())
+    due = Job.objects.filter(status=Job.PENDING, run_after__lte=now).aggregate(
+        count=Count("id"), oldest=Min("run_after")
+    )
+    return {
+        "pending": counts.get(Job.PENDING, 0),
+        "due": due["count"],
+        "running": counts.get(Job.RUNNING, 0),
+        "failed": counts.get(Job.FAILED, 0),
+        "oldest_due_seconds": (now - due["oldest"]).total_seconds() if due["oldest"] else None,
+    }
+
+
+def run_workers(
+    workers: int,
+    poll_interval: float = 1.0,
+    once: bool = False,
+    report: Optional[Callable[[Dict[str, Any]], None]] = None,
+    report_interval: float = 60.0,
+) -> int:
+    """Run queued jobs on a thread pool until stopped.
+
+    Args:
+        workers: Number of jobs executed concurrently.
+        poll_interval: Seconds between polls while the queue is empty.
+        once: Return as soon as no due job is left.
+        report: Called with the queue stats every report_interval seconds.
+        report_interval: Seconds between two reports and stale-job checks.
+
+    Returns:
+        The number of jobs that ran successfully.
+    """
+    succeeded = 0
+    active = set()
+    next_report = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job-worker") as pool:
+        while True:
+            if time.monotonic() >= next_report:
+                requeue_stale_jobs()
+                if report:
+                    report(get_queue_stats())
+                next_report = time.monotonic() + report_interval
+
+            free_slots = workers - len(active)
+            if free_slots:
+                active.update(pool.submit(_run_in_worker_thread, job) for job in claim_jobs(free_slots))
+
+            if not active:
+                if once:
+                    return succeeded
+                time.sleep(poll_interval)
+                continue
+
+            done, active = wait(active, timeout=poll_interval, return_when=FIRST_COMPLETED)
+            succeeded += sum(future.result() for future in done)
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from core.jobs import get_queue_stats, run_workers
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs on a pool of worker threads."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4, help="Jobs run concurrently")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds between polls of an empty queue")
+        parser.add_argument("--report-interval", type=float, default=60.0, help="Seconds between queue depth reports")
+        parser.add_argument("--once", action="store_true", help="Exit when no due job is left")
+        parser.add_argument("--status", action="store_true", help="Only print the queue depth")
+
+    def handle(self, *args, **options):
+        if options["status"]:
+            self._report(get_queue_stats())
+            return
+
+        succeeded = run_workers(
+            workers=options["workers"],
+            poll_interval=options["poll_interval"],
+            once=options["once"],
+            report=self._report,
+            report_interval=options["report_interval"],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Ran {succeeded} jobs."))
+
+    def _report(self, stats):
+        oldest = stats["oldest_due_seconds"]
+        self.stdout.write(
+            f"Queue: {stats['pending']} pending ({stats['due']} due"
+            + (f", oldest {oldest:.0f}s" if oldest is not None else "")
+            + f"), {stats['running']} running, {stats['failed']} failed."
+        )
@@ -0,0 +1,121 @@
+"""
+Middleware for the project.
+
+Serves collected static files with precompressed variants picked from the
+Accept-Encoding header and far-future immutable caching for hashed names,
+and pins clients that just wrote to the primary database.
+"""
+
+import mimetypes
+import os
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.http import FileResponse, HttpRequest, HttpResponse
+from django.utils._os import safe_join
+
+# Preferred content encodings and the file suffix of their variants
+ENCODING_SUFFIXES = (("br", ".br"), ("gzip", ".gz"))
+
+# Present while a client must read its own writes from the primary database
+PRIMARY_PIN_COOKIE = "primary_pin"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS", "TRACE")
+
+
+class PrecompressedStaticMiddleware:
+    """Serve files from STATIC_ROOT, preferring precompressed variants."""
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]) -> None:
+        self.get_response = get_response
+        self.static_prefix = "/" + settings.STATIC_URL.lstrip("/")
+        self.max_age = getattr(settings, "STATIC_CACHE_MAX_AGE", 60 * 60 * 24 * 365)
+        self._hashed_names: Optional[frozenset] = None
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        name = self._get_static_name(request)
+        path = self._get_file_path(name) if name else None
+        if path is None:
+            return self.get_response(request)
+        return self._serve(request, name, path)
+
+    def _get_static_name(self, request: HttpRequest) -> Optional[str]:
+        """Return the requested static file name, or None for other requests."""
+        if request.method not in ("GET", "HEAD"):
+            return None
+        if not request.path.startswith(self.static_prefix):
+            return None
+        return request.path[len(self.static_prefix):]
+
+    def _get_file_path(self, name: str) -> Optional[str]:
+        """Return the collected file for the name, or None if there is none."""
+        if not settings.STATIC_ROOT:
+            return None
+        try:
+            path = safe_join(settings.STATIC_ROOT, name)
+        except ValueError:
+            return None
+        return path if os.path.isfile(path) else None
+
+    def _serve(self, request: HttpRequest, name: str, path: str) -> HttpResponse:
+        """Build the file response with encoding and cache headers."""
+        encoding, variant_path = _choose_variant(request, path)
+        content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        response = FileResponse(open(variant_path, "rb"), content_type=content_type)
+        if encoding:
+            response["Content-Encoding"] = encoding
+        response["Vary"] = "Accept-Encoding"
+        response["Cache-Control"] = self._get_cache_control(name)
+        return response
+
+    def _get_cache_control(self, name: str) -> str:
+        """Cache hashed files forever and make others revalidate."""
+        if name in self._get_hashed_names():
+            return f"public, max-age={self.max_age}, immutable"
+        return "public, max-age=0, must-revalidate"
+
+    def _get_hashed_names(self) -> frozenset:
+        """Return the hashed file names of the manifest, read once per process."""
+        if self._hashed_names is None:
+            self._hashed_names = frozenset(getattr(staticfiles_storage, "hashed_files", {}).values())
+        return self._hashed_names
+
+
+def _choose_variant(request: HttpRequest, path: str) -> tuple[Optional[str], str]:
+    """Return the best encoding the client accepts and the file serving it."""
+    accepted = _parse_accept_encoding(request.headers.get("Accept-Encoding", ""))
+    for encoding, suffix in ENCODING_SUFFIXES:
+        if encoding in accepted and os.path.isfile(path + suffix):
+            return encoding, path + suffix
+    return None, path
+
+
+def _parse_accept_encoding(header: str) -> set[str]:
+    """Return the encodings an Accept-Encoding header allows."""
+    accepted = set()
+    for part in header.split(","):
+        encoding, _, params = part.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0"):
+            continue
+        accepted.add(encoding.strip().lower())
+    return accepted
+
+
+class ReadYourWritesMiddleware:
+    """Allow replica reads only for clients that have not written recently."""
+
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]) -> None:
+        self.get_response = get_response
+        self.window = getattr(settings, "READ_YOUR_WRITES_SECONDS", 10)
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        request.replica_reads_allowed = (
+            request.method in ("GET", "HEAD") and PRIMARY_PIN_COOKIE not in request.COOKIES
+        )
+        response = self.get_response(request)
+        if request.method not in SAFE_METHODS:
+            # The browser drops the cookie when the window is over
+            response.set_cookie(
+                PRIMARY_PIN_COOKIE, "1", max_age=self.window, httponly=True, samesite="Lax"
+            )
+        return response
@@ -0,0 +1,38 @@
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """A unit of deferred work waiting for or handled by a run_workers process."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (FAILED, 'Failed'),
+    )
+
+    task = models.CharField(max_length=100)
+    # Jobs sharing a key are merged while pending, e.g. one re-render per game
+    key = models.CharField(max_length=255, blank=True, null=True)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['key'], condition=Q(status='pending'), name='core_job_unique_pending_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.task} ({self.status})"
@@ -0,0 +1,50 @@
+"""
+Static file storage for the project.
+
+Extends the staticfiles manifest storage so that collectstatic writes
+content-hashed file names together with precompressed gzip and Brotli
+variants, which are served by the precompressed static middleware.
+"""
+
+import gzip
+from typing import Any, Iterator
+
+import brotli
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+COMPRESSIBLE_EXTENSIONS = (".css", ".js", ".json", ".map", ".svg", ".txt", ".ico", ".xml")
+MIN_COMPRESS_SIZE = 256
+
+
+class PrecompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Manifest storage that also writes .gz and .br variants of hashed files."""
+
+    def post_process(self, *args: Any, **kwargs: Any) -> Iterator[tuple]:
+        yield from super().post_process(*args, **kwargs)
+        if kwargs.get("dry_run"):
+            return
+
+        for hashed_name in set(self.hashed_files.values()):
+            self._write_compressed_variants(hashed_name)
+
+    def _write_compressed_variants(self, name: str) -> None:
+        """Write every compressed variant of a file that is worth keeping."""
+        if not name.endswith(COMPRESSIBLE_EXTENSIONS) or not self.exists(name):
+            return
+
+        with self.open(name) as original:
+            content = original.read()
+        if len(content) < MIN_COMPRESS_SIZE:
+            return
+
+        self._save_variant(f"{name}.gz", content, gzip.compress(content, mtime=0))
+        self._save_variant(f"{name}.br", content, brotli.compress(content))
+
+    def _save_variant(self, name: str, original: bytes, compressed: bytes) -> None:
+        """Store a compressed variant if it is smaller than the original."""
+        if len(compressed) >= len(original):
+            return
+        if self.exists(name):
+            self.delete(name)
+        self._save(name, ContentFile(compressed))
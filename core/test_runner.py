@@ -0,0 +1,24 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """Run the tests with settings that suit a test run rather than a deployment."""
+
+    # Tests render pages without running collectstatic first and write buffered
+    # search logs themselves instead of from a background thread
+    test_settings = override_settings(
+        STORAGES={
+            'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+            'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+        },
+        SEARCH_LOG_BACKGROUND_FLUSH=False,
+    )
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.test_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.test_settings.disable()
+        super().teardown_test_environment(**kwargs)
@@ -1 +1,272 @@
+import io
+import os
+import sqlite3
+import tempfile
+from datetime import timedelta
 
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from core.db_router import PrimaryReplicaRouter, use_replicas
+from core.jobs import (
+    RETRY_BASE_DELAY,
+    claim_jobs,
+    enqueue,
+    get_queue_stats,
+    requeue_stale_jobs,
+    run_job,
+    task,
+)
+from core.middleware import PRIMARY_PIN_COOKIE
+from core.models import Job
+from core.throttling import DEFAULT_THROTTLE_RATES, take_token
+from wiki.models import Game
+
+# A second SQLite file standing in for a replica of the test database; the
+# test runner creates and destroys it alongside the default test database
+REPLICA = "replica_test"
+REPLICA_PATH = os.path.join(tempfile.gettempdir(), f"massivegamearchive_replica_{os.getpid()}.sqlite3")
+_primary_settings = connections[DEFAULT_DB_ALIAS].settings_dict
+connections.settings.setdefault(REPLICA, {
+    **_primary_settings,
+    "NAME": REPLICA_PATH,
+    "TEST": {**_primary_settings["TEST"], "NAME": REPLICA_PATH, "MIRROR": None},
+})
+
+class PrimaryReplicaRoutingTests(TransactionTestCase):
+    """Routing between the test database and a replica kept in a second SQLite file."""
+
+    databases = {DEFAULT_DB_ALIAS, REPLICA}
+
+    def setUp(self):
+        self.creator = get_user_model().objects.create_user("creator", password="secret")
+        self.replicated = Game.objects.create(title="Replicated Game", creator=self.creator)
+        self._replicate()
+        self.unreplicated = Game.objects.create(title="Fresh Game", creator=self.creator)
+
+    def _replicate(self):
+        """Copy the primary into the replica file, like replication catching up."""
+        connections[REPLICA].close()
+        primary = connections[DEFAULT_DB_ALIAS]
+        primary.ensure_connection()
+        replica = sqlite3.connect(connections[REPLICA].settings_dict["NAME"])
+        try:
+            primary.connection.backup(replica)
+        finally:
+            replica.close()
+
+    def _listed_titles(self):
+        response = self.client.get("/wiki/api/v1/games", {"fields": "title"})
+        self.assertEqual(response.status_code, 200)
+        return {game["title"] for game in response.json()["games"]}
+
+    def test_reads_use_primary_without_replicas(self):
+        self.assertEqual(self._listed_titles(), {"Replicated Game", "Fresh Game"})
+
+    @override_settings(DATABASE_REPLICAS=[REPLICA])
+    def test_read_heavy_views_read_from_replica(self):
+        self.assertEqual(self._listed_titles(), {"Replicated Game"})
+        self.assertEqual(self.client.get(f"/wiki/api/v1/games/{self.unreplicated.slug}").status_code, 404)
+        self.assertEqual(self.client.get(f"/wiki/game/{self.replicated.slug}/").status_code, 200)
+
+    @override_settings(DATABASE_REPLICAS=[REPLICA])
+    def test_client_is_pinned_to_primary_after_write(self):
+        response = self.client.post("/users/login/", {"username": "creator", "password": "secret"})
+        self.assertIn(PRIMARY_PIN_COOKIE, response.cookies)
+
+        self.assertEqual(self._listed_titles(), {"Replicated Game", "Fresh Game"})
+        self.assertEqual(self.client.get(f"/wiki/api/v1/games/{self.unreplicated.slug}").status_code, 200)
+
+        self.client.cookies.pop(PRIMARY_PIN_COOKIE)
+        self.assertEqual(self._listed_titles(), {"Replicated Game"})
+
+    @override_settings(DATABASE_REPLICAS=[REPLICA])
+    def test_writes_go_to_primary_inside_replica_views(self):
+        router = PrimaryReplicaRouter()
+        with use_replicas():
+            self.assertEqual(router.db_for_read(Game), REPLICA)
+            self.assertEqual(router.db_for_write(Game), DEFAULT_DB_ALIAS)
+            Game.objects.create(title="Written Game", creator=self.creator)
+            self.assertFalse(Game.objects.filter(title="Written Game").exists())
+        self.assertTrue(Game.objects.filter(title="Written Game").exists())
+        self.assertEqual(router.db_for_read(Game), DEFAULT_DB_ALIAS)
+
+    @override_settings(DATABASE_REPLICAS=[REPLICA, "replica_other"])
+    def test_one_replica_serves_a_whole_view(self):
+        router = PrimaryReplicaRouter()
+        for _ in range(5):
+            with use_replicas():
+                self.assertEqual(len({router.db_for_read(Game) for _ in range(20)}), 1)
+
+
+class PrecompressedStaticTests(SimpleTestCase):
+    """collectstatic writes compressed variants that the middleware serves with long caching."""
+
+    def test_hashed_files_are_served_precompressed(self):
+        storages = {
+            **settings.STORAGES,
+            "staticfiles": {"BACKEND": "core.storage.PrecompressedManifestStaticFilesStorage"},
+        }
+        with tempfile.TemporaryDirectory() as static_root, override_settings(STATIC_ROOT=static_root, STORAGES=storages):
+            call_command("collectstatic", interactive=False, verbosity=0)
+            hashed_name = staticfiles_storage.stored_name("wiki/scripts/game_list.js")
+            for encoding in ("gzip", "br"):
+                with self.subTest(encoding=encoding):
+                    response = self.client.get(f"/static/{hashed_name}", HTTP_ACCEPT_ENCODING=encoding)
+                    response.close()
+                    self.assertEqual(response["Content-Encoding"], encoding)
+                    self.assertIn("immutable", response["Cache-Control"])
+
+            response = self.client.get("/static/wiki/scripts/game_list.js", HTTP_ACCEPT_ENCODING="br")
+            response.close()
+            self.assertEqual(response["Cache-Control"], "public, max-age=0, must-revalidate")
+
+
+class TokenBucketTests(SimpleTestCase):
+    """Token buckets kept as counters in the cache."""
+
+    def setUp(self):
+        cache.delete("throttle:test")
+
+    def _take(self, now):
+        return take_token("throttle:test", 3, 1.0, now=now)
+
+    def test_burst_up_to_capacity_then_wait(self):
+        self.assertEqual([self._take(1000.0) for _ in range(4)], [None, None, None, 1.0])
+
+    def test_tokens_refill_but_not_beyond_capacity(self):
+        for _ in range(3):
+            self._take(1000.0)
+        self.assertIsNone(self._take(1001.0))
+        self.assertEqual(self._take(1001.0), 1.0)
+        self.assertEqual([self._take(1100.0) for _ in range(4)], [None, None, None, 1.0])
+
+
+@override_settings(API_THROTTLE_RATES={**DEFAULT_THROTTLE_RATES, "suggest": {"anon": "2/min", "user": "2/min"}})
+class ThrottlingApiTests(TestCase):
+    """Requests beyond a bucket are rejected with Retry-After and counted in the metrics."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_rejected_requests_are_retried_later_and_counted(self):
+        statuses = [self.client.get("/wiki/api/v1/games/suggest", {"prefix": "fa"}) for _ in range(3)]
+        self.assertEqual([response.status_code for response in statuses], [200, 200, 429])
+        # One token refills every 30 seconds
+        self.assertIn(int(statuses[-1]["Retry-After"]), range(1, 31))
+        self.assertNotIn("Retry-After", statuses[0])
+
+        self.client.force_login(get_user_model().objects.create_user("staff", is_staff=True))
+        metrics = self.client.get("/wiki/api/v1/metrics/throttling").json()
+        self.assertEqual(metrics["suggest"], {"admitted": 2, "rejected": 1})
+        self.assertEqual(metrics["search"], {"admitted": 0, "rejected": 0})
+
+
+# Values passed to the record task by the jobs that ran
+recorded_values = []
+
+
+@task("core.tests.record")
+def record_call(value):
+    recorded_values.append(value)
+
+
+@task("core.tests.fail")
+def fail_call():
+    raise RuntimeError("boom")
+
+
+class JobQueueTests(TestCase):
+    """Jobs are deduplicated while pending, retried with backoff and requeued when stale."""
+
+    def setUp(self):
+        recorded_values.clear()
+
+    def _claim(self, job):
+        """Claim a job as a worker would, making it due first."""
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        [claimed] = claim_jobs(1)
+        self.assertEqual(claimed.pk, job.pk)
+        return claimed
+
+    def test_pending_keys_are_deduplicated(self):
+        job = enqueue(record_call, key="record:1", value=1)
+        self.assertIsNone(enqueue(record_call, key="record:1", value=2))
+        self.assertEqual(Job.objects.get().payload, {"value": 1})
+
+        # A running job does not block a new one, which picks up later edits
+        self._claim(job)
+        self.assertIsNotNone(enqueue(record_call, key="record:1", value=3))
+        self.assertEqual(Job.objects.filter(status=Job.PENDING).count(), 1)
+
+    def test_successful_jobs_are_deleted(self):
+        job = enqueue(record_call, value=1)
+        self.assertTrue(run_job(self._claim(job)))
+        self.assertEqual(recorded_values, [1])
+        self.assertFalse(Job.objects.exists())
+
+    def test_failures_are_retried_with_backoff_then_marked_failed(self):
+        job = enqueue(fail_call, max_attempts=3)
+        for attempt, delay in ((1, RETRY_BASE_DELAY), (2, 2 * RETRY_BASE_DELAY)):
+            before = timezone.now()
+            self.assertFalse(run_job(self._claim(job)))
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), (Job.PENDING, attempt))
+            self.assertAlmostEqual((job.run_after - before).total_seconds(), delay, delta=1)
+            self.assertIn("RuntimeError: boom", job.last_error)
+
+        self.assertFalse(run_job(self._claim(job)))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 3))
+
+    def test_unknown_tasks_fail(self):
+        job = Job.objects.create(task="core.tests.missing", max_attempts=1)
+        self.assertFalse(run_job(self._claim(job)))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIn("Unknown task", job.last_error)
+
+    def test_failed_retry_yields_to_a_newer_pending_job(self):
+        job = self._claim(enqueue(fail_call, key="fail"))
+        newer = enqueue(fail_call, key="fail")
+        self.assertFalse(run_job(job))
+        self.assertEqual(list(Job.objects.values_list("pk", flat=True)), [newer.pk])
+
+    def test_stale_running_jobs_are_requeued(self):
+        stale = self._claim(enqueue(record_call, value=1))
+        fresh = self._claim(enqueue(record_call, value=2))
+        Job.objects.filter(pk=stale.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(requeue_stale_jobs(timeout=60), 1)
+        self.assertEqual(Job.objects.get(pk=stale.pk).status, Job.PENDING)
+        self.assertEqual(Job.objects.get(pk=fresh.pk).status, Job.RUNNING)
+        self.assertEqual(get_queue_stats()["running"], 1)
+
+    @override_settings(JOB_QUEUE_EAGER=True)
+    def test_eager_jobs_run_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertIsNone(enqueue(record_call, key="record:1", value=1))
+            self.assertEqual(recorded_values, [])
+        self.assertEqual(recorded_values, [1])
+        self.assertFalse(Job.objects.exists())
+
+
+class RunWorkersTests(TransactionTestCase):
+    """The run_workers command executes due jobs on its thread pool."""
+
+    def test_runs_due_jobs_once(self):
+        recorded_values.clear()
+        for value in range(3):
+            enqueue(record_call, value=value)
+        enqueue(record_call, delay=3600, value=99)
+        stdout = io.StringIO()
+        call_command("run_workers", "--workers", "2", "--once", "--poll-interval", "0.01", stdout=stdout)
+        self.assertEqual(sorted(recorded_values), [0, 1, 2])
+        self.assertIn("Ran 3 jobs.", stdout.getvalue())
+        self.assertEqual(Job.objects.get().payload, {"value": 99})
@@ -0,0 +1,130 @@
+"""
+Token-bucket admission control for the API.
+
+Each client gets one bucket per scope, identified by user id when logged in
+and by IP address otherwise. A bucket rate such as "30/min" holds up to 30
+tokens and refills one token every two seconds; a request takes one token
+and is rejected with Retry-After while the bucket is empty.
+
+A bucket is a single counter in the shared cache: the bucket holds as many
+tokens as have been refilled since a fixed epoch minus the counter, so
+taking a token is one atomic increment. Admitted and rejected requests are
+counted per scope.
+"""
+
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from ninja.throttling import BaseThrottle
+
+# Rates per scope and client kind as "capacity/period"
+DEFAULT_THROTTLE_RATES = {
+    "search": {"anon": "30/min", "user": "120/min"},
+    "detail": {"anon": "120/min", "user": "600/min"},
+    "suggest": {"anon": "300/min", "user": "600/min"},
+}
+PERIODS = {"s": 1, "sec": 1, "m": 60, "min": 60, "h": 60 * 60, "hour": 60 * 60, "d": 60 * 60 * 24, "day": 60 * 60 * 24}
+# An expired bucket starts full again, so keep buckets well beyond one refill
+MIN_BUCKET_TIMEOUT = 60 * 60
+METRIC_OUTCOMES = ("admitted", "rejected")
+
+
+def parse_rate(rate: str) -> Tuple[int, float]:
+    """Return the capacity and the refill rate in tokens per second of a rate string."""
+    capacity, period = rate.split("/")
+    return int(capacity), int(capacity) / PERIODS[period]
+
+
+def get_throttle_rates() -> Dict[str, Dict[str, str]]:
+    """Return the configured rates per scope and client kind."""
+    return getattr(settings, "API_THROTTLE_RATES", DEFAULT_THROTTLE_RATES)
+
+
+def take_token(key: str, capacity: int, refill_rate: float, now: Optional[float] = None) -> Optional[float]:
+    """Take a token from a bucket.
+
+    Args:
+        key: Cache key of the bucket.
+        capacity: Maximum number of tokens in the bucket.
+        refill_rate: Tokens added per second.
+        now: Current time in seconds; the system time if None.
+
+    Returns:
+        None if the request is admitted, otherwise the seconds until a
+        token is available.
+    """
+    now = time.time() if now is None else now
+    refilled = int(now * refill_rate)
+    used = cache.get(key)
+    if used is None:
+        used = refilled
+        if _create_bucket(key, refilled - capacity + 1, capacity, refill_rate):
+            return None
+
+    # Tokens refilled beyond a full bucket are dropped; concurrent requests
+    # may both drop them, which only makes the bucket stricter
+    surplus = max(0, refilled - capacity - used)
+    try:
+        used = cache.incr(key, 1 + surplus)
+    except ValueError:
+        # The bucket expired since it was read
+        _create_bucket(key, refilled - capacity + 1, capacity, refill_rate)
+        return None
+    if used <= refilled:
+        return None
+
+    cache.decr(key)
+    return max((used / refill_rate) - now, 0.0)
+
+
+def _create_bucket(key: str, used: int, capacity: int, refill_rate: float) -> bool:
+    """Store a new bucket unless another request created it first."""
+    return cache.add(key, used, max(MIN_BUCKET_TIMEOUT, int(capacity / refill_rate)))
+
+
+def record_outcome(scope: str, outcome: str) -> None:
+    """Count an admitted or rejected request of a scope."""
+    key = f"throttle_metrics:{scope}:{outcome}"
+    if not cache.add(key, 1, None):
+        cache.incr(key)
+
+
+def get_throttle_metrics() -> Dict[str, Dict[str, int]]:
+    """Return the admitted and rejected request counts per scope."""
+    keys = {
+        f"throttle_metrics:{scope}:{outcome}": (scope, outcome)
+        for scope in get_throttle_rates()
+        for outcome in METRIC_OUTCOMES
+    }
+    counts = cache.get_many(list(keys))
+    metrics = {scope: dict.fromkeys(METRIC_OUTCOMES, 0) for scope in get_throttle_rates()}
+    for key, (scope, outcome) in keys.items():
+        metrics[scope][outcome] = counts.get(key, 0)
+    return metrics
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Per-user and per-IP token buckets for one API scope."""
+
+    def __init__(self, scope: str) -> None:
+        self.scope = scope
+        # Instances are shared by all requests of an operation
+        self._state = threading.local()
+
+    def allow_request(self, request) -> bool:
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated:
+            kind, ident = "user", f"user:{user.pk}"
+        else:
+            kind, ident = "anon", f"ip:{self.get_ident(request)}"
+
+        capacity, refill_rate = parse_rate(get_throttle_rates()[self.scope][kind])
+        self._state.wait = take_token(f"throttle:{self.scope}:{ident}", capacity, refill_rate)
+        record_outcome(self.scope, "admitted" if self._state.wait is None else "rejected")
+        return self._state.wait is None
+
+    def wait(self) -> Optional[float]:
+        return getattr(self._state, "wait", None)
@@ -47,6 +47,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.PrecompressedStaticMiddleware',
+    'core.middleware.ReadYourWritesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -86,6 +88,52 @@ DATABASES = {
     }
 }
 
+# Read replicas: comma-separated database names (e.g. SQLite files) using the
+# default engine. Read-heavy views read from them via core.db_router.
+DATABASE_REPLICAS = []
+for replica_number, replica_name in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_NAMES', '').split(',')), 1):
+    DATABASES[f'replica{replica_number}'] = {
+        **DATABASES['default'],
+        'NAME': replica_name,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{replica_number}')
+
+DATABASE_ROUTERS = ['core.db_router.PrimaryReplicaRouter']
+
+# Seconds a client reads from the primary after a write, so it sees its own changes
+READ_YOUR_WRITES_SECONDS = 10
+
+# Trigram lookups used by fuzzy search need the postgres app on PostgreSQL
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    INSTALLED_APPS.append('django.contrib.postgres')
+
+
+# Cache
+# Uses Redis when CACHE_URL is set (e.g. redis://localhost:6379/0), else local memory
+
+CACHE_URL = os.environ.get('CACHE_URL', '')
+
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+
+# Sessions
+# cached_db reads sessions from the cache and only falls back to the database on misses
+
+SESSION_ENGINE = os.environ.get('SESSION_ENGINE', 'django.contrib.sessions.backends.cached_db')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -127,6 +175,22 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static'),
 ]
 
+# collectstatic writes content-hashed names plus .gz/.br variants
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'core.storage.PrecompressedManifestStaticFilesStorage',
+    },
+}
+
+# Applies the test-only storage and search log settings for the run
+TEST_RUNNER = 'core.test_runner.TestRunner'
+
+# Hashed static files never change, so browsers may cache them for a year
+STATIC_CACHE_MAX_AGE = 60 * 60 * 24 * 365
+
 # Media files (User uploads)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
@@ -1,10 +1,11 @@
 // Global variables for pagination
 let currentPage = 0;
 let lastSearchTerm = "";
+let suggestTimer = null;
 
 document.addEventListener("DOMContentLoaded", function () {
-  initializeSliders();
   initializeGamesList();
+  initializeSliders();
 
   // Setup Load More button
   document
@@ -51,6 +52,13 @@ document.addEventListener("DOMContentLoaded", function () {
           });
       }
     });
+
+  document
+    .getElementById("gameSearch")
+    .addEventListener("input", function (event) {
+      clearTimeout(suggestTimer);
+      suggestTimer = setTimeout(() => fetchSuggestions(event.target.value), 50);
+    });
 });
 window.addEventListener("resize", updateDescriptions);
 
@@ -104,6 +112,13 @@ function initializeSliders() {
 }
 
 function initializeGamesList() {
+  // The first page is rendered into the page by the server
+  const initialData = document.getElementById("initial-games-data");
+  if (initialData) {
+    displayGames(JSON.parse(initialData.textContent));
+    return;
+  }
+
   fetchGamesWithFilters()
     .then(displayGames)
     .catch((error) => {
@@ -111,6 +126,29 @@ function initializeGamesList() {
     });
 }
 
+function fetchSuggestions(prefix) {
+  const datalist = document.getElementById("gameSuggestions");
+  if (!prefix.trim()) {
+    datalist.innerHTML = "";
+    return;
+  }
+
+  const params = new URLSearchParams({ prefix: prefix, limit: 8 });
+  fetch(`/wiki/api/v1/games/suggest?${params.toString()}`)
+    .then((response) => (response.ok ? response.json() : []))
+    .then((suggestions) => {
+      datalist.innerHTML = "";
+      suggestions.forEach((suggestion) => {
+        const option = document.createElement("option");
+        option.value = suggestion.label;
+        datalist.appendChild(option);
+      });
+    })
+    .catch((error) => {
+      console.error("Failed to fetch suggestions:", error);
+    });
+}
+
 function getSelectedValues(className) {
   const checkboxes = document.querySelectorAll(className + ":checked");
   return Array.from(checkboxes).map((checkbox) => checkbox.value);
@@ -0,0 +1,41 @@
+import time
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+
+class Command(BaseCommand):
+    help = "Measure queries and latency of the login and authenticated page-view paths."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--logins", type=int, default=20, help="Number of logins to measure")
+        parser.add_argument("--views", type=int, default=200, help="Number of page views to measure")
+
+    def handle(self, *args, **options):
+        username, password = f"benchmark-{uuid.uuid4().hex[:12]}", uuid.uuid4().hex
+        user = User.objects.create_user(username, password=password)
+        try:
+            client = Client()
+            self._report("login", options["logins"], lambda: self._login(client, username, password))
+            self._report("profile view", options["views"], lambda: client.get(reverse("profile")))
+        finally:
+            user.delete()
+
+    def _login(self, client: Client, username: str, password: str) -> None:
+        client.logout()
+        client.post(reverse("login"), {"username": username, "password": password})
+
+    def _report(self, name: str, runs: int, request) -> None:
+        """Run a request repeatedly and print its mean latency and query count."""
+        started = time.perf_counter()
+        with CaptureQueriesContext(connection) as context:
+            for _ in range(runs):
+                request()
+        elapsed_ms = (time.perf_counter() - started) * 1000 / max(runs, 1)
+        queries = len(context.captured_queries) / max(runs, 1)
+        self.stdout.write(f"{name}: {elapsed_ms:.2f} ms, {queries:.1f} queries per request")
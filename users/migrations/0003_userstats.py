@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-19 17:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_remove_profile_avatar'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('games_created', models.PositiveIntegerField(default=0)),
+                ('upvotes_received', models.PositiveIntegerField(default=0)),
+                ('downvotes_received', models.PositiveIntegerField(default=0)),
+                ('votes_cast', models.PositiveIntegerField(default=0)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
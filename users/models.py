@@ -1,8 +1,11 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models import Count, F, Q
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
-from typing import TYPE_CHECKING, cast
+from typing import TYPE_CHECKING, Optional, cast
+
+from wiki.models import Game, Vote
 
 if TYPE_CHECKING:
     from django.contrib.auth.models import User as UserType
@@ -18,23 +21,133 @@ class Profile(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    EDITABLE_FIELDS = ('bio', 'location')
+
     def __str__(self) -> str:
         user = cast('UserType', self.user)
         return f"{user.username}'s Profile"
 
+    @classmethod
+    def for_user(cls, user: User) -> 'Profile':
+        """Return the profile of a user, or an unsaved blank one if none exists yet."""
+        try:
+            return user.profile
+        except cls.DoesNotExist:
+            return cls(user=user)
+
+    def update_fields(self, **values: str) -> bool:
+        """Apply profile field values and save only if something changed."""
+        changed = [
+            field for field in self.EDITABLE_FIELDS
+            if field in values and getattr(self, field) != values[field]
+        ]
+        if not changed:
+            return False
+
+        for field in changed:
+            setattr(self, field, values[field])
+        if self._state.adding:
+            self.save()
+        else:
+            self.save(update_fields=[*changed, 'updated_at'])
+        return True
+
+
+class UserStats(models.Model):
+    """
+    Cached per-user activity totals, kept current by Game and Vote writes.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='stats')
+    games_created = models.PositiveIntegerField(default=0)
+    upvotes_received = models.PositiveIntegerField(default=0)
+    downvotes_received = models.PositiveIntegerField(default=0)
+    votes_cast = models.PositiveIntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f"Stats for user {self.user_id}"
+
+    @classmethod
+    def for_user(cls, user: User) -> 'UserStats':
+        """Return the stats of a user, computing them on first access."""
+        stats = cls.objects.filter(user=user).first()
+        if stats is None:
+            stats, _ = cls.objects.get_or_create(user=user, defaults=cls.compute_totals(user))
+        return stats
+
+    @staticmethod
+    def compute_totals(user: User) -> dict:
+        """Aggregate the activity totals of a user from the database."""
+        received = Vote.objects.filter(game__creator=user).aggregate(
+            upvotes_received=Count('id', filter=Q(value=1)),
+            downvotes_received=Count('id', filter=Q(value=-1)),
+        )
+        return {
+            'games_created': Game.objects.filter(creator=user).count(),
+            'votes_cast': Vote.objects.filter(user=user).count(),
+            **received,
+        }
+
 
-@receiver(post_save, sender=User)
-def create_user_profile(sender, instance, created, **kwargs):
+def _adjust_stats(user_id: Optional[int], **deltas: int) -> None:
+    """Apply counter changes to existing stats; missing stats are computed on read."""
+    if user_id is None or not any(deltas.values()):
+        return
+    UserStats.objects.filter(user_id=user_id).update(
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+
+
+def _received_deltas(value: Optional[int], sign: int) -> dict:
+    """Return the received-vote counter changes for adding or removing a vote."""
+    return {
+        'upvotes_received': sign if value == 1 else 0,
+        'downvotes_received': sign if value == -1 else 0,
+    }
+
+
+@receiver(post_save, sender=Game)
+def count_created_game(sender, instance, created, raw=False, **kwargs):
     """
-    Signal to create a profile when a user is created.
+    Signal to count a new game for its creator.
+    """
+    if created and not raw:
+        _adjust_stats(instance.creator_id, games_created=1)
+
+
+@receiver(post_delete, sender=Game)
+def uncount_deleted_game(sender, instance, **kwargs):
     """
+    Signal to uncount a deleted game for its creator.
+    """
+    _adjust_stats(instance.creator_id, games_created=-1)
+
+
+@receiver(post_save, sender=Vote)
+def count_saved_vote(sender, instance, created, raw=False, **kwargs):
+    """
+    Signal to count a new or changed vote for the voter and the game creator.
+    The stored value before the change is remembered by the wiki app's pre_save handler.
+    """
+    if raw:
+        return
+    previous_value = getattr(instance, '_previous_value', None)
+    if not created and previous_value == instance.value:
+        return
+
+    creator_id = Game.objects.filter(pk=instance.game_id).values_list('creator_id', flat=True).first()
+    deltas = _received_deltas(instance.value, 1)
+    for field, delta in _received_deltas(previous_value, -1).items():
+        deltas[field] += delta
+    _adjust_stats(creator_id, **deltas)
     if created:
-        Profile.objects.create(user=instance)
+        _adjust_stats(instance.user_id, votes_cast=1)
 
 
-@receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
+@receiver(post_delete, sender=Vote)
+def uncount_deleted_vote(sender, instance, **kwargs):
     """
-    Signal to save the profile when the user is saved.
+    Signal to uncount a deleted vote for the voter and the game creator.
     """
-    instance.profile.save()
+    creator_id = Game.objects.filter(pk=instance.game_id).values_list('creator_id', flat=True).first()
+    _adjust_stats(creator_id, **_received_deltas(instance.value, -1))
+    _adjust_stats(instance.user_id, votes_cast=-1)
@@ -1 +1,100 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
+from users.models import Profile, UserStats
+from users.views import CONTRIBUTED_GAMES_PER_PAGE
+from wiki.models import Game, Vote
+
+
+class ProfileTests(TestCase):
+    """The profile page renders in a constant number of queries from cached stats."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.quiet = User.objects.create_user("quiet", password="secret")
+        cls.prolific = User.objects.create_user("prolific", password="secret")
+        voters = [User.objects.create_user(f"voter{number}") for number in range(3)]
+        for number in range(CONTRIBUTED_GAMES_PER_PAGE + 5):
+            game = Game.objects.create(title=f"Spiel {number}", creator=cls.prolific)
+            for voter in voters:
+                Vote.objects.create(user=voter, game=game, value=1 if number % 3 else -1)
+            Vote.objects.create(user=cls.prolific, game=game, value=1)
+
+    def _get_profile(self, **params):
+        response = self.client.get("/users/profile/", params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_query_count_does_not_grow_with_activity(self):
+        for user in (self.quiet, self.prolific):
+            self.client.force_login(user)
+            # Warm the stats, which are computed on the first visit
+            self._get_profile()
+
+            # User, stats, one page of contributed games and profile; the session is cached
+            with self.subTest(user=user.username), self.assertNumQueries(4):
+                self._get_profile()
+
+    def test_member_since_is_shown_without_a_profile(self):
+        self.client.force_login(self.quiet)
+        self.assertFalse(Profile.objects.filter(user=self.quiet).exists())
+        self.assertContains(self._get_profile(), "Member Since:")
+
+    def test_contributed_games_are_paginated(self):
+        self.client.force_login(self.prolific)
+        response = self._get_profile(page=2)
+        self.assertEqual(len(response.context["contributed_games"]), 5)
+        self.assertEqual(response.context["total_pages"], 2)
+
+    def test_stats_follow_game_and_vote_writes(self):
+        stats = UserStats.for_user(self.prolific)
+        game = Game.objects.filter(creator=self.prolific).first()
+        vote = Vote.objects.filter(game=game).exclude(user=self.prolific).first()
+
+        def flip_vote():
+            vote.value = -vote.value
+            vote.save()
+
+        writes = [
+            ("vote changed", flip_vote),
+            ("vote deleted", lambda: Vote.objects.filter(game=game, user=self.prolific).delete()),
+            ("game created", lambda: Game.objects.create(title="Noch ein Spiel", creator=self.prolific)),
+            ("game deleted", game.delete),
+        ]
+        for description, write in writes:
+            with self.subTest(description):
+                write()
+                stats.refresh_from_db()
+                totals = UserStats.compute_totals(self.prolific)
+                self.assertEqual({field: getattr(stats, field) for field in totals}, totals)
+
+
+class ProfileWriteTests(TestCase):
+    """Logging in and browsing never write the profile; it is created on the first edit."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user("writer", email="writer@example.com", password="secret")
+
+    def test_login_does_not_touch_the_profile(self):
+        # User lookup, last_login update and the session write and key cycle, each
+        # session write in its own savepoint; nothing touches the profile
+        with self.assertNumQueries(9), CaptureQueriesContext(connection) as queries:
+            response = self.client.post("/users/login/", {"username": "writer", "password": "secret"})
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(any("users_profile" in query["sql"] for query in queries))
+        self.assertFalse(Profile.objects.exists())
+
+    def test_profile_is_created_on_the_first_change(self):
+        self.client.force_login(self.user)
+        unchanged = {"username": "writer", "email": "writer@example.com", "bio": "", "location": ""}
+
+        self.assertEqual(self.client.get("/users/profile/edit/").status_code, 200)
+        self.client.post("/users/profile/edit/", unchanged)
+        self.assertFalse(Profile.objects.exists())
+
+        self.client.post("/users/profile/edit/", {**unchanged, "location": "Berlin"})
+        self.assertEqual(Profile.objects.get(user=self.user).location, "Berlin")
@@ -2,7 +2,11 @@ from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth import login, logout
+from wiki.models import Game
 from .forms import UserRegisterForm, UserUpdateForm, ProfileUpdateForm
+from .models import Profile, UserStats
+
+CONTRIBUTED_GAMES_PER_PAGE = 20
 
 def register(request):
     """View for user registration."""
@@ -24,13 +28,31 @@ def register(request):
 @login_required
 def profile(request):
     """View for displaying user profile."""
-    # We'll implement contributed games functionality later
-    contributed_games = []
+    stats = UserStats.for_user(request.user)
+    total_pages = max(1, -(-stats.games_created // CONTRIBUTED_GAMES_PER_PAGE))
+    page = _get_page_number(request, total_pages)
 
     return render(request, 'users/profile.html', {
-        'contributed_games': contributed_games
+        'stats': stats,
+        'contributed_games': get_contributed_games(request.user, page),
+        'page': page,
+        'total_pages': total_pages,
     })
 
+def get_contributed_games(user, page: int) -> list:
+    """Return one page of the games a user created, newest first."""
+    start = (page - 1) * CONTRIBUTED_GAMES_PER_PAGE
+    games = Game.objects.filter(creator=user).order_by('-created_at').only('title', 'slug', 'created_at')
+    return list(games[start:start + CONTRIBUTED_GAMES_PER_PAGE])
+
+def _get_page_number(request, total_pages: int) -> int:
+    """Return the requested page number, clamped to the available pages."""
+    try:
+        page = int(request.GET.get('page', 1))
+    except ValueError:
+        page = 1
+    return min(max(page, 1), total_pages)
+
 @login_required
 def edit_profile(request):
     """View for editing user profile."""
@@ -39,14 +61,14 @@ def edit_profile(request):
         p_form = ProfileUpdateForm(request.POST)
 
         if u_form.is_valid() and p_form.is_valid():
-            u_form.save()
-
-            # Update profile fields
-            profile = request.user.profile
-            profile.bio = p_form.cleaned_data.get('bio')
-            profile.location = p_form.cleaned_data.get('location')
+            if u_form.has_changed():
+                u_form.save()
 
-            profile.save()
+            # Update profile fields; the profile is only written when they change
+            Profile.for_user(request.user).update_fields(
+                bio=p_form.cleaned_data.get('bio'),
+                location=p_form.cleaned_data.get('location'),
+            )
 
             messages.success(request, "Your profile has been updated!")
             return redirect('profile')
@@ -54,9 +76,10 @@ def edit_profile(request):
         u_form = UserUpdateForm(instance=request.user)
 
         # Get initial data for the profile form
+        profile = Profile.for_user(request.user)
         initial_data = {
-            'bio': request.user.profile.bio,
-            'location': request.user.profile.location,
+            'bio': profile.bio,
+            'location': profile.location,
         }
         p_form = ProfileUpdateForm(initial=initial_data)
 
@@ -1,7 +1,90 @@
 from django.contrib import admin
-from wiki.models import Game, Tag, AgeGroup, Vote
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
 
-admin.site.register(Game)
-admin.site.register(Tag)
-admin.site.register(AgeGroup)
-admin.site.register(Vote)
+from wiki.models import DuplicateFlag, Game, GameImage, Tag, AgeGroup, Vote
+
+# Changelists stop counting here instead of running COUNT(*) over the whole table
+ADMIN_COUNT_LIMIT = 10000
+
+
+class CappedCountPaginator(Paginator):
+    """Paginator that counts at most ADMIN_COUNT_LIMIT rows.
+
+    Pages beyond the limit are not linked; narrow the list with the filters
+    or the search to reach older rows.
+    """
+
+    @cached_property
+    def count(self):
+        return self.object_list.values("pk")[:ADMIN_COUNT_LIMIT].count()
+
+
+class ScalableModelAdmin(admin.ModelAdmin):
+    """Changelist settings for tables that grow without bound."""
+
+    paginator = CappedCountPaginator
+    show_full_result_count = False
+
+
+class GameImageInline(admin.TabularInline):
+    model = GameImage
+    fields = ('image', 'caption', 'position', 'width', 'height', 'content_hash')
+    readonly_fields = ('width', 'height', 'content_hash')
+    extra = 0
+
+
+@admin.register(Game)
+class GameAdmin(ScalableModelAdmin):
+    list_display = ('title', 'slug', 'creator', 'created_at')
+    list_select_related = ('creator',)
+    list_filter = ('tags', 'age_groups')
+    search_fields = ('slug__startswith',)
+    search_help_text = 'Search by the beginning of the slug, e.g. "capture-the".'
+    raw_id_fields = ('creator',)
+    autocomplete_fields = ('tags', 'age_groups')
+    inlines = (GameImageInline,)
+
+    def save_model(self, request, obj, form, change):
+        # Picked up by the revision signal to credit the edit
+        obj._revision_author = request.user
+        super().save_model(request, obj, form, change)
+
+    def save_formset(self, request, form, formset, change):
+        for image in formset.save(commit=False):
+            if image.uploaded_by_id is None:
+                image.uploaded_by = request.user
+            image.save()
+        for image in formset.deleted_objects:
+            image.delete()
+
+
+@admin.register(Tag)
+class TagAdmin(admin.ModelAdmin):
+    search_fields = ('name__startswith',)
+
+
+@admin.register(AgeGroup)
+class AgeGroupAdmin(admin.ModelAdmin):
+    list_display = ('string_title', 'minimum_age', 'maximum_age')
+    search_fields = ('string_title__startswith',)
+
+
+@admin.register(Vote)
+class VoteAdmin(ScalableModelAdmin):
+    list_display = ('id', 'user', 'game', 'value', 'updated_at')
+    list_select_related = ('user', 'game')
+    list_filter = ('updated_at',)
+    search_fields = ('user__username__exact', 'game__slug__exact')
+    search_help_text = 'Search by exact username or game slug.'
+    raw_id_fields = ('user', 'game')
+
+
+@admin.register(DuplicateFlag)
+class DuplicateFlagAdmin(ScalableModelAdmin):
+    list_display = ('game', 'duplicate_of', 'similarity', 'created_at', 'resolved')
+    list_select_related = ('game', 'duplicate_of')
+    list_filter = ('resolved',)
+    list_editable = ('resolved',)
+    raw_id_fields = ('game', 'duplicate_of')
+    ordering = ('resolved', '-created_at')
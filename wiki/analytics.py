@@ -0,0 +1,307 @@
+"""
+Search analytics for the wiki app.
+
+Searches served by the game list are buffered in memory and written in
+batches by a background thread, once a batch is full or after
+SEARCH_LOG_FLUSH_INTERVAL seconds, so logging adds no queries to requests.
+Logs that fail to write stay buffered for the next attempt, and the buffer
+is written once more when the process exits; a process that is killed
+loses at most the logs of one interval.
+The rollup_search_logs command folds the raw logs into daily totals per
+canonical search and reports the top queries, zero-result queries and
+latency per query shape. The warm_search_cache command replays the top
+searches to refill the result cache after a deploy or cache flush.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.db.models import F, Max, Sum
+from django.utils import timezone
+
+from core.db_router import get_replica_aliases, use_replicas
+
+from .models import SearchLog, SearchQueryStat
+from .services import (
+    SEARCH_CRITERIA_DEFAULTS,
+    get_canonical_criteria,
+    get_search_results,
+    get_search_signature,
+    parse_query,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_FLUSH_INTERVAL = 30
+# Entries beyond this are dropped while the database is unreachable
+MAX_BUFFERED_LOGS = 10000
+ROLLUP_CHUNK_SIZE = 5000
+INDEX_FILTERS = ("difficulty", "group_size", "preperation", "physical", "duration")
+
+
+def get_query_shape(criteria: Dict[str, Any]) -> str:
+    """Describe which search features a search uses, ignoring the actual words.
+
+    Args:
+        criteria: Search criteria as accepted by search_games
+
+    Returns:
+        A string such as 'terms=2 phrases fields=title tags sort=upvotes'
+    """
+    criteria = get_canonical_criteria(criteria)
+    terms = parse_query(criteria["query"]).terms
+    parts = [f"terms={min(len(terms), 5)}{'+' if len(terms) >= 5 else ''}"]
+    if any(term.phrase for term in terms):
+        parts.append("phrases")
+    if any(term.negated for term in terms):
+        parts.append("negations")
+    fields = sorted({term.field for term in terms if term.field})
+    if fields:
+        parts.append(f"fields={','.join(fields)}")
+    if criteria["search_in"] != ["all"]:
+        parts.append(f"search_in={','.join(criteria['search_in'])}")
+    if criteria["tag_filter"]:
+        parts.append("tags")
+    if criteria["age_group_filter"]:
+        parts.append("age_groups")
+    ranges = [
+        name for name in INDEX_FILTERS
+        if criteria[f"min_{name}_index"] != SEARCH_CRITERIA_DEFAULTS[f"min_{name}_index"]
+        or criteria[f"max_{name}_index"] != SEARCH_CRITERIA_DEFAULTS[f"max_{name}_index"]
+    ]
+    if ranges:
+        parts.append(f"ranges={','.join(ranges)}")
+    parts.append(f"sort={criteria['sort_by']}")
+    return " ".join(parts)
+
+
+class SearchLogBuffer:
+    """Thread-safe in-memory buffer of search logs, written in batches by a background thread."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._entries: List[SearchLog] = []
+        self._batch_full = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+
+    def add(self, entry: SearchLog) -> None:
+        with self._lock:
+            if len(self._entries) >= MAX_BUFFERED_LOGS:
+                return
+            self._entries.append(entry)
+            batch_size = getattr(settings, "SEARCH_LOG_BATCH_SIZE", DEFAULT_BATCH_SIZE)
+            if len(self._entries) >= batch_size:
+                self._batch_full.set()
+            if self._flusher is None and getattr(settings, "SEARCH_LOG_BACKGROUND_FLUSH", True):
+                self._flusher = threading.Thread(target=self._run, name="SearchLogBuffer-flush", daemon=True)
+                self._flusher.start()
+                atexit.register(self._flush_at_exit)
+
+    def flush(self) -> int:
+        """Write all buffered logs and return their number; logs that fail to write stay buffered."""
+        with self._lock:
+            entries, self._entries = self._entries, []
+            self._batch_full.clear()
+        if not entries:
+            return 0
+        try:
+            SearchLog.objects.bulk_create(entries, batch_size=DEFAULT_BATCH_SIZE)
+        except DatabaseError:
+            with self._lock:
+                self._entries = (entries + self._entries)[:MAX_BUFFERED_LOGS]
+            raise
+        return len(entries)
+
+    def _run(self) -> None:
+        """Write the buffer whenever a batch is full or the flush interval passed."""
+        while True:
+            flush_interval = getattr(settings, "SEARCH_LOG_FLUSH_INTERVAL", DEFAULT_FLUSH_INTERVAL)
+            self._batch_full.wait(flush_interval)
+            try:
+                self.flush()
+            except DatabaseError:
+                logger.warning("Could not write search logs, retrying in %s seconds", flush_interval, exc_info=True)
+                time.sleep(flush_interval)
+            finally:
+                # The thread never finishes a request, so nothing else closes its connection
+                connections.close_all()
+
+    def _flush_at_exit(self) -> None:
+        try:
+            self.flush()
+        except DatabaseError:
+            logger.exception("Dropped search logs that could not be written before exit")
+
+
+search_log_buffer = SearchLogBuffer()
+
+
+def log_search(criteria: Dict[str, Any], result_count: int, duration: float, cache_hit: bool = False) -> None:
+    """Buffer the log of a served search.
+
+    Args:
+        criteria: Search criteria as accepted by search_games
+        result_count: Number of games found
+        duration: Seconds it took to serve the search
+        cache_hit: Whether the result ids came from the cache
+    """
+    canonical = get_canonical_criteria(criteria)
+    search_log_buffer.add(SearchLog(
+        signature=get_search_signature(canonical),
+        query=canonical["query"][:255],
+        shape=get_query_shape(canonical),
+        criteria=canonical,
+        result_count=result_count,
+        duration_ms=duration * 1000,
+        cache_hit=cache_hit,
+        created_at=timezone.now(),
+    ))
+
+
+def flush_search_logs() -> int:
+    """Write the buffered logs now and return their number."""
+    try:
+        return search_log_buffer.flush()
+    except DatabaseError:
+        logger.exception("Could not write search logs, keeping them for the next flush")
+        return 0
+
+
+def rollup_search_logs() -> int:
+    """Fold the raw search logs into daily stats and return the number of logs processed."""
+    processed = 0
+    while True:
+        logs = list(SearchLog.objects.order_by("id")[:ROLLUP_CHUNK_SIZE])
+        if not logs:
+            return processed
+        with transaction.atomic():
+            _add_to_stats(logs)
+            SearchLog.objects.filter(id__lte=logs[-1].id).delete()
+        processed += len(logs)
+
+
+def _add_to_stats(logs: List[SearchLog]) -> None:
+    """Add a chunk of logs to the daily stats."""
+    totals = {}
+    for log in logs:
+        key = (timezone.localdate(log.created_at), log.signature)
+        stat = totals.setdefault(key, SearchQueryStat(
+            day=key[0], signature=log.signature, query=log.query, shape=log.shape, criteria=log.criteria,
+        ))
+        stat.search_count += 1
+        stat.zero_result_count += log.result_count == 0
+        stat.cache_hit_count += log.cache_hit
+        stat.total_duration_ms += log.duration_ms
+        stat.max_duration_ms = max(stat.max_duration_ms, log.duration_ms)
+
+    signatures_by_day = defaultdict(list)
+    for day, signature in totals:
+        signatures_by_day[day].append(signature)
+    existing = {}
+    for day, signatures in signatures_by_day.items():
+        for stat in SearchQueryStat.objects.select_for_update().filter(day=day, signature__in=signatures):
+            existing[(day, stat.signature)] = stat
+
+    created = []
+    for key, total in totals.items():
+        stat = existing.get(key)
+        if stat is None:
+            created.append(total)
+            continue
+        SearchQueryStat.objects.filter(pk=stat.pk).update(
+            search_count=F("search_count") + total.search_count,
+            zero_result_count=F("zero_result_count") + total.zero_result_count,
+            cache_hit_count=F("cache_hit_count") + total.cache_hit_count,
+            total_duration_ms=F("total_duration_ms") + total.total_duration_ms,
+            max_duration_ms=max(stat.max_duration_ms, total.max_duration_ms),
+        )
+    SearchQueryStat.objects.bulk_create(created)
+
+
+def get_top_searches(days: int = 7, limit: int = 20, zero_results: bool = False) -> List[Dict[str, Any]]:
+    """
+    Return the most frequent canonical searches of the last days.
+
+    Args:
+        days: Number of days to look back
+        limit: Maximum number of searches to return
+        zero_results: Only count searches that found no game
+
+    Returns:
+        List of dictionaries with the query, shape, criteria and totals of each search
+    """
+    count_field = "zero_result_count" if zero_results else "search_count"
+    rows = list(
+        SearchQueryStat.objects.filter(day__gte=timezone.localdate() - timedelta(days=days - 1))
+        .values("signature")
+        .annotate(
+            searches=Sum("search_count"),
+            zero_results=Sum("zero_result_count"),
+            total_duration_ms=Sum("total_duration_ms"),
+        )
+        .filter(**{"zero_results__gt" if zero_results else "searches__gt": 0})
+        .order_by(f"-{'zero_results' if zero_results else 'searches'}", "signature")[:limit]
+    )
+    details = {
+        stat["signature"]: stat
+        for stat in SearchQueryStat.objects.filter(signature__in=[row["signature"] for row in rows])
+        .order_by("day")
+        .values("signature", "query", "shape", "criteria")
+    }
+    return [
+        {
+            **details[row["signature"]],
+            "searches": row["searches"],
+            "zero_results": row["zero_results"],
+            "average_ms": row["total_duration_ms"] / row["searches"],
+        }
+        for row in rows
+    ]
+
+
+def get_latency_by_shape(days: int = 7) -> List[Dict[str, Any]]:
+    """Return the number of searches and their latency per query shape, slowest first."""
+    rows = (
+        SearchQueryStat.objects.filter(day__gte=timezone.localdate() - timedelta(days=days - 1))
+        .values("shape")
+        .annotate(
+            searches=Sum("search_count"),
+            cache_hits=Sum("cache_hit_count"),
+            total_duration_ms=Sum("total_duration_ms"),
+            max_ms=Max("max_duration_ms"),
+        )
+    )
+    shapes = [
+        {
+            "shape": row["shape"],
+            "searches": row["searches"],
+            "cache_hit_ratio": row["cache_hits"] / row["searches"],
+            "average_ms": row["total_duration_ms"] / row["searches"],
+            "max_ms": row["max_ms"],
+        }
+        for row in rows
+    ]
+    return sorted(shapes, key=lambda shape: shape["average_ms"], reverse=True)
+
+
+def warm_search_cache(top: int = 50, days: int = 7) -> int:
+    """Run the most frequent searches to fill the result cache and return their number.
+
+    Searches are run against the primary and, if configured, the replicas,
+    since both are cached separately.
+    """
+    searches = get_top_searches(days=days, limit=top)
+    replica_modes = {False, bool(get_replica_aliases())}
+    for replicas in replica_modes:
+        with use_replicas(replicas):
+            for search in searches:
+                get_search_results(**search["criteria"])
+    return len(searches)
@@ -8,36 +8,89 @@ This module provides the API endpoints for the Wiki app, including:
 
 Search functionality:
 - Use 'q' parameter for search queries (e.g., ?q=fun outdoor game)
+- Quote phrases, exclude terms with a leading minus and restrict terms to a
+  field with title:, description: or content: (e.g., ?q="capture the flag" -indoor)
 - Control which fields to search with 'search_in' parameter (options: 'title', 'description', 'content', 'all')
-- Sort results with 'sort_by' parameter (options: 'relevance', 'title', 'newest', 'upvotes')
+- Sort results with 'sort_by' parameter (options: 'relevance', 'title', 'newest', 'upvotes', 'trending')
+- Request sparse responses with 'fields' parameter (e.g., ?fields=title,slug)
+- Fetch many game details in one request via /games/batch?slug=a&slug=b
+- Find games like a given one via /games/{slug}/similar
+- List the images of a game with responsive renditions via /games/{slug}/images
+- Get vote-based recommendations for the logged-in user via /users/me/recommendations
+- Get typeahead suggestions for titles and tags via /games/suggest?prefix=
+- Mirror the archive incrementally via /games/changes?since=<cursor>, which
+  returns the games created, changed or deleted since the previous sync
+- Plan a session of games that fills a time budget via /planner?total_minutes=120,
+  alternating physical intensity between consecutive games
+- Find the games playable with the materials at hand via
+  /games/by-materials?materials=ball,rope,augenbinde
+- Public endpoints are rate limited per client with token buckets; searches
+  are limited more strictly than detail lookups, and staff can read the
+  admitted and rejected counts via /metrics/throttling
+- Browse the revision history of a game via /games/{slug}/revisions, fetch any
+  revision, diff two of them and report how much storage the history uses
 - Advanced search is implemented in the services module for better code organization
 """
 
-from django.http import HttpRequest, JsonResponse
+import math
+import time
+
+from django.http import HttpRequest
 from ninja import NinjaAPI, Schema, Query, Path
-from typing import List, Optional
-from .services import search_games, get_paginated_games, get_pagination_metadata, get_game_by_slug
+from ninja.errors import Throttled
+from ninja.security import django_auth
+from core.db_router import replica_reads
+from core.throttling import TokenBucketThrottle, get_throttle_metrics
+from typing import Any, Callable, Dict, List, Optional
+from .analytics import log_search
+from .changes import MAX_CHANGES, Cursor, CursorExpired, get_changes
+from .images import get_game_images
+from .materials import find_playable_games, get_materials_by_game
+from .models import Game
+from .planner import MAX_TOTAL_MINUTES, TRANSITION_MINUTES, plan_session
+from .recommendations import get_recommendations_for_user
+from .revisions import diff_revisions, get_revision, get_storage_report, list_revisions
+from .similarity import TOP_K, get_similar_games
+from .suggest import MAX_SUGGESTIONS, suggestion_index
+from .services import (
+    MAX_BATCH_SLUGS,
+    build_game_list_response,
+    get_search_results,
+    get_game_by_slug,
+    get_games_by_slugs,
+)
 
 
 api = NinjaAPI(urls_namespace="wiki_api")
+
+SEARCH_THROTTLE = TokenBucketThrottle("search")
+DETAIL_THROTTLE = TokenBucketThrottle("detail")
+SUGGEST_THROTTLE = TokenBucketThrottle("suggest")
+
+@api.exception_handler(Throttled)
+def throttled(request: HttpRequest, exc: Throttled):
+    response = api.create_response(request, {"detail": "Too many requests, please retry later"}, status=429)
+    if exc.wait is not None:
+        response["Retry-After"] = str(math.ceil(exc.wait))
+    return response
 class GameSchema(Schema):
-    title: str
-    short_description: str
-    slug: str
-    difficulty_index: int
-    group_size_index: int
-    preperation_index: int
-    physical_index: int
-    duration_index: int
-    tags: List[str]
-    age_groups: List[str]
-    upvote_count: int
-    downvote_count: int
+    title: Optional[str] = None
+    short_description: Optional[str] = None
+    slug: Optional[str] = None
+    difficulty_index: Optional[int] = None
+    group_size_index: Optional[int] = None
+    preperation_index: Optional[int] = None
+    physical_index: Optional[int] = None
+    duration_index: Optional[int] = None
+    tags: Optional[List[str]] = None
+    age_groups: Optional[List[str]] = None
+    upvote_count: Optional[int] = None
+    downvote_count: Optional[int] = None
 
 class GameDetailSchema(GameSchema):
     markdown_content: Optional[str] = None
-    creator_username: str
-    created_at: str
+    creator_username: Optional[str] = None
+    created_at: Optional[str] = None
 
 class PaginationMetadataSchema(Schema):
     total_count: int
@@ -47,6 +100,92 @@ class GameListResponseSchema(Schema):
     games: List[GameSchema]
     pagination: PaginationMetadataSchema
 
+class GameBatchResponseSchema(Schema):
+    games: List[GameDetailSchema]
+    missing: List[str]
+
+class SimilarGameSchema(Schema):
+    title: str
+    slug: str
+    short_description: Optional[str] = None
+    distance: float
+
+class MaterialGameSchema(Schema):
+    title: str
+    slug: str
+    short_description: Optional[str] = None
+    materials: List[str]
+
+class MaterialGameListResponseSchema(Schema):
+    games: List[MaterialGameSchema]
+    pagination: PaginationMetadataSchema
+
+class PlannedGameSchema(Schema):
+    slug: str
+    title: str
+    start_minute: int
+    minutes: int
+    physical_index: int
+
+class SessionPlanSchema(Schema):
+    games: List[PlannedGameSchema]
+    total_minutes: int
+    candidate_count: int
+    complete: bool
+
+class GameChangeSchema(Schema):
+    id: int
+    slug: str
+    deleted: bool
+    changed_at: str
+    game: Optional[GameDetailSchema] = None
+
+class ChangeFeedResponseSchema(Schema):
+    changes: List[GameChangeSchema]
+    cursor: Optional[str] = None
+    has_more: bool
+
+class SuggestionSchema(Schema):
+    kind: str
+    label: str
+    slug: Optional[str] = None
+
+class RecommendedGameSchema(Schema):
+    title: str
+    slug: str
+    short_description: Optional[str] = None
+    score: float
+
+class GameImageSchema(Schema):
+    caption: str
+    width: int
+    height: int
+    url: str
+    webp_srcset: str
+    jpeg_srcset: str
+
+class RevisionSchema(Schema):
+    number: int
+    created_at: str
+    author_username: Optional[str] = None
+    is_snapshot: bool
+    content_length: int
+
+class RevisionDetailSchema(RevisionSchema):
+    markdown_content: str
+
+class RevisionDiffSchema(Schema):
+    from_number: int
+    to_number: int
+    diff: str
+
+class RevisionStorageSchema(Schema):
+    revisions: int
+    snapshots: int
+    stored_size: int
+    full_size: int
+    ratio: float
+
 
 class ErrorResponseSchema(Schema):
     error: str
@@ -54,17 +193,64 @@ class ErrorResponseSchema(Schema):
 class NotFoundResponseSchema(Schema):
     detail: str
 
+GAME_FIELD_GETTERS: Dict[str, Callable[[Game], Any]] = {
+    "title": lambda game: game.title,
+    "short_description": lambda game: game.short_description,
+    "slug": lambda game: game.slug,
+    "difficulty_index": lambda game: game.difficulty_index,
+    "group_size_index": lambda game: game.group_size_index,
+    "preperation_index": lambda game: game.preperation_index,
+    "physical_index": lambda game: game.physical_index,
+    "duration_index": lambda game: game.duration_index,
+    "tags": lambda game: game.get_tags(),
+    "age_groups": lambda game: game.get_age_groups(),
+    "upvote_count": lambda game: game.get_upvote_count(),
+    "downvote_count": lambda game: game.get_downvote_count(),
+    "markdown_content": lambda game: game.markdown_content,
+    "creator_username": lambda game: game.creator.username,
+    "created_at": lambda game: game.created_at.isoformat(),
+}
+
+def _parse_fields(fields: List[str]) -> List[str]:
+    """Split comma-separated field values into a flat list of field names."""
+    return [name.strip() for value in fields for name in value.split(",") if name.strip()]
+
+def _get_unknown_fields(fields: List[str], schema: type[Schema]) -> List[str]:
+    """Return the requested fields the given schema does not provide."""
+    return [field for field in fields if field not in schema.model_fields]
+
+def _serialize_game(game: Game, fields: List[str]) -> Dict[str, Any]:
+    """Compute only the requested response fields for a game."""
+    return {field: GAME_FIELD_GETTERS[field](game) for field in fields}
+
+def _serialize_revision(revision) -> Dict[str, Any]:
+    """Return the metadata of a revision without its content."""
+    return {
+        "number": revision.number,
+        "created_at": revision.created_at.isoformat(),
+        "author_username": revision.author.username if revision.author else None,
+        "is_snapshot": revision.is_snapshot,
+        "content_length": revision.content_length,
+    }
+
+def _get_game_id(slug: str) -> Optional[int]:
+    """Return the id of the game with the given slug, if it exists."""
+    return Game.objects.filter(slug=slug).values_list("id", flat=True).first()
+
 @api.get(
     "/games",
+    throttle=SEARCH_THROTTLE,
     response={200: GameListResponseSchema, 400: ErrorResponseSchema},
     summary="Get a list of games",
-    description="Returns a paginated list of games with optional filtering and search options along with pagination metadata."
+    description="Returns a paginated list of games with optional filtering and search options along with pagination metadata.",
+    exclude_unset=True,
 )
+@replica_reads
 def list_games(
     request: HttpRequest,
-    start_index: int = Query(0, description="Starting index for pagination (0-based)"),
-    amount: int = Query(20, description="Number of games to return per page (max 50)"),
-    q: str = Query("", description="Search query for finding games by title, description, and content"),
+    start_index: int = Query(0, ge=0, description="Starting index for pagination (0-based)"),
+    amount: int = Query(20, ge=1, description="Number of games to return per page (max 50)"),
+    q: str = Query("", description="Search query for finding games by title, description, and content; supports \"phrases\", -exclusions and title:/description:/content: operators"),
     search_in: List[str] = Query(["all"], description="Fields to search in: 'title', 'description', 'content', or 'all'"),
     tag_filter: List[str] = Query([], description="List of tags to filter games by"),
     age_group_filter: List[str] = Query([], description="List of age groups to filter games by"),
@@ -78,18 +264,21 @@ def list_games(
     max_physical_index: int = Query(10, description="Maximum physical activity level (1-10)"),
     min_duration_index: int = Query(0, description="Minimum game duration level (1-10)"),
     max_duration_index: int = Query(10, description="Maximum game duration level (1-10)"),
-    sort_by: str = Query("relevance", description="Sort results by: 'relevance', 'title', 'newest', 'upvotes'"),
+    sort_by: str = Query("relevance", description="Sort results by: 'relevance', 'title', 'newest', 'upvotes', 'trending' (votes of the last week, recent ones weighted more)"),
+    fields: List[str] = Query([], description="Game fields to include in the response (e.g., 'title,slug'); all fields if empty"),
 ):
     start_index = int(start_index)
     amount = int(amount)
 
     if amount > 50:
-        return JsonResponse(
-            ErrorResponseSchema(error="Amount exceeds maximum limit of 50 games per request"),
-            status=400
-        )
+        return 400, ErrorResponseSchema(error="Amount exceeds maximum limit of 50 games per request")
+
+    requested_fields = _parse_fields(fields)
+    unknown_fields = _get_unknown_fields(requested_fields, GameSchema)
+    if unknown_fields:
+        return 400, ErrorResponseSchema(error=f"Unknown fields: {', '.join(unknown_fields)}")
 
-    games_queryset = search_games(
+    criteria = dict(
         query=q,
         search_in=search_in,
         tag_filter=tag_filter,
@@ -104,68 +293,352 @@ def list_games(
         max_physical_index=max_physical_index,
         min_duration_index=min_duration_index,
         max_duration_index=max_duration_index,
-        sort_by=sort_by
+        sort_by=sort_by,
     )
+    started = time.perf_counter()
+    results = get_search_results(fields=requested_fields or None, **criteria)
+    response = build_game_list_response(results, start_index, amount, requested_fields)
+    log_search(criteria, results.total_count, time.perf_counter() - started, results.cache_hit)
+
+    return response
+
+@api.get(
+    "/games/suggest",
+    throttle=SUGGEST_THROTTLE,
+    response=List[SuggestionSchema],
+    summary="Get typeahead suggestions",
+    description="Returns the most popular game titles and tags starting with the prefix, served from an in-memory index."
+)
+def suggest_games(
+    request: HttpRequest,
+    prefix: str = Query(..., description="Beginning of a game title or tag name"),
+    limit: int = Query(10, ge=1, le=MAX_SUGGESTIONS, description=f"Number of suggestions to return (max {MAX_SUGGESTIONS})"),
+):
+    return suggestion_index.suggest(prefix, limit=limit)
 
-    games = get_paginated_games(games_queryset, start_index, amount)
-
-    pagination_metadata = get_pagination_metadata(games_queryset, amount)
-
-    return GameListResponseSchema(
-        games=[
-            GameSchema(
-                title=game.title,
-                short_description=game.short_description,
-                slug=game.slug,
-                difficulty_index=game.difficulty_index,
-                group_size_index=game.group_size_index,
-                preperation_index=game.preperation_index,
-                physical_index=game.physical_index,
-                duration_index=game.duration_index,
-                tags=game.get_tags(),
-                age_groups=game.get_age_groups(),
-                upvote_count=game.get_upvote_count(),
-                downvote_count=game.get_downvote_count(),
-            ) for game in games
+@api.get(
+    "/games/by-materials",
+    throttle=SEARCH_THROTTLE,
+    response={200: MaterialGameListResponseSchema, 400: ErrorResponseSchema},
+    summary="Get the games playable with given materials",
+    description="Returns the games whose required materials are all among the given ones, looked up in the materials index. Games that list no materials are not included.",
+)
+@replica_reads
+def list_games_by_materials(
+    request: HttpRequest,
+    materials: List[str] = Query(..., description="Materials at hand, comma-separated or repeated (e.g., 'ball,rope,augenbinde')"),
+    start_index: int = Query(0, ge=0, description="Starting index for pagination (0-based)"),
+    amount: int = Query(20, ge=1, description="Number of games to return per page (max 50)"),
+):
+    if amount > 50:
+        return 400, ErrorResponseSchema(error="Amount exceeds maximum limit of 50 games per request")
+
+    names = [name.strip() for value in materials for name in value.split(",") if name.strip()]
+    cards = find_playable_games(names)
+    total_count = cards.count()
+    page = list(cards.only("game_id", "title", "slug", "short_description")[start_index:start_index + amount])
+    materials_by_game = get_materials_by_game(card.game_id for card in page)
+
+    return {
+        "games": [
+            {
+                "title": card.title,
+                "slug": card.slug,
+                "short_description": card.short_description,
+                "materials": materials_by_game.get(card.game_id, []),
+            }
+            for card in page
         ],
-        pagination=PaginationMetadataSchema(
-            total_count=pagination_metadata["total_count"],
-            total_pages=pagination_metadata["total_pages"]
-        )
+        "pagination": {"total_count": total_count, "total_pages": math.ceil(total_count / amount)},
+    }
+
+@api.get(
+    "/planner",
+    throttle=SEARCH_THROTTLE,
+    response={200: SessionPlanSchema, 400: ErrorResponseSchema},
+    summary="Plan a session of games",
+    description=f"Returns a sequence of well-rated games that fills the given time, including {TRANSITION_MINUTES} minutes between games, with alternating physical intensity. Candidates pass the same filters as the game list; 'complete' is false if the search was cut short by its time budget.",
+)
+@replica_reads
+def plan_games(
+    request: HttpRequest,
+    total_minutes: int = Query(..., description=f"Length of the session in minutes (max {MAX_TOTAL_MINUTES})"),
+    tag_filter: List[str] = Query([], description="List of tags the games must have"),
+    age_group_filter: List[str] = Query([], description="List of age groups the games must suit"),
+    min_difficulty_index: int = Query(0, description="Minimum difficulty level (1-10)"),
+    max_difficulty_index: int = Query(10, description="Maximum difficulty level (1-10)"),
+    min_group_size_index: int = Query(0, description="Minimum group size level (1-10)"),
+    max_group_size_index: int = Query(10, description="Maximum group size level (1-10)"),
+    min_preperation_index: int = Query(0, description="Minimum preparation level (1-10)"),
+    max_preperation_index: int = Query(10, description="Maximum preparation level (1-10)"),
+    min_physical_index: int = Query(0, description="Minimum physical activity level (1-10)"),
+    max_physical_index: int = Query(10, description="Maximum physical activity level (1-10)"),
+    min_duration_index: int = Query(0, description="Minimum game duration level (1-10)"),
+    max_duration_index: int = Query(10, description="Maximum game duration level (1-10)"),
+):
+    if not 0 < total_minutes <= MAX_TOTAL_MINUTES:
+        return 400, ErrorResponseSchema(error=f"total_minutes must be between 1 and {MAX_TOTAL_MINUTES}")
+
+    return plan_session(
+        total_minutes,
+        tag_filter=tag_filter,
+        age_group_filter=age_group_filter,
+        min_difficulty_index=min_difficulty_index,
+        max_difficulty_index=max_difficulty_index,
+        min_group_size_index=min_group_size_index,
+        max_group_size_index=max_group_size_index,
+        min_preperation_index=min_preperation_index,
+        max_preperation_index=max_preperation_index,
+        min_physical_index=min_physical_index,
+        max_physical_index=max_physical_index,
+        min_duration_index=min_duration_index,
+        max_duration_index=max_duration_index,
     )
 
+@api.get(
+    "/games/changes",
+    throttle=DETAIL_THROTTLE,
+    response={200: ChangeFeedResponseSchema, 400: ErrorResponseSchema, 410: ErrorResponseSchema},
+    summary="Get the games changed since a cursor",
+    description="Returns the games created, changed (including tags, age groups and vote counts) or deleted after the cursor, oldest first. Pass the returned cursor as 'since' to continue; an empty 'since' starts a full sync. A 410 response means the cursor expired and the mirror has to resync from the start.",
+)
+def get_game_changes(
+    request: HttpRequest,
+    since: str = Query("", description="Cursor returned by the previous request; empty to start from the beginning"),
+    limit: int = Query(100, description=f"Maximum number of changes to return (max {MAX_CHANGES})"),
+):
+    # Read from the primary: a lagging replica could hide changes before the returned cursor
+    try:
+        cursor = Cursor.parse(since) if since else None
+    except ValueError:
+        return 400, ErrorResponseSchema(error=f"Invalid cursor: {since}")
+    try:
+        batch = get_changes(cursor, limit=limit)
+    except CursorExpired:
+        return 410, ErrorResponseSchema(error="Cursor expired, start a full sync with an empty 'since'")
+
+    response_fields = list(GameDetailSchema.model_fields)
+    return {
+        "changes": [
+            {
+                "id": change.game_id,
+                "slug": change.slug,
+                "deleted": change.game is None,
+                "changed_at": change.changed_at.isoformat(),
+                "game": None if change.game is None else _serialize_game(change.game, response_fields),
+            }
+            for change in batch.changes
+        ],
+        "cursor": None if batch.cursor is None else str(batch.cursor),
+        "has_more": batch.has_more,
+    }
+
+@api.get(
+    "/games/batch",
+    throttle=DETAIL_THROTTLE,
+    response={200: GameBatchResponseSchema, 400: ErrorResponseSchema},
+    summary="Get details for many games",
+    description=f"Returns detailed information for up to {MAX_BATCH_SLUGS} games in one request. Slugs that do not exist are listed in 'missing'.",
+    exclude_unset=True,
+)
+def get_game_batch(
+    request: HttpRequest,
+    slug: List[str] = Query(..., description=f"Slugs of the games to fetch (max {MAX_BATCH_SLUGS})"),
+    fields: List[str] = Query([], description="Game fields to include in the response (e.g., 'title,slug'); all fields if empty"),
+):
+    slugs = list(dict.fromkeys(slug))
+    if len(slugs) > MAX_BATCH_SLUGS:
+        return 400, ErrorResponseSchema(error=f"Batch exceeds maximum limit of {MAX_BATCH_SLUGS} games per request")
+
+    requested_fields = _parse_fields(fields)
+    unknown_fields = _get_unknown_fields(requested_fields, GameDetailSchema)
+    if unknown_fields:
+        return 400, ErrorResponseSchema(error=f"Unknown fields: {', '.join(unknown_fields)}")
+
+    games_by_slug = get_games_by_slugs(slugs, fields=requested_fields or None)
+    response_fields = requested_fields or list(GameDetailSchema.model_fields)
+
+    return {
+        "games": [_serialize_game(games_by_slug[game_slug], response_fields) for game_slug in slugs if game_slug in games_by_slug],
+        "missing": [game_slug for game_slug in slugs if game_slug not in games_by_slug],
+    }
+
 @api.get(
     "/games/{slug}",
-    response={200: GameDetailSchema, 404: NotFoundResponseSchema},
+    throttle=DETAIL_THROTTLE,
+    response={200: GameDetailSchema, 400: ErrorResponseSchema, 404: NotFoundResponseSchema},
     summary="Get game details by slug",
-    description="Returns detailed information about a specific game identified by its slug."
+    description="Returns detailed information about a specific game identified by its slug.",
+    exclude_unset=True,
 )
+@replica_reads
 def get_game_detail(
     request: HttpRequest,
     slug: str = Path(..., description="The unique slug identifier for the game"),
+    fields: List[str] = Query([], description="Game fields to include in the response (e.g., 'title,markdown_content'); all fields if empty"),
 ):
-    game = get_game_by_slug(slug)
+    requested_fields = _parse_fields(fields)
+    unknown_fields = _get_unknown_fields(requested_fields, GameDetailSchema)
+    if unknown_fields:
+        return 400, ErrorResponseSchema(error=f"Unknown fields: {', '.join(unknown_fields)}")
+
+    game = get_game_by_slug(slug, fields=requested_fields or None)
 
     if not game:
-        return JsonResponse(
-            NotFoundResponseSchema(detail=f"Game with slug '{slug}' not found"),
-            status=404
-        )
-
-    return GameDetailSchema(
-        title=game.title,
-        short_description=game.short_description,
-        slug=game.slug,
-        difficulty_index=game.difficulty_index,
-        group_size_index=game.group_size_index,
-        preperation_index=game.preperation_index,
-        physical_index=game.physical_index,
-        duration_index=game.duration_index,
-        tags=game.get_tags(),
-        age_groups=game.get_age_groups(),
-        upvote_count=game.get_upvote_count(),
-        downvote_count=game.get_downvote_count(),
-        markdown_content=game.markdown_content,
-        creator_username=game.creator.username,
-        created_at=game.created_at.isoformat(),
-    )
+        return 404, NotFoundResponseSchema(detail=f"Game with slug '{slug}' not found")
+
+    response_fields = requested_fields or list(GameDetailSchema.model_fields)
+    return _serialize_game(game, response_fields)
+
+@api.get(
+    "/games/{slug}/images",
+    throttle=DETAIL_THROTTLE,
+    response={200: List[GameImageSchema], 404: NotFoundResponseSchema},
+    summary="Get the images of a game",
+    description="Returns the setup diagrams and photos of a game with srcsets of resized WebP and JPEG renditions."
+)
+@replica_reads
+def get_game_image_list(
+    request: HttpRequest,
+    slug: str = Path(..., description="The unique slug identifier for the game"),
+):
+    game_id = _get_game_id(slug)
+    if game_id is None:
+        return 404, NotFoundResponseSchema(detail=f"Game with slug '{slug}' not found")
+
+    return get_game_images(game_id)
+
+@api.get(
+    "/games/{slug}/similar",
+    throttle=DETAIL_THROTTLE,
+    response={200: List[SimilarGameSchema], 404: NotFoundResponseSchema},
+    summary="Get games similar to a game",
+    description="Returns the nearest games by difficulty, group size, preparation, physical activity, duration, tags and age groups."
+)
+def get_similar_game_list(
+    request: HttpRequest,
+    slug: str = Path(..., description="The unique slug identifier for the game"),
+    limit: int = Query(TOP_K, ge=1, le=TOP_K, description=f"Number of similar games to return (max {TOP_K})"),
+):
+    similar_games = get_similar_games(slug, limit=limit)
+
+    if not similar_games and not Game.objects.filter(slug=slug).exists():
+        return 404, NotFoundResponseSchema(detail=f"Game with slug '{slug}' not found")
+
+    return [
+        SimilarGameSchema(
+            title=entry.similar_game.title,
+            slug=entry.similar_game.slug,
+            short_description=entry.similar_game.short_description,
+            distance=entry.distance,
+        ) for entry in similar_games
+    ]
+
+@api.get(
+    "/games/{slug}/revisions",
+    throttle=DETAIL_THROTTLE,
+    response={200: List[RevisionSchema], 404: NotFoundResponseSchema},
+    summary="List the revisions of a game",
+    description="Returns the revision history of a game's content, newest first."
+)
+def get_revision_list(
+    request: HttpRequest,
+    slug: str = Path(..., description="The unique slug identifier for the game"),
+):
+    game_id = _get_game_id(slug)
+    if game_id is None:
+        return 404, NotFoundResponseSchema(detail=f"Game with slug '{slug}' not found")
+
+    return [_serialize_revision(revision) for revision in list_revisions(game_id)]
+
+@api.get(
+    "/games/{slug}/revisions/diff",
+    throttle=DETAIL_THROTTLE,
+    response={200: RevisionDiffSchema, 404: NotFoundResponseSchema},
+    summary="Diff two revisions of a game",
+    description="Returns a unified diff that turns one revision of a game's content into another."
+)
+def get_revision_diff(
+    request: HttpRequest,
+    slug: str = Path(..., description="The unique slug identifier for the game"),
+    from_number: int = Query(..., description="Revision number to diff from"),
+    to_number: int = Query(..., description="Revision number to diff to"),
+):
+    game_id = _get_game_id(slug)
+    diff = diff_revisions(game_id, from_number, to_number) if game_id is not None else None
+    if diff is None:
+        return 404, NotFoundResponseSchema(detail=f"Revisions {from_number} and {to_number} of game '{slug}' not found")
+
+    return RevisionDiffSchema(from_number=from_number, to_number=to_number, diff=diff)
+
+@api.get(
+    "/games/{slug}/revisions/storage",
+    throttle=DETAIL_THROTTLE,
+    response={200: RevisionStorageSchema, 404: NotFoundResponseSchema},
+    summary="Report the storage used by a game's history",
+    description="Compares the characters stored for a game's revisions with storing every revision in full."
+)
+def get_revision_storage(
+    request: HttpRequest,
+    slug: str = Path(..., description="The unique slug identifier for the game"),
+):
+    game_id = _get_game_id(slug)
+    if game_id is None:
+        return 404, NotFoundResponseSchema(detail=f"Game with slug '{slug}' not found")
+
+    return get_storage_report([game_id])
+
+@api.get(
+    "/games/{slug}/revisions/{number}",
+    throttle=DETAIL_THROTTLE,
+    response={200: RevisionDetailSchema, 404: NotFoundResponseSchema},
+    summary="Get a revision of a game",
+    description="Returns one revision of a game's content, rebuilt from the nearest snapshot."
+)
+def get_revision_detail(
+    request: HttpRequest,
+    slug: str = Path(..., description="The unique slug identifier for the game"),
+    number: int = Path(..., description="The revision number"),
+):
+    game_id = _get_game_id(slug)
+    result = get_revision(game_id, number) if game_id is not None else None
+    if result is None:
+        return 404, NotFoundResponseSchema(detail=f"Revision {number} of game '{slug}' not found")
+
+    revision, content = result
+    return {**_serialize_revision(revision), "markdown_content": content}
+
+@api.get(
+    "/users/me/recommendations",
+    auth=django_auth,
+    response=List[RecommendedGameSchema],
+    summary="Get game recommendations for the current user",
+    description="Returns games liked by players who upvoted the same games as the logged-in user."
+)
+def get_my_recommendations(
+    request: HttpRequest,
+    limit: int = Query(20, ge=1, le=50, description="Number of recommendations to return (max 50)"),
+):
+    recommendations = get_recommendations_for_user(request.user, limit=limit)
+
+    return [
+        RecommendedGameSchema(
+            title=game.title,
+            slug=game.slug,
+            short_description=game.short_description,
+            score=score,
+        ) for game, score in recommendations
+    ]
+
+@api.get(
+    "/metrics/throttling",
+    auth=django_auth,
+    response={200: Dict[str, Dict[str, int]], 403: ErrorResponseSchema},
+    summary="Get rate limiting metrics",
+    description="Returns the number of admitted and rejected requests per rate limit scope. Staff only."
+)
+def get_throttling_metrics(request: HttpRequest):
+    if not request.user.is_staff:
+        return 403, ErrorResponseSchema(error="Staff access required")
+
+    return get_throttle_metrics()
@@ -1,5 +1,9 @@
+
 from django.apps import AppConfig
 
 class WikiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'wiki'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,108 @@
+"""
+Game card read model for the wiki app.
+
+A GameCard holds everything the game list serves for one game: its columns,
+tag names, age-group labels and vote totals. Cards are refreshed by model
+signals whenever one of these inputs changes, so list pages are read from a
+single table without joins or aggregation. Refreshed cards invalidate the
+cached search results; vote totals are only picked up when these expire.
+"""
+
+from collections import defaultdict
+from typing import Iterable, List, Optional
+
+from django.db.models import Count, Q
+
+from .models import Game, GameCard, Vote
+from .services import invalidate_search_results
+
+CARD_COLUMNS = [
+    "title",
+    "short_description",
+    "slug",
+    "difficulty_index",
+    "group_size_index",
+    "preperation_index",
+    "physical_index",
+    "duration_index",
+    "created_at",
+]
+CARD_UPDATE_FIELDS = CARD_COLUMNS + ["tags", "age_groups", "upvote_count", "downvote_count"]
+REBUILD_CHUNK_SIZE = 1000
+
+
+def build_cards(game_ids: Iterable[int]) -> List[GameCard]:
+    """Compute the cards of the given games with a constant number of queries."""
+    game_ids = list(game_ids)
+    tags = defaultdict(list)
+    for game_id, name in (
+        Game.tags.through.objects.filter(game_id__in=game_ids).order_by("id").values_list("game_id", "tag__name")
+    ):
+        tags[game_id].append(name)
+
+    age_groups = defaultdict(list)
+    for row in Game.age_groups.through.objects.filter(game_id__in=game_ids).select_related("agegroup").order_by("id"):
+        age_groups[row.game_id].append(str(row.agegroup))
+
+    votes = {
+        row["game_id"]: row
+        for row in Vote.objects.filter(game_id__in=game_ids).values("game_id").annotate(
+            upvotes=Count("id", filter=Q(value=1)),
+            downvotes=Count("id", filter=Q(value=-1)),
+        ).order_by()
+    }
+
+    return [
+        GameCard(
+            game_id=row["id"],
+            tags=tags[row["id"]],
+            age_groups=age_groups[row["id"]],
+            upvote_count=votes.get(row["id"], {}).get("upvotes", 0),
+            downvote_count=votes.get(row["id"], {}).get("downvotes", 0),
+            **{column: row[column] for column in CARD_COLUMNS},
+        )
+        for row in Game.objects.filter(pk__in=game_ids).values("id", *CARD_COLUMNS)
+    ]
+
+
+def refresh_game_cards(game_ids: Iterable[int]) -> None:
+    """Rebuild and upsert the cards of the given games."""
+    cards = build_cards(game_ids)
+    if cards:
+        GameCard.objects.bulk_create(
+            cards,
+            update_conflicts=True,
+            unique_fields=["game"],
+            update_fields=CARD_UPDATE_FIELDS,
+        )
+        invalidate_search_results()
+
+
+def refresh_vote_counts(game_id: int) -> None:
+    """Recount the votes shown on a game's card."""
+    totals = Vote.objects.filter(game_id=game_id).aggregate(
+        upvotes=Count("id", filter=Q(value=1)),
+        downvotes=Count("id", filter=Q(value=-1)),
+    )
+    GameCard.objects.filter(pk=game_id).update(
+        upvote_count=totals["upvotes"], downvote_count=totals["downvotes"]
+    )
+
+
+def get_game_ids_for_tag(tag_id: int) -> List[int]:
+    """Return the games whose cards show a tag."""
+    return list(Game.tags.through.objects.filter(tag_id=tag_id).values_list("game_id", flat=True))
+
+
+def get_game_ids_for_age_group(age_group_id: int) -> List[int]:
+    """Return the games whose cards show an age group."""
+    return list(Game.age_groups.through.objects.filter(agegroup_id=age_group_id).values_list("game_id", flat=True))
+
+
+def rebuild_game_cards(chunk_size: Optional[int] = None) -> int:
+    """Rebuild every card in chunks and return the number of cards."""
+    chunk_size = chunk_size or REBUILD_CHUNK_SIZE
+    game_ids = list(Game.objects.order_by("id").values_list("id", flat=True))
+    for start in range(0, len(game_ids), chunk_size):
+        refresh_game_cards(game_ids[start:start + chunk_size])
+    return len(game_ids)
@@ -0,0 +1,148 @@
+"""
+Change feed of the wiki app.
+
+Mirrors keep an offline copy of the archive current by reading the games
+changed since their last sync. Every change to a game, including its tags
+and age groups, moves its updated_at forward, and deleted games leave a
+GameTombstone. Votes do not, so mirrors pick up new vote counts with the
+next change of the game. The feed merges both in (time, id) keyset
+order, so a sync reads only the changes since its cursor. Entries newer
+than CHANGE_FEED_SETTLE_SECONDS are held back until transactions that
+started before them have committed.
+"""
+
+import heapq
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Game, GameTombstone
+from .services import get_games_by_ids
+
+DEFAULT_SETTLE_SECONDS = 5
+DEFAULT_RETENTION_DAYS = 90
+MAX_CHANGES = 500
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+class CursorExpired(Exception):
+    """The cursor is older than the retained tombstones; the mirror has to resync."""
+
+
+class Cursor(NamedTuple):
+    """Position in the change feed: the time and id of the last entry read."""
+
+    changed_at: datetime
+    game_id: int
+
+    def __str__(self) -> str:
+        return f"{(self.changed_at - EPOCH) // timedelta(microseconds=1)}-{self.game_id}"
+
+    @classmethod
+    def parse(cls, value: str) -> "Cursor":
+        """Parse a cursor returned by the feed; raises ValueError if malformed."""
+        microseconds, _, game_id = value.partition("-")
+        try:
+            changed_at = EPOCH + timedelta(microseconds=int(microseconds))
+        except OverflowError:
+            raise ValueError(f"Cursor time out of range: {microseconds}") from None
+        return cls(changed_at, int(game_id))
+
+
+class Change(NamedTuple):
+    """A game that was created or changed, or a deleted game if game is None."""
+
+    game_id: int
+    slug: str
+    changed_at: datetime
+    game: Optional[Game]
+
+
+class ChangeBatch(NamedTuple):
+    """One page of the change feed."""
+
+    changes: List[Change]
+    cursor: Optional[Cursor]
+    has_more: bool
+
+
+def get_retention_days() -> int:
+    """Return how long tombstones, and therefore cursors, stay valid."""
+    return getattr(settings, "CHANGE_FEED_RETENTION_DAYS", DEFAULT_RETENTION_DAYS)
+
+
+def touch_games(game_ids: Iterable[int]) -> None:
+    """Mark games as changed after an edit that did not save them."""
+    game_ids = list(game_ids)
+    if game_ids:
+        Game.objects.filter(id__in=game_ids).update(updated_at=timezone.now())
+
+
+def record_tombstone(game_id: int, slug: str) -> None:
+    """Remember a deleted game for the change feed."""
+    GameTombstone.objects.update_or_create(game_id=game_id, defaults={"slug": slug, "deleted_at": timezone.now()})
+
+
+def _after(cursor: Optional[Cursor], time_field: str, id_field: str) -> Q:
+    """Return the keyset condition for entries after the cursor."""
+    if cursor is None:
+        return Q()
+    return Q(**{f"{time_field}__gt": cursor.changed_at}) | Q(
+        **{time_field: cursor.changed_at, f"{id_field}__gt": cursor.game_id}
+    )
+
+
+def get_changes(cursor: Optional[Cursor], limit: int = 100, now: Optional[datetime] = None) -> ChangeBatch:
+    """
+    Return the games created, changed or deleted after a cursor.
+
+    Args:
+        cursor: Position returned by the previous call; None reads from the start
+        limit: Maximum number of changes, capped at MAX_CHANGES
+        now: Current time, for tests
+
+    Returns:
+        ChangeBatch with the changes in feed order, the cursor to continue
+        from and whether more changes are available
+
+    Raises:
+        CursorExpired: If tombstones after the cursor may have been pruned
+    """
+    now = now or timezone.now()
+    if cursor is not None and cursor.changed_at < now - timedelta(days=get_retention_days()):
+        raise CursorExpired()
+    limit = max(1, min(limit, MAX_CHANGES))
+    horizon = now - timedelta(seconds=getattr(settings, "CHANGE_FEED_SETTLE_SECONDS", DEFAULT_SETTLE_SECONDS))
+
+    updated = (
+        Game.objects.filter(_after(cursor, "updated_at", "id"), updated_at__lte=horizon)
+        .order_by("updated_at", "id").values_list("updated_at", "id", "slug")[:limit + 1]
+    )
+    deleted = (
+        GameTombstone.objects.filter(_after(cursor, "deleted_at", "game_id"), deleted_at__lte=horizon)
+        .order_by("deleted_at", "game_id").values_list("deleted_at", "game_id", "slug")[:limit + 1]
+    )
+    entries: List[Tuple[datetime, int, str, bool]] = list(heapq.merge(
+        ((changed_at, game_id, slug, False) for changed_at, game_id, slug in updated),
+        ((changed_at, game_id, slug, True) for changed_at, game_id, slug in deleted),
+    ))
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    games = get_games_by_ids([game_id for _, game_id, _, is_deleted in entries if not is_deleted])
+    changes = [
+        Change(game_id, slug, changed_at, None if is_deleted else games.get(game_id))
+        for changed_at, game_id, slug, is_deleted in entries
+    ]
+    next_cursor = Cursor(entries[-1][0], entries[-1][1]) if entries else cursor
+    return ChangeBatch(changes, next_cursor, has_more)
+
+
+def prune_tombstones() -> int:
+    """Delete the tombstones older than the retention period and return their number."""
+    cutoff = timezone.now() - timedelta(days=get_retention_days())
+    deleted, _ = GameTombstone.objects.filter(deleted_at__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,244 @@
+"""
+Near-duplicate detection of the wiki app.
+
+Every game gets a MinHash signature of its title and content, stored with
+its LSH band buckets. When a game is saved, the games sharing a bucket with
+it are looked up through the (band, bucket) index, so the check touches only
+a few candidates instead of the archive; buckets of more than
+MAX_BUCKET_SIZE games are skipped. Candidates whose signatures are similar
+enough are flagged as duplicates for moderators, always the newer game of a
+pair as the duplicate of the older one. The
+find_duplicates command signs the whole archive in parallel chunks and
+groups all similar games into clusters.
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .minhash import compute_signature, compute_signatures, estimate_similarity, get_band_hashes, load_signature
+from .models import DuplicateFlag, Game, GameSignature, GameSignatureBand
+
+DEFAULT_SIMILARITY_THRESHOLD = 0.7
+SCAN_CHUNK_SIZE = 1000
+# Buckets shared by more games come from boilerplate text and are not compared pairwise
+MAX_BUCKET_SIZE = 50
+
+
+def get_similarity_threshold() -> float:
+    """Return the estimated similarity above which games count as duplicates."""
+    return getattr(settings, "DUPLICATE_SIMILARITY_THRESHOLD", DEFAULT_SIMILARITY_THRESHOLD)
+
+
+def get_game_text(title: str, markdown_content: Optional[str]) -> str:
+    """Return the text a game's signature is computed from."""
+    return f"{title}\n{markdown_content or ''}"
+
+
+def store_signatures(signatures: Iterable[Tuple[int, Optional[bytes]]]) -> None:
+    """Replace the stored signatures and band buckets of the given games."""
+    signatures = list(signatures)
+    game_ids = [game_id for game_id, _ in signatures]
+    rows = [(game_id, data) for game_id, data in signatures if data is not None]
+    with transaction.atomic():
+        GameSignature.objects.filter(game_id__in=game_ids).delete()
+        GameSignatureBand.objects.filter(game_id__in=game_ids).delete()
+        GameSignature.objects.bulk_create(
+            [GameSignature(game_id=game_id, signature=data) for game_id, data in rows], batch_size=1000
+        )
+        GameSignatureBand.objects.bulk_create(
+            [
+                GameSignatureBand(game_id=game_id, band=band, bucket=bucket)
+                for game_id, data in rows
+                for band, bucket in enumerate(get_band_hashes(load_signature(data)))
+            ],
+            batch_size=1000,
+        )
+
+
+def find_similar_games(game_id: int, signature, threshold: Optional[float] = None) -> List[Tuple[int, float]]:
+    """
+    Return the indexed games similar to a signature, most similar first.
+
+    Args:
+        game_id: Game the signature belongs to, left out of the result
+        signature: MinHash signature as returned by compute_signature
+        threshold: Minimum estimated similarity; DUPLICATE_SIMILARITY_THRESHOLD if None
+
+    Returns:
+        List of (game id, estimated similarity) pairs
+    """
+    threshold = get_similarity_threshold() if threshold is None else threshold
+    buckets = Q()
+    for band, bucket in enumerate(get_band_hashes(signature)):
+        buckets |= Q(band=band, bucket=bucket)
+    for band, bucket in (
+        GameSignatureBand.objects.filter(buckets).values("band", "bucket").annotate(members=Count("id"))
+        .filter(members__gt=MAX_BUCKET_SIZE).values_list("band", "bucket")
+    ):
+        buckets &= ~Q(band=band, bucket=bucket)
+    candidate_ids = set(
+        GameSignatureBand.objects.filter(buckets).exclude(game_id=game_id).values_list("game_id", flat=True)
+    )
+    similar = []
+    for other_id, data in GameSignature.objects.filter(game_id__in=candidate_ids).values_list("game_id", "signature"):
+        similarity = estimate_similarity(signature, load_signature(data))
+        if similarity >= threshold:
+            similar.append((other_id, similarity))
+    return sorted(similar, key=lambda pair: (-pair[1], pair[0]))
+
+
+def check_game_duplicates(game_id: int) -> List[DuplicateFlag]:
+    """Re-sign a saved game and flag the newer game of each similar pair it is part of."""
+    game = Game.objects.filter(pk=game_id).values_list("title", "markdown_content").first()
+    if game is None:
+        return []
+    signature = compute_signature(get_game_text(*game))
+    store_signatures([(game_id, None if signature is None else signature.tobytes())])
+    if signature is None:
+        return []
+
+    similar = dict(find_similar_games(game_id, signature))
+    # A pair is flagged once, on the newer game (the higher id), whichever of the two was saved
+    pairs = {other_id: (max(game_id, other_id), min(game_id, other_id)) for other_id in similar}
+    flagged = set(
+        DuplicateFlag.objects.filter(Q(game_id=game_id) | Q(duplicate_of_id=game_id))
+        .filter(Q(game_id__in=similar) | Q(duplicate_of_id__in=similar))
+        .values_list("game_id", "duplicate_of_id")
+    )
+    flags = [
+        DuplicateFlag(game_id=pairs[other_id][0], duplicate_of_id=pairs[other_id][1], similarity=similarity)
+        for other_id, similarity in similar.items()
+        if pairs[other_id] not in flagged
+    ]
+    DuplicateFlag.objects.bulk_create(flags, ignore_conflicts=True)
+    return flags
+
+
+def _iter_game_chunks(chunk_size: int) -> Iterable[List[Tuple[int, str]]]:
+    """Yield the texts of all games in keyset-paginated chunks."""
+    last_id = 0
+    while True:
+        rows = list(
+            Game.objects.filter(id__gt=last_id).order_by("id")
+            .values_list("id", "title", "markdown_content")[:chunk_size]
+        )
+        if not rows:
+            return
+        yield [(game_id, get_game_text(title, markdown_content)) for game_id, title, markdown_content in rows]
+        last_id = rows[-1][0]
+
+
+def sign_archive(
+    workers: Optional[int] = None,
+    chunk_size: int = SCAN_CHUNK_SIZE,
+    report: Optional[Callable[[int], None]] = None,
+) -> int:
+    """
+    Compute and store the signatures of all games on a process pool.
+
+    Args:
+        workers: Number of processes; all cores if None
+        chunk_size: Games per chunk sent to a worker
+        report: Called with the number of games signed so far
+
+    Returns:
+        The number of games signed
+    """
+    workers = workers or os.cpu_count() or 1
+    signed = 0
+    pending = set()
+
+    def collect() -> None:
+        """Store the signatures of the next finished chunks."""
+        nonlocal signed
+        finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in finished:
+            pending.remove(future)
+            signatures = future.result()
+            store_signatures(signatures)
+            signed += len(signatures)
+            if report:
+                report(signed)
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        for chunk in _iter_game_chunks(chunk_size):
+            pending.add(pool.submit(compute_signatures, chunk))
+            # Bounds the chunks held in memory
+            if len(pending) >= workers * 2:
+                collect()
+        while pending:
+            collect()
+    return signed
+
+
+def _iter_candidate_pairs() -> Iterable[Tuple[int, int]]:
+    """Yield the pairs of games sharing an LSH bucket, reading the buckets in index order."""
+    bucket_rows = (
+        GameSignatureBand.objects.order_by("band", "bucket", "game_id")
+        .values_list("band", "bucket", "game_id").iterator(chunk_size=SCAN_CHUNK_SIZE)
+    )
+    current_key = None
+    members: List[int] = []
+    for band, bucket, game_id in bucket_rows:
+        if (band, bucket) != current_key:
+            yield from _bucket_pairs(members)
+            current_key, members = (band, bucket), []
+        members.append(game_id)
+    yield from _bucket_pairs(members)
+
+
+def _bucket_pairs(members: List[int]) -> Iterable[Tuple[int, int]]:
+    """Return the pairs of games in one bucket."""
+    if not 1 < len(members) <= MAX_BUCKET_SIZE:
+        return []
+    return ((first, second) for index, first in enumerate(members) for second in members[index + 1:])
+
+
+def find_duplicate_clusters(threshold: Optional[float] = None) -> List[List[Tuple[int, float]]]:
+    """
+    Group the signed games into clusters of likely duplicates.
+
+    Args:
+        threshold: Minimum estimated similarity; DUPLICATE_SIMILARITY_THRESHOLD if None
+
+    Returns:
+        Clusters of (game id, best similarity to another member), largest
+        cluster first; games without duplicates are left out
+    """
+    threshold = get_similarity_threshold() if threshold is None else threshold
+    candidate_pairs = set(_iter_candidate_pairs())
+    candidate_ids = {game_id for pair in candidate_pairs for game_id in pair}
+    signatures = {
+        game_id: load_signature(data)
+        for game_id, data in GameSignature.objects.filter(game_id__in=candidate_ids).values_list("game_id", "signature")
+    }
+
+    parents: Dict[int, int] = {}
+    best: Dict[int, float] = {}
+
+    def find(game_id: int) -> int:
+        """Return the root of a game's cluster, compressing the path."""
+        parents.setdefault(game_id, game_id)
+        while parents[game_id] != game_id:
+            parents[game_id] = parents[parents[game_id]]
+            game_id = parents[game_id]
+        return game_id
+
+    for first, second in candidate_pairs:
+        similarity = estimate_similarity(signatures[first], signatures[second])
+        if similarity < threshold:
+            continue
+        parents[find(first)] = find(second)
+        best[first] = max(best.get(first, 0.0), similarity)
+        best[second] = max(best.get(second, 0.0), similarity)
+
+    clusters: Dict[int, List[Tuple[int, float]]] = {}
+    for game_id in sorted(best):
+        clusters.setdefault(find(game_id), []).append((game_id, best[game_id]))
+    return sorted(clusters.values(), key=lambda cluster: (-len(cluster), cluster[0][0]))
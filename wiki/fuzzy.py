@@ -0,0 +1,144 @@
+"""
+Typo-tolerant title matching for the wiki app.
+
+Titles and queries are normalized (case, umlauts, ß, punctuation) and
+compared by trigram similarity. PostgreSQL uses pg_trgm with a GIN trigram
+index on the title; other databases use an in-process trigram index that
+is built on first use, kept current by model signals and rebuilt in the
+background after FUZZY_INDEX_TTL seconds.
+"""
+
+import re
+import time
+from collections import Counter
+from typing import Dict, List, Set
+
+from django.db import connection
+
+from .indexes import InMemoryIndex
+from .models import Game
+
+try:
+    from django.contrib.postgres.search import TrigramSimilarity
+    from django.db.models.functions import Greatest
+    HAS_POSTGRES_TRIGRAM = True
+except ImportError:
+    HAS_POSTGRES_TRIGRAM = False
+
+SIMILARITY_THRESHOLD = 0.3
+MAX_CANDIDATES = 50
+
+UMLAUT_FOLDS = {"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"}
+NON_ALPHANUMERIC = re.compile(r"[\W_]+")
+
+
+def normalize_search_text(text: str) -> str:
+    """Fold case, umlauts and ß and drop everything but letters and digits."""
+    folded = text.casefold()
+    for umlaut, replacement in UMLAUT_FOLDS.items():
+        folded = folded.replace(umlaut, replacement)
+    return NON_ALPHANUMERIC.sub("", folded)
+
+
+def _restore_umlauts(text: str) -> str:
+    """Turn ae/oe/ue spellings back into umlauts."""
+    for umlaut, replacement in list(UMLAUT_FOLDS.items())[:3]:
+        text = text.replace(replacement, umlaut)
+    return text
+
+
+def trigrams(text: str) -> Set[str]:
+    """Return the padded trigrams of a normalized text."""
+    padded = f"  {normalize_search_text(text)} "
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+
+class TrigramIndex(InMemoryIndex):
+    """In-process inverted index from title trigrams to game ids."""
+
+    ttl_setting = "FUZZY_INDEX_TTL"
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._postings: Dict[str, Set[int]] = {}
+        self._game_trigrams: Dict[int, Set[str]] = {}
+
+    def build(self) -> None:
+        """Index every game title."""
+        game_trigrams = {game_id: trigrams(title) for game_id, title in Game.objects.values_list("id", "title")}
+        postings: Dict[str, Set[int]] = {}
+        for game_id, grams in game_trigrams.items():
+            for gram in grams:
+                postings.setdefault(gram, set()).add(game_id)
+
+        with self._lock:
+            self._postings, self._game_trigrams = postings, game_trigrams
+            self._built_at = time.monotonic()
+
+    def search(self, query: str, limit: int = MAX_CANDIDATES) -> List[int]:
+        """Return the ids of games whose titles are similar to the query, best first."""
+        self._ensure_fresh()
+        query_trigrams = trigrams(query)
+        with self._lock:
+            overlaps = Counter(
+                game_id for gram in query_trigrams for game_id in self._postings.get(gram, ())
+            )
+            scores = {
+                game_id: shared / len(query_trigrams | self._game_trigrams[game_id])
+                for game_id, shared in overlaps.items()
+            }
+        ranked = sorted(
+            (game_id for game_id, score in scores.items() if score >= SIMILARITY_THRESHOLD),
+            key=lambda game_id: (-scores[game_id], game_id),
+        )
+        return ranked[:limit]
+
+    def update(self, game_id: int, title: str) -> None:
+        """Insert or replace the trigrams of a game title."""
+        with self._lock:
+            if self._built_at is None:
+                return
+            self._discard(game_id)
+            self._game_trigrams[game_id] = trigrams(title)
+            for gram in self._game_trigrams[game_id]:
+                self._postings.setdefault(gram, set()).add(game_id)
+
+    def remove(self, game_id: int) -> None:
+        """Drop a deleted game from the index."""
+        with self._lock:
+            self._discard(game_id)
+
+    def _discard(self, game_id: int) -> None:
+        for gram in self._game_trigrams.pop(game_id, ()):
+            self._postings.get(gram, set()).discard(game_id)
+
+
+trigram_index = TrigramIndex()
+
+
+def find_similar_titles(query: str, limit: int = MAX_CANDIDATES) -> List[int]:
+    """Return the ids of games with titles similar to the query, best first."""
+    if HAS_POSTGRES_TRIGRAM and connection.vendor == "postgresql":
+        return _find_similar_titles_postgres(query, limit)
+    return trigram_index.search(query, limit)
+
+
+def _find_similar_titles_postgres(query: str, limit: int) -> List[int]:
+    """Rank titles with pg_trgm, trying the query with folded and restored umlauts."""
+    folded = query.casefold()
+    for umlaut, replacement in UMLAUT_FOLDS.items():
+        folded = folded.replace(umlaut, replacement)
+    variants = list(dict.fromkeys([query, folded, _restore_umlauts(folded)]))
+
+    similarities = [TrigramSimilarity("title", variant) for variant in variants]
+    similarity = Greatest(*similarities) if len(similarities) > 1 else similarities[0]
+    matches = Game.objects.none()
+    for variant in variants:
+        matches = matches | Game.objects.filter(title__trigram_similar=variant)
+
+    return list(
+        matches.annotate(similarity=similarity)
+        .filter(similarity__gte=SIMILARITY_THRESHOLD)
+        .order_by("-similarity", "pk")
+        .values_list("pk", flat=True)[:limit]
+    )
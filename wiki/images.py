@@ -0,0 +1,274 @@
+"""
+Image attachments of games.
+
+Uploaded originals are stored under their SHA-256 digest, so identical
+uploads share one file. Resized WebP and JPEG renditions are rendered in a
+process pool by a background job after the upload, or on first request by
+the rendition view. Rendition names derive from the digest and the size, so
+a rendition that exists in storage never has to be rendered again.
+"""
+
+import hashlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from PIL import Image
+
+from .models import ORIGINAL_IMAGE_EXTENSIONS, GameImage
+from .thumbnails import render_renditions
+
+RENDITION_WIDTHS = (320, 640, 1280)
+RENDITION_FORMATS = ("webp", "jpeg")
+RENDITION_EXTENSIONS = {"webp": "webp", "jpeg": "jpg"}
+EXTENSION_FORMATS = {extension: image_format for image_format, extension in RENDITION_EXTENSIONS.items()}
+ORIGINALS_DIR = "game-images/originals"
+RENDITIONS_DIR = "game-images/renditions"
+# EXIF orientations that rotate the image by 90 degrees
+ROTATED_ORIENTATIONS = (5, 6, 7, 8)
+EXIF_ORIENTATION = 0x0112
+DEFAULT_PROCESS_WORKERS = 2
+# Seconds a request waits for its renditions before it is sent to the original
+DEFAULT_RENDER_TIMEOUT = 5
+RENDITION_CACHE_TIMEOUT = 60 * 60 * 24
+
+Spec = Tuple[int, str]
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_original_name(content_hash: str, extension: str) -> str:
+    """Return the storage name of an original image."""
+    return f"{ORIGINALS_DIR}/{content_hash[:2]}/{content_hash}.{extension}"
+
+
+def get_rendition_name(content_hash: str, width: int, image_format: str) -> str:
+    """Return the storage name of a rendition."""
+    return f"{RENDITIONS_DIR}/{content_hash[:2]}/{content_hash}-{width}.{RENDITION_EXTENSIONS[image_format]}"
+
+
+def get_rendition_path(content_hash: str, width: int, image_format: str) -> str:
+    """Return the path of the view that serves a rendition."""
+    return reverse("game_image_rendition", args=[content_hash, width, RENDITION_EXTENSIONS[image_format]])
+
+
+def get_all_specs() -> List[Spec]:
+    """Return every (width, format) rendition rendered for an original."""
+    return [(width, image_format) for width in RENDITION_WIDTHS for image_format in RENDITION_FORMATS]
+
+
+def store_original(game_image: GameImage) -> None:
+    """Store a newly uploaded image under its digest, reusing an identical stored file.
+
+    Also records the digest and the displayed dimensions on the instance.
+    """
+    upload = game_image.image.file
+    digest = hashlib.sha256()
+    for chunk in upload.chunks():
+        digest.update(chunk)
+    upload.seek(0)
+
+    with Image.open(upload) as image:
+        extension = ORIGINAL_IMAGE_EXTENSIONS.get(image.format)
+        if extension is None:
+            # GameImage.clean() rejects these before forms save them
+            raise ValueError(f"Unsupported image format: {image.format}")
+        width, height = image.size
+        if image.getexif().get(EXIF_ORIENTATION) in ROTATED_ORIENTATIONS:
+            width, height = height, width
+    upload.seek(0)
+
+    content_hash = digest.hexdigest()
+    name = get_original_name(content_hash, extension)
+    if not default_storage.exists(name):
+        name = default_storage.save(name, upload)
+    game_image.image = name
+    game_image.content_hash = content_hash
+    game_image.width = width
+    game_image.height = height
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Return the process pool that renders renditions in this process."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned workers do not inherit this process' database connections
+            _pool = ProcessPoolExecutor(
+                max_workers=getattr(settings, "IMAGE_PROCESS_WORKERS", DEFAULT_PROCESS_WORKERS),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def get_missing_specs(content_hash: str) -> List[Spec]:
+    """Return the renditions of an original that are not stored yet."""
+    return [
+        (width, image_format) for width, image_format in get_all_specs()
+        if not default_storage.exists(get_rendition_name(content_hash, width, image_format))
+    ]
+
+
+def _read_original(content_hash: str) -> Optional[bytes]:
+    """Return the original file with the given digest, if any image uses it."""
+    name = GameImage.objects.filter(content_hash=content_hash).values_list("image", flat=True).first()
+    if name is None:
+        return None
+    with default_storage.open(name) as original:
+        return original.read()
+
+
+def _store_renditions(content_hash: str, renditions: Dict[Spec, bytes], overwrite: bool = False) -> int:
+    """Save rendered renditions and remember that they exist."""
+    for (width, image_format), data in renditions.items():
+        name = get_rendition_name(content_hash, width, image_format)
+        if overwrite:
+            default_storage.delete(name)
+        if overwrite or not default_storage.exists(name):
+            default_storage.save(name, ContentFile(data))
+        cache.set(f"image-rendition:{name}", True, RENDITION_CACHE_TIMEOUT)
+    return len(renditions)
+
+
+def generate_renditions(
+    content_hash: str,
+    specs: Optional[List[Spec]] = None,
+    timeout: Optional[float] = None,
+) -> int:
+    """
+    Render the missing (or the given) renditions of an original and return their number.
+
+    Raises:
+        TimeoutError: If rendering takes longer than timeout seconds; the
+            renditions are still stored once the pool finishes them.
+    """
+    specs = get_missing_specs(content_hash) if specs is None else specs
+    if not specs:
+        return 0
+    source = _read_original(content_hash)
+    if source is None:
+        return 0
+    future = get_process_pool().submit(render_renditions, source, specs)
+    try:
+        renditions = future.result(timeout=timeout)
+    except TimeoutError:
+        def store_when_done(done) -> None:
+            if not done.cancelled() and done.exception() is None:
+                _store_renditions(content_hash, done.result())
+
+        future.add_done_callback(store_when_done)
+        raise
+    return _store_renditions(content_hash, renditions)
+
+
+def get_original_url(content_hash: str) -> Optional[str]:
+    """Return the storage URL of an original image, or None if no image uses it."""
+    name = GameImage.objects.filter(content_hash=content_hash).values_list("image", flat=True).first()
+    return default_storage.url(name) if name is not None else None
+
+
+def get_rendition_url(content_hash: str, width: int, image_format: str) -> Optional[str]:
+    """
+    Return the storage URL of a rendition, rendering it on first use.
+
+    Args:
+        content_hash: Digest of the original image
+        width: One of RENDITION_WIDTHS
+        image_format: One of RENDITION_FORMATS
+
+    Returns:
+        The URL, or None for unknown sizes, formats or images
+
+    Raises:
+        TimeoutError: If the rendition is not rendered within IMAGE_RENDER_TIMEOUT seconds
+    """
+    if width not in RENDITION_WIDTHS or image_format not in RENDITION_FORMATS:
+        return None
+    name = get_rendition_name(content_hash, width, image_format)
+    cache_key = f"image-rendition:{name}"
+    if not cache.get(cache_key):
+        if default_storage.exists(name):
+            cache.set(cache_key, True, RENDITION_CACHE_TIMEOUT)
+        # All missing renditions are rendered at once since the others of a srcset follow
+        elif not generate_renditions(
+            content_hash, timeout=getattr(settings, "IMAGE_RENDER_TIMEOUT", DEFAULT_RENDER_TIMEOUT)
+        ):
+            return None
+    return default_storage.url(name)
+
+
+def get_game_images(game_id: int) -> List[Dict[str, Any]]:
+    """Return the images of a game with their srcset per rendition format."""
+    images = []
+    for game_image in GameImage.objects.filter(game_id=game_id):
+        # Renditions are never wider than the original
+        widths = [width for width in RENDITION_WIDTHS if width < game_image.width] or [RENDITION_WIDTHS[0]]
+        srcsets = {
+            image_format: ", ".join(
+                f"{get_rendition_path(game_image.content_hash, width, image_format)} {min(width, game_image.width)}w"
+                for width in widths
+            )
+            for image_format in RENDITION_FORMATS
+        }
+        images.append({
+            "caption": game_image.caption,
+            "width": game_image.width,
+            "height": game_image.height,
+            "url": game_image.image.url,
+            "webp_srcset": srcsets["webp"],
+            "jpeg_srcset": srcsets["jpeg"],
+        })
+    return images
+
+
+def regenerate_renditions(
+    workers: Optional[int] = None,
+    force: bool = False,
+    report: Optional[Callable[[int, int], None]] = None,
+) -> int:
+    """
+    Render the renditions of all stored originals on a process pool.
+
+    Args:
+        workers: Number of processes; all cores if None
+        force: Re-render renditions that already exist
+        report: Called with the number of originals done and their total
+
+    Returns:
+        The number of renditions written
+    """
+    workers = workers or os.cpu_count() or 1
+    hashes = list(GameImage.objects.order_by("content_hash").values_list("content_hash", flat=True).distinct())
+    written = done = 0
+    pending = {}
+
+    def collect() -> None:
+        """Store the renditions of the next finished originals."""
+        nonlocal written, done
+        finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in finished:
+            written += _store_renditions(pending.pop(future), future.result(), overwrite=force)
+            done += 1
+            if report:
+                report(done, len(hashes))
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        for content_hash in hashes:
+            specs = get_all_specs() if force else get_missing_specs(content_hash)
+            source = _read_original(content_hash) if specs else None
+            if source is not None:
+                pending[pool.submit(render_renditions, source, specs)] = content_hash
+            # Bounds the originals held in memory
+            if len(pending) >= workers * 2:
+                collect()
+        while pending:
+            collect()
+    return written
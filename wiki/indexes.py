@@ -0,0 +1,63 @@
+"""
+Base class of the in-process indexes of the wiki app.
+
+An index is built from the database on first use and rebuilt once it is
+older than its TTL to pick up changes made by other processes. Rebuilds run
+on a background thread, one at a time, and requests keep reading the old
+index until the new one is swapped in, so they never wait for the database.
+"""
+
+import logging
+import threading
+import time
+from typing import Optional
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_TTL = 300
+
+
+class InMemoryIndex:
+    """An index kept in process memory and rebuilt in the background once it is too old."""
+
+    # Name of the setting holding the TTL in seconds
+    ttl_setting = ""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._built_at: Optional[float] = None
+
+    def build(self) -> None:
+        """Load the index from the database and set _built_at."""
+        raise NotImplementedError
+
+    def _ensure_fresh(self) -> None:
+        """Build the index on first use and start a background rebuild once it is too old."""
+        if self._built_at is None:
+            # Nothing to serve yet, so the first requests wait for a single build
+            with self._build_lock:
+                if self._built_at is None:
+                    self.build()
+            return
+
+        ttl = getattr(settings, self.ttl_setting, DEFAULT_INDEX_TTL)
+        if time.monotonic() - self._built_at > ttl and self._build_lock.acquire(blocking=False):
+            thread = threading.Thread(
+                target=self._rebuild, name=f"{type(self).__name__}-rebuild", daemon=True
+            )
+            thread.start()
+
+    def _rebuild(self) -> None:
+        """Rebuild the index on a background thread holding the build lock."""
+        try:
+            self.build()
+        except Exception:
+            # The old index keeps serving and the next request retries
+            logger.exception("Rebuilding %s failed", type(self).__name__)
+        finally:
+            connections.close_all()
+            self._build_lock.release()
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from wiki.cards import REBUILD_CHUNK_SIZE, rebuild_game_cards
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalized game cards served by the game list."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=REBUILD_CHUNK_SIZE, help="Games rebuilt per batch")
+
+    def handle(self, *args, **options):
+        count = rebuild_game_cards(chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} game cards."))
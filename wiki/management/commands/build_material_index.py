@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from wiki.materials import BACKFILL_BATCH_SIZE, rebuild_material_index
+
+
+class Command(BaseCommand):
+    help = "Index the required materials of all games, e.g. after importing the archive."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=BACKFILL_BATCH_SIZE, help="Games indexed per transaction")
+
+    def handle(self, *args, **options):
+        count = rebuild_material_index(
+            batch_size=options["batch_size"],
+            report=lambda indexed: self.stdout.write(f"Indexed {indexed} games..."),
+        )
+        self.stdout.write(self.style.SUCCESS(f"Indexed the materials of {count} games."))
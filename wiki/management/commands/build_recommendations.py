@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from wiki.recommendations import TOP_K, rebuild_recommendations, update_recommendations
+
+
+class Command(BaseCommand):
+    help = "Update item-to-item game recommendations from votes changed since the last run."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top-k", type=int, default=TOP_K, help="Recommendations stored per game")
+        parser.add_argument("--max-seconds", type=float, default=None, help="Stop after this many seconds")
+        parser.add_argument("--full", action="store_true", help="Recompute every game from scratch")
+
+    def handle(self, *args, **options):
+        if options["full"]:
+            processed = rebuild_recommendations(top_k=options["top_k"])
+        else:
+            processed = update_recommendations(
+                top_k=options["top_k"], max_seconds=options["max_seconds"]
+            )
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} votes."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from wiki.similarity import TOP_K, rebuild_similar_games
+
+
+class Command(BaseCommand):
+    help = "Rebuild the precomputed similar-games index for the whole archive."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top-k", type=int, default=TOP_K, help="Neighbours stored per game")
+
+    def handle(self, *args, **options):
+        count = rebuild_similar_games(top_k=options["top_k"])
+        self.stdout.write(self.style.SUCCESS(f"Stored {count} similar-game entries."))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from wiki.models import GameRevision
+from wiki.revisions import compact_revisions, get_snapshot_interval, get_storage_report
+
+
+class Command(BaseCommand):
+    help = "Re-checkpoint long revision histories with a snapshot every --interval revisions."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=int, default=None, help="Revisions between snapshots (default: REVISION_SNAPSHOT_INTERVAL)")
+        parser.add_argument("--report", action="store_true", help="Only print the storage report")
+
+    def handle(self, *args, **options):
+        if not options["report"]:
+            interval = options["interval"] or get_snapshot_interval()
+            game_ids = (
+                GameRevision.objects.values("game_id")
+                .annotate(revision_count=Count("id"))
+                .filter(revision_count__gt=1)
+                .values_list("game_id", flat=True)
+            )
+            rewritten = sum(compact_revisions(game_id, interval) for game_id in list(game_ids))
+            self.stdout.write(self.style.SUCCESS(f"Rewrote {rewritten} revisions."))
+
+        report = get_storage_report()
+        self.stdout.write(
+            f"{report['revisions']} revisions ({report['snapshots']} snapshots): "
+            f"{report['stored_size']} of {report['full_size']} characters stored ({report['ratio']:.1%})."
+        )
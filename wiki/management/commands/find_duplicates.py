@@ -0,0 +1,39 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from wiki.dedup import SCAN_CHUNK_SIZE, find_duplicate_clusters, sign_archive
+from wiki.models import Game
+
+
+class Command(BaseCommand):
+    help = "Sign all games on a process pool and list clusters of likely duplicates for moderators."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=None, help="Number of processes (default: all cores)")
+        parser.add_argument("--chunk-size", type=int, default=SCAN_CHUNK_SIZE, help="Games per chunk sent to a worker")
+        parser.add_argument("--threshold", type=float, default=None, help="Minimum estimated similarity (0-1)")
+        parser.add_argument("--skip-signing", action="store_true", help="Cluster the stored signatures only")
+        parser.add_argument("--json", action="store_true", help="Write the clusters as JSON lines")
+
+    def handle(self, *args, **options):
+        if not options["skip_signing"]:
+            signed = sign_archive(
+                workers=options["workers"],
+                chunk_size=options["chunk_size"],
+                report=lambda count: self.stderr.write(f"{count} games signed"),
+            )
+            self.stderr.write(self.style.SUCCESS(f"Signed {signed} games."))
+
+        clusters = find_duplicate_clusters(threshold=options["threshold"])
+        games = Game.objects.in_bulk([game_id for cluster in clusters for game_id, _ in cluster])
+        for cluster in clusters:
+            members = [
+                {"slug": games[game_id].slug, "title": games[game_id].title, "similarity": round(similarity, 3)}
+                for game_id, similarity in cluster
+            ]
+            if options["json"]:
+                self.stdout.write(json.dumps(members, ensure_ascii=False))
+            else:
+                self.stdout.write(", ".join(f"{member['slug']} ({member['similarity']:.2f})" for member in members))
+        self.stderr.write(self.style.SUCCESS(f"Found {len(clusters)} clusters of likely duplicates."))
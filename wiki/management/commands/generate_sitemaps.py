@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from wiki.sitemaps import generate_sitemap_files, get_sitemap_root
+
+
+class Command(BaseCommand):
+    help = "Write the sitemap index, the sitemap shards and the Atom feed to SITEMAP_ROOT."
+
+    def add_arguments(self, parser):
+        parser.add_argument("base_url", help="Scheme and host of the site, e.g. https://example.org")
+        parser.add_argument("--output", default=None, help="Output directory (default: SITEMAP_ROOT)")
+
+    def handle(self, *args, **options):
+        result = generate_sitemap_files(options["base_url"], options["output"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {result['shards']} sitemap shards and the feed to {options['output'] or get_sitemap_root()}, "
+            f"removed {result['removed']} stale shards."
+        ))
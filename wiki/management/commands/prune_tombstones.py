@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from wiki.changes import get_retention_days, prune_tombstones
+
+
+class Command(BaseCommand):
+    help = "Delete the tombstones of games deleted longer ago than CHANGE_FEED_RETENTION_DAYS."
+
+    def handle(self, *args, **options):
+        deleted = prune_tombstones()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} tombstones older than {get_retention_days()} days."))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from wiki.trending import prune_vote_buckets, rebuild_vote_buckets, refresh_trending
+
+
+class Command(BaseCommand):
+    help = "Drop old vote buckets and recompute the cached list of trending games; run hourly, e.g. from cron."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rebuild", action="store_true", help="Rebuild the hourly vote buckets from the votes first"
+        )
+
+    def handle(self, *args, **options):
+        if options["rebuild"]:
+            buckets = rebuild_vote_buckets()
+            self.stdout.write(f"Rebuilt {buckets} vote buckets.")
+        else:
+            self.stdout.write(f"Dropped {prune_vote_buckets()} old vote buckets.")
+        top = refresh_trending()
+        self.stdout.write(self.style.SUCCESS(f"Cached {len(top)} trending games."))
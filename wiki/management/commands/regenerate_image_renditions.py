@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from wiki.images import regenerate_renditions
+
+
+class Command(BaseCommand):
+    help = "Render the resized renditions of all game images on a process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=None, help="Number of processes (default: all cores)")
+        parser.add_argument("--force", action="store_true", help="Re-render renditions that already exist")
+
+    def handle(self, *args, **options):
+        def report(done, total):
+            if done % 100 == 0 or done == total:
+                self.stdout.write(f"{done}/{total} images rendered")
+
+        written = regenerate_renditions(workers=options["workers"], force=options["force"], report=report)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} renditions."))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from wiki.analytics import get_latency_by_shape, get_top_searches, rollup_search_logs
+
+
+class Command(BaseCommand):
+    help = "Fold the raw search logs into daily stats and report the top and slowest searches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=7, help="Days covered by the report")
+        parser.add_argument("--limit", type=int, default=10, help="Searches listed per section")
+        parser.add_argument("--no-report", action="store_true", help="Only roll up, print no report")
+
+    def handle(self, *args, **options):
+        processed = rollup_search_logs()
+        self.stdout.write(self.style.SUCCESS(f"Rolled up {processed} search logs."))
+        if options["no_report"]:
+            return
+
+        days, limit = options["days"], options["limit"]
+        self.stdout.write(f"\nTop searches of the last {days} days:")
+        for search in get_top_searches(days=days, limit=limit):
+            self.stdout.write(f"  {search['searches']:>8}  {search['average_ms']:>8.1f} ms  {search['query'] or '(no query)'}  [{search['shape']}]")
+
+        self.stdout.write("\nSearches without results:")
+        for search in get_top_searches(days=days, limit=limit, zero_results=True):
+            self.stdout.write(f"  {search['zero_results']:>8}  {search['query'] or '(no query)'}  [{search['shape']}]")
+
+        self.stdout.write("\nLatency per query shape:")
+        for shape in get_latency_by_shape(days=days)[:limit]:
+            self.stdout.write(
+                f"  {shape['average_ms']:>8.1f} ms avg  {shape['max_ms']:>8.1f} ms max  "
+                f"{shape['searches']:>8} searches  {shape['cache_hit_ratio']:>5.0%} cached  {shape['shape']}"
+            )
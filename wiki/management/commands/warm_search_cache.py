@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from wiki.analytics import warm_search_cache
+
+
+class Command(BaseCommand):
+    help = "Run the most frequent searches to fill the search result cache, e.g. after a deploy."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=50, help="Number of searches to run")
+        parser.add_argument("--days", type=int, default=7, help="Days of search stats to pick the top searches from")
+
+    def handle(self, *args, **options):
+        warmed = warm_search_cache(top=options["top"], days=options["days"])
+        self.stdout.write(self.style.SUCCESS(f"Warmed the cache with {warmed} searches."))
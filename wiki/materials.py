@@ -0,0 +1,186 @@
+"""
+Materials index of the wiki app.
+
+The materials of a game are read from the Markdown list under its materials
+heading (e.g. "## Material" or "**Was ihr braucht:**") whenever the game is
+saved, normalized and stored in the GameMaterial table, an inverted index
+from materials to games. Finding the games playable with a set of materials
+is a set difference over that index: games that use one of the materials,
+minus games that need any other material.
+"""
+
+import re
+from typing import Dict, Iterable, List, Optional, Set
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, QuerySet
+
+from .models import Game, GameCard, GameMaterial, Material
+
+# Headings whose list names the materials; matched against the case-folded heading text
+MATERIAL_HEADINGS = ("material", "benötig", "brauch", "you need", "equipment", "ausrüstung", "zubehör")
+HEADING = re.compile(r"^\s*(?:#{1,6}\s+(?P<heading>.+?)\s*#*|(?:\*\*|__)(?P<bold>.+?)(?:\*\*|__)\s*:?)\s*$")
+LIST_ITEM = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s+(?:\[[ xX]\]\s+)?(?P<item>.+)$")
+MARKDOWN_LINK = re.compile(r"!?\[([^\]]*)\]\([^)]*\)")
+MARKDOWN_EMPHASIS = re.compile(r"[*_`~]+")
+ITEM_SEPARATORS = re.compile(r"\s*(?:[,;/]|\bund\b|\band\b|\boder\b|\bor\b)\s*")
+# Explanations after a dash or colon and parenthetical notes are not part of the name
+ITEM_NOTES = re.compile(r"\s+[-–—:]\s+.*$|\s*\(.*?(?:\)|$)")
+QUANTITY = re.compile(
+    r"^(?:\d+(?:[.,]\d+)?\s*(?:x|×|stk\.?|stück|pcs\.?)?|"
+    r"(?:ein|eine|einen|einem|zwei|drei|vier|fünf|sechs|zehn|mehrere|einige|viele|genug|"
+    r"a|an|one|two|three|four|five|six|ten|some|several|many|enough|pair of|paar))\s+",
+    re.IGNORECASE,
+)
+PER_PERSON = re.compile(r"\s+(?:pro|per|je|für jede[nrs]?|for each|for every)\s+\w+$", re.IGNORECASE)
+OPTIONAL_MARKERS = ("optional", "falls vorhanden", "if available")
+MAX_MATERIAL_LENGTH = 100
+BACKFILL_BATCH_SIZE = 500
+
+
+def normalize_material(text: str) -> Optional[str]:
+    """Return the index name of a material, or None if nothing is left.
+
+    Quantities, notes and per-player phrases are dropped, case is folded and
+    English plurals are reduced to the singular, so '2 Balls (soft)' and
+    'ball' share one entry.
+    """
+    text = MARKDOWN_EMPHASIS.sub("", MARKDOWN_LINK.sub(r"\1", text))
+    text = ITEM_NOTES.sub("", text).strip(" .!?:-–—").casefold()
+    text = PER_PERSON.sub("", text)
+    while True:
+        stripped = QUANTITY.sub("", text, count=1)
+        if stripped == text:
+            break
+        text = stripped
+    text = " ".join(text.split())
+    words = text.split(" ")
+    last = words[-1]
+    if len(last) > 3 and last.endswith("s") and not last.endswith(("ss", "us", "is")):
+        words[-1] = last[:-3] + "y" if last.endswith("ies") else last[:-1]
+    text = " ".join(words)
+    return text[:MAX_MATERIAL_LENGTH] or None
+
+
+def extract_materials(markdown: Optional[str]) -> Set[str]:
+    """Return the normalized required materials listed in a game's Markdown."""
+    materials = set()
+    in_section = False
+    for line in (markdown or "").splitlines():
+        heading = HEADING.match(line)
+        if heading:
+            text = (heading.group("heading") or heading.group("bold")).casefold()
+            in_section = any(keyword in text for keyword in MATERIAL_HEADINGS)
+            continue
+        if not in_section:
+            continue
+        item = LIST_ITEM.match(line)
+        if item is None:
+            # A paragraph after the list ends the section; blank lines do not
+            if line.strip() and materials:
+                in_section = False
+            continue
+        text = MARKDOWN_EMPHASIS.sub("", MARKDOWN_LINK.sub(r"\1", item.group("item")))
+        if any(marker in text.casefold() for marker in OPTIONAL_MARKERS):
+            continue
+        for part in ITEM_SEPARATORS.split(ITEM_NOTES.sub("", text)):
+            name = normalize_material(part)
+            if name:
+                materials.add(name)
+    return materials
+
+
+def _get_material_ids(names: Iterable[str]) -> Dict[str, int]:
+    """Return the ids of the given materials, creating missing ones."""
+    names = set(names)
+    if not names:
+        return {}
+    Material.objects.bulk_create([Material(name=name) for name in names], ignore_conflicts=True)
+    return dict(Material.objects.filter(name__in=names).values_list("name", "id"))
+
+
+def index_game_materials(materials_by_game: Dict[int, Set[str]]) -> None:
+    """Replace the index entries of the given games."""
+    material_ids = _get_material_ids(set().union(*materials_by_game.values()))
+    wanted = {
+        (game_id, material_ids[name])
+        for game_id, names in materials_by_game.items()
+        for name in names
+    }
+    with transaction.atomic():
+        existing = {
+            (game_id, material_id): entry_id
+            for entry_id, game_id, material_id in GameMaterial.objects.filter(game_id__in=materials_by_game)
+            .values_list("id", "game_id", "material_id")
+        }
+        removed = [entry_id for entry, entry_id in existing.items() if entry not in wanted]
+        if removed:
+            GameMaterial.objects.filter(id__in=removed).delete()
+        GameMaterial.objects.bulk_create(
+            [GameMaterial(game_id=game_id, material_id=material_id) for game_id, material_id in wanted - existing.keys()],
+            ignore_conflicts=True,
+        )
+
+
+def update_game_materials(game_id: int) -> None:
+    """Re-index the materials of a saved game."""
+    row = Game.objects.filter(pk=game_id).values_list("markdown_content").first()
+    if row is None:
+        return
+    index_game_materials({game_id: extract_materials(row[0])})
+
+
+def rebuild_material_index(batch_size: Optional[int] = None, report=None) -> int:
+    """
+    Index the materials of every game in batches.
+
+    Args:
+        batch_size: Games parsed and written per transaction
+        report: Called with the number of games indexed so far
+
+    Returns:
+        The number of games indexed
+    """
+    batch_size = batch_size or BACKFILL_BATCH_SIZE
+    last_id = 0
+    indexed = 0
+    while True:
+        batch = list(
+            Game.objects.filter(id__gt=last_id).order_by("id").values_list("id", "markdown_content")[:batch_size]
+        )
+        if not batch:
+            return indexed
+        index_game_materials({game_id: extract_materials(markdown) for game_id, markdown in batch})
+        indexed += len(batch)
+        last_id = batch[-1][0]
+        if report:
+            report(indexed)
+
+
+def find_playable_games(materials: Iterable[str]) -> QuerySet:
+    """
+    Return the cards of games whose required materials are all among the given ones.
+
+    Args:
+        materials: Material names as typed by the user, e.g. ['Bälle', 'rope']
+
+    Returns:
+        QuerySet of GameCard objects ordered by title; games without indexed
+        materials are left out
+    """
+    names = {name for name in (normalize_material(material) for material in materials) if name}
+    owned_ids = Material.objects.filter(name__in=names).values("id")
+    uses_owned = GameMaterial.objects.filter(game_id=OuterRef("pk"), material_id__in=owned_ids)
+    needs_other = GameMaterial.objects.filter(game_id=OuterRef("pk")).exclude(material_id__in=owned_ids)
+    return GameCard.objects.filter(Exists(uses_owned)).exclude(Exists(needs_other)).order_by("title", "pk")
+
+
+def get_materials_by_game(game_ids: Iterable[int]) -> Dict[int, List[str]]:
+    """Return the sorted material names of the given games."""
+    materials: Dict[int, List[str]] = {}
+    for game_id, name in (
+        GameMaterial.objects.filter(game_id__in=list(game_ids)).order_by("material__name")
+        .values_list("game_id", "material__name")
+    ):
+        materials.setdefault(game_id, []).append(name)
+    return materials
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-19 17:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0007_game_created_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarGame',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('distance', models.FloatField()),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_games', to='wiki.game')),
+                ('similar_game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='wiki.game')),
+            ],
+            options={
+                'ordering': ['game', 'rank'],
+                'unique_together': {('game', 'rank')},
+            },
+        ),
+    ]
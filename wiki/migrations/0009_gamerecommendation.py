@@ -0,0 +1,54 @@
+# Generated by Django 5.2.1 on 2026-10-19 17:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0008_similargame'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GameRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+            ],
+            options={
+                'ordering': ['game', 'rank'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RecommendationCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_vote_updated_at', models.DateTimeField(blank=True, null=True)),
+                ('last_vote_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='vote',
+            index=models.Index(fields=['updated_at', 'id'], name='wiki_vote_updated_2c63d8_idx'),
+        ),
+        migrations.AddField(
+            model_name='gamerecommendation',
+            name='game',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='wiki.game'),
+        ),
+        migrations.AddField(
+            model_name='gamerecommendation',
+            name='recommended_game',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='wiki.game'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='gamerecommendation',
+            unique_together={('game', 'rank')},
+        ),
+    ]
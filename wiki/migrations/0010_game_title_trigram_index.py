@@ -0,0 +1,32 @@
+# Generated by Django 5.2.1 on 2026-10-19 18:05
+
+from django.db import migrations
+
+
+def create_trigram_index(apps, schema_editor):
+    """Create the pg_trgm extension and a GIN trigram index on PostgreSQL."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS wiki_game_title_trgm_idx '
+        'ON wiki_game USING gin (title gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    """Drop the GIN trigram index on PostgreSQL."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS wiki_game_title_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0009_gamerecommendation'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-19 17:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0010_game_title_trigram_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['creator', '-created_at'], name='wiki_game_creator_0fe5e7_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.1 on 2026-10-19 18:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_initial_revisions(apps, schema_editor):
+    """Snapshot the current content of every existing game as its first revision."""
+    Game = apps.get_model('wiki', 'Game')
+    GameRevision = apps.get_model('wiki', 'GameRevision')
+    revisions = (
+        GameRevision(
+            game_id=game_id,
+            number=1,
+            author_id=creator_id,
+            is_snapshot=True,
+            data=content or '',
+            content_length=len(content or ''),
+        )
+        for game_id, creator_id, content in Game.objects.values_list('id', 'creator_id', 'markdown_content').iterator()
+    )
+    GameRevision.objects.bulk_create(revisions, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0011_game_creator_created_at_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GameRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('is_snapshot', models.BooleanField(default=False)),
+                ('data', models.TextField()),
+                ('content_length', models.PositiveIntegerField(default=0)),
+                ('author', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='wiki.game')),
+            ],
+            options={
+                'ordering': ['game', 'number'],
+                'unique_together': {('game', 'number')},
+            },
+        ),
+        migrations.RunPython(create_initial_revisions, migrations.RunPython.noop),
+    ]
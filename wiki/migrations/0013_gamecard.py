@@ -0,0 +1,83 @@
+# Generated by Django 5.2.1 on 2026-10-19 18:06
+
+import django.db.models.deletion
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+CARD_COLUMNS = [
+    'title', 'short_description', 'slug', 'difficulty_index', 'group_size_index',
+    'preperation_index', 'physical_index', 'duration_index', 'created_at',
+]
+
+
+def create_game_cards(apps, schema_editor):
+    """Build the list card of every existing game."""
+    Game = apps.get_model('wiki', 'Game')
+    GameCard = apps.get_model('wiki', 'GameCard')
+    Vote = apps.get_model('wiki', 'Vote')
+
+    tags = defaultdict(list)
+    for game_id, name in Game.tags.through.objects.order_by('id').values_list('game_id', 'tag__name'):
+        tags[game_id].append(name)
+    age_groups = defaultdict(list)
+    for game_id, title, minimum, maximum in Game.age_groups.through.objects.order_by('id').values_list(
+        'game_id', 'agegroup__string_title', 'agegroup__minimum_age', 'agegroup__maximum_age'
+    ):
+        age_groups[game_id].append(f"{title} ({minimum}-{maximum})")
+    votes = {
+        row['game_id']: row
+        for row in Vote.objects.values('game_id').annotate(
+            upvotes=Count('id', filter=Q(value=1)),
+            downvotes=Count('id', filter=Q(value=-1)),
+        ).order_by()
+    }
+
+    GameCard.objects.bulk_create(
+        (
+            GameCard(
+                game_id=row['id'],
+                tags=tags[row['id']],
+                age_groups=age_groups[row['id']],
+                upvote_count=votes.get(row['id'], {}).get('upvotes', 0),
+                downvote_count=votes.get(row['id'], {}).get('downvotes', 0),
+                **{column: row[column] for column in CARD_COLUMNS},
+            )
+            for row in Game.objects.values('id', *CARD_COLUMNS).iterator()
+        ),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0012_gamerevision'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GameCard',
+            fields=[
+                ('game', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='card', serialize=False, to='wiki.game')),
+                ('title', models.CharField(max_length=255)),
+                ('short_description', models.TextField(blank=True, null=True)),
+                ('slug', models.SlugField()),
+                ('difficulty_index', models.IntegerField(default=5)),
+                ('group_size_index', models.IntegerField(default=5)),
+                ('preperation_index', models.IntegerField(default=5)),
+                ('physical_index', models.IntegerField(default=5)),
+                ('duration_index', models.IntegerField(default=5)),
+                ('tags', models.JSONField(default=list)),
+                ('age_groups', models.JSONField(default=list)),
+                ('upvote_count', models.IntegerField(default=0)),
+                ('downvote_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['title'], name='wiki_gameca_title_daea47_idx'), models.Index(fields=['-created_at'], name='wiki_gameca_created_b0e990_idx'), models.Index(fields=['-upvote_count'], name='wiki_gameca_upvote__cb42bd_idx')],
+            },
+        ),
+        migrations.RunPython(create_game_cards, migrations.RunPython.noop),
+    ]
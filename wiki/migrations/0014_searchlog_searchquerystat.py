@@ -0,0 +1,47 @@
+# Generated by Django 5.2.1 on 2026-10-19 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0013_gamecard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('signature', models.CharField(max_length=40)),
+                ('query', models.CharField(blank=True, max_length=255)),
+                ('shape', models.CharField(max_length=255)),
+                ('criteria', models.JSONField()),
+                ('result_count', models.PositiveIntegerField()),
+                ('duration_ms', models.FloatField()),
+                ('cache_hit', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SearchQueryStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('signature', models.CharField(max_length=40)),
+                ('query', models.CharField(blank=True, max_length=255)),
+                ('shape', models.CharField(max_length=255)),
+                ('criteria', models.JSONField()),
+                ('search_count', models.PositiveIntegerField(default=0)),
+                ('zero_result_count', models.PositiveIntegerField(default=0)),
+                ('cache_hit_count', models.PositiveIntegerField(default=0)),
+                ('total_duration_ms', models.FloatField(default=0)),
+                ('max_duration_ms', models.FloatField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day', 'shape'], name='wiki_search_day_8fb4b7_idx')],
+                'unique_together': {('day', 'signature')},
+            },
+        ),
+    ]
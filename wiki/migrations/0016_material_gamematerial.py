@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-19 19:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0015_gameimage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Material',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='GameMaterial',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='required_materials', to='wiki.game')),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='game_entries', to='wiki.material')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['material', 'game'], name='wiki_gamema_materia_ed4ea5_idx')],
+                'unique_together': {('game', 'material')},
+            },
+        ),
+    ]
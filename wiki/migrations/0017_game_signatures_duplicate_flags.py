@@ -0,0 +1,50 @@
+# Generated by Django 5.2.1 on 2026-10-19 20:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0016_material_gamematerial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GameSignature',
+            fields=[
+                ('game', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='signature', serialize=False, to='wiki.game')),
+                ('signature', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DuplicateFlag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('similarity', models.FloatField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('resolved', models.BooleanField(default=False)),
+                ('duplicate_of', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='wiki.game')),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='duplicate_flags', to='wiki.game')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['resolved', '-created_at'], name='wiki_duplic_resolve_8318dc_idx')],
+                'unique_together': {('game', 'duplicate_of')},
+            },
+        ),
+        migrations.CreateModel(
+            name='GameSignatureBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.PositiveSmallIntegerField()),
+                ('bucket', models.BigIntegerField()),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='signature_bands', to='wiki.game')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['band', 'bucket'], name='wiki_gamesi_band_29564d_idx')],
+                'unique_together': {('game', 'band')},
+            },
+        ),
+    ]
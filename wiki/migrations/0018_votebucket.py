@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-19 20:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0017_game_signatures_duplicate_flags'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VoteBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('upvotes', models.IntegerField(default=0)),
+                ('downvotes', models.IntegerField(default=0)),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vote_buckets', to='wiki.game')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['hour'], name='wiki_votebu_hour_a6c028_idx')],
+                'unique_together': {('game', 'hour')},
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.1 on 2026-10-19 20:40
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_created_at(apps, schema_editor):
+    """Start the modification time of existing games at their creation time."""
+    Game = apps.get_model('wiki', 'Game')
+    Game.objects.update(updated_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0018_votebucket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='game',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_created_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['updated_at', 'id'], name='wiki_game_updated_9285c6_idx'),
+        ),
+        migrations.CreateModel(
+            name='GameTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('game_id', models.BigIntegerField(unique=True)),
+                ('slug', models.SlugField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['deleted_at', 'game_id'], name='wiki_gameto_deleted_0631b9_idx')],
+            },
+        ),
+    ]
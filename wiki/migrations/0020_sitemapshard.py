@@ -0,0 +1,45 @@
+# Generated by Django 5.2.1 on 2026-10-19 21:20
+
+from django.db import migrations, models
+from django.db.models import F, Max
+
+# Must match wiki.sitemaps.SITEMAP_SHARD_SIZE
+SITEMAP_SHARD_SIZE = 50000
+
+
+def create_sitemap_shards(apps, schema_editor):
+    """Store the last modification of every non-empty shard of existing games."""
+    Game = apps.get_model('wiki', 'Game')
+    GameRevision = apps.get_model('wiki', 'GameRevision')
+    SitemapShard = apps.get_model('wiki', 'SitemapShard')
+
+    lastmods = {}
+    for model, id_field in ((Game, 'id'), (GameRevision, 'game_id')):
+        rows = (
+            model.objects.annotate(shard=(F(id_field) - 1) / SITEMAP_SHARD_SIZE).values('shard')
+            .annotate(lastmod=Max('created_at')).order_by().values_list('shard', 'lastmod')
+        )
+        for shard, lastmod in rows:
+            if model is Game or shard in lastmods:
+                lastmods[shard] = max(lastmods.get(shard, lastmod), lastmod)
+    SitemapShard.objects.bulk_create(
+        SitemapShard(shard=shard, lastmod=lastmod) for shard, lastmod in lastmods.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0019_game_updated_at_gametombstone'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SitemapShard',
+            fields=[
+                ('shard', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('lastmod', models.DateTimeField()),
+            ],
+        ),
+        migrations.RunPython(create_sitemap_shards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,81 @@
+"""
+MinHash signatures for near-duplicate detection.
+
+A text is reduced to its set of word shingles, and the signature keeps the
+minimum of each of NUM_PERMUTATIONS random hash functions over that set; the
+share of equal positions in two signatures estimates the Jaccard similarity
+of the shingle sets. For locality-sensitive hashing the signature is cut into
+NUM_BANDS bands of BAND_ROWS rows, and texts sharing any band hash are
+candidate duplicates.
+
+This module only depends on NumPy so its functions can run in worker
+processes that never set up Django.
+"""
+
+import hashlib
+import re
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+NUM_BANDS = 20
+BAND_ROWS = 6
+NUM_PERMUTATIONS = NUM_BANDS * BAND_ROWS
+SHINGLE_SIZE = 3
+# Pairs above roughly (1 / NUM_BANDS) ** (1 / BAND_ROWS) = 0.61 share a band with high probability
+MERSENNE_PRIME = (1 << 31) - 1
+SEED = 20261019
+
+WORD = re.compile(r"\w+")
+
+_random = np.random.default_rng(SEED)
+_COEFFICIENTS = _random.integers(1, MERSENNE_PRIME, size=(NUM_PERMUTATIONS, 1), dtype=np.uint64)
+_OFFSETS = _random.integers(0, MERSENNE_PRIME, size=(NUM_PERMUTATIONS, 1), dtype=np.uint64)
+
+
+def get_shingles(text: str) -> List[str]:
+    """Return the distinct word shingles of a text, ignoring case and punctuation."""
+    words = WORD.findall(text.casefold())
+    if len(words) < SHINGLE_SIZE:
+        return [" ".join(words)] if words else []
+    return list({" ".join(words[index:index + SHINGLE_SIZE]) for index in range(len(words) - SHINGLE_SIZE + 1)})
+
+
+def compute_signature(text: str) -> Optional[np.ndarray]:
+    """Return the MinHash signature of a text, or None if it has no words."""
+    shingles = get_shingles(text)
+    if not shingles:
+        return None
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=4).digest(), "big") for shingle in shingles],
+        dtype=np.uint64,
+    ) % MERSENNE_PRIME
+    # Products stay below 2 ** 62, so the universal hashes cannot overflow
+    return ((_COEFFICIENTS * hashes[None, :] + _OFFSETS) % MERSENNE_PRIME).min(axis=1).astype(np.uint32)
+
+
+def compute_signatures(items: Iterable[Tuple[int, str]]) -> List[Tuple[int, Optional[bytes]]]:
+    """Return the serialized signatures of (id, text) pairs, for use in worker processes."""
+    results = []
+    for item_id, text in items:
+        signature = compute_signature(text)
+        results.append((item_id, None if signature is None else signature.tobytes()))
+    return results
+
+
+def load_signature(data: bytes) -> np.ndarray:
+    """Return a signature serialized by compute_signatures."""
+    return np.frombuffer(bytes(data), dtype=np.uint32)
+
+
+def get_band_hashes(signature: np.ndarray) -> List[int]:
+    """Return the LSH bucket of each band as a signed 64-bit integer."""
+    return [
+        int.from_bytes(hashlib.blake2b(band.tobytes(), digest_size=8).digest(), "big", signed=True)
+        for band in signature.reshape(NUM_BANDS, BAND_ROWS)
+    ]
+
+
+def estimate_similarity(first: np.ndarray, second: np.ndarray) -> float:
+    """Return the estimated Jaccard similarity of the texts behind two signatures."""
+    return float(np.mean(first == second))
@@ -1,8 +1,10 @@
 
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from django.utils.text import slugify
+from PIL import Image, UnidentifiedImageError
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
@@ -17,6 +19,8 @@ class Game(models.Model):
     markdown_content = models.TextField(blank=True, null=True)
     creator = models.ForeignKey(User, on_delete=models.CASCADE, related_name='games_created')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Also touched when the tags, age groups or vote counts of the game change
+    updated_at = models.DateTimeField(auto_now=True)
     difficulty_index = models.IntegerField(choices=[(i, i) for i in range(1, 11)], default=5)
     group_size_index = models.IntegerField(choices=[(i, i) for i in range(1, 11)], default=5)
     preperation_index = models.IntegerField(choices=[(i, i) for i in range(1, 11)], default=5)
@@ -28,6 +32,12 @@ class Game(models.Model):
     if TYPE_CHECKING:
         votes: 'QuerySet[Vote]'
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['creator', '-created_at']),
+            models.Index(fields=['updated_at', 'id']),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.title)
@@ -35,10 +45,14 @@ class Game(models.Model):
 
     def get_upvote_count(self):
         """Get the number of upvotes for this game."""
+        if hasattr(self, 'upvote_total'):
+            return self.upvote_total
         return self.votes.filter(value=1).count()
 
     def get_downvote_count(self):
         """Get the number of downvotes for this game."""
+        if hasattr(self, 'downvote_total'):
+            return self.downvote_total
         return self.votes.filter(value=-1).count()
 
     def get_age_groups(self):
@@ -95,6 +109,285 @@ class Vote(models.Model):
 
     class Meta:
         unique_together = ('user', 'game')
+        indexes = [
+            models.Index(fields=['updated_at', 'id']),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {'Upvoted' if self.value > 0 else 'Downvoted'} - {self.game.title}"
+
+
+class GameCard(models.Model):
+    """Denormalized, ready-to-serve list entry of a game, kept in sync by signals."""
+    game = models.OneToOneField(Game, on_delete=models.CASCADE, primary_key=True, related_name='card')
+    title = models.CharField(max_length=255)
+    short_description = models.TextField(blank=True, null=True)
+    slug = models.SlugField()
+    difficulty_index = models.IntegerField(default=5)
+    group_size_index = models.IntegerField(default=5)
+    preperation_index = models.IntegerField(default=5)
+    physical_index = models.IntegerField(default=5)
+    duration_index = models.IntegerField(default=5)
+    tags = models.JSONField(default=list)
+    age_groups = models.JSONField(default=list)
+    upvote_count = models.IntegerField(default=0)
+    downvote_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['title']),
+            models.Index(fields=['-created_at']),
+            models.Index(fields=['-upvote_count']),
+        ]
+
+    def __str__(self):
+        return self.title
+
+
+class SimilarGame(models.Model):
+    """A precomputed nearest neighbour of a game, ranked by feature distance."""
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='similar_games')
+    similar_game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    distance = models.FloatField()
+
+    class Meta:
+        ordering = ['game', 'rank']
+        unique_together = ('game', 'rank')
+
+    def __str__(self):
+        return f"{self.game_id} -> {self.similar_game_id} (#{self.rank})"
+
+
+class GameRecommendation(models.Model):
+    """A game recommended to fans of another game, from item-item vote similarity."""
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='recommendations')
+    recommended_game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ['game', 'rank']
+        unique_together = ('game', 'rank')
+
+    def __str__(self):
+        return f"{self.game_id} -> {self.recommended_game_id} (#{self.rank})"
+
+
+class RecommendationCheckpoint(models.Model):
+    """The last vote processed by the recommendation job."""
+    last_vote_updated_at = models.DateTimeField(blank=True, null=True)
+    last_vote_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Votes up to {self.last_vote_updated_at} (#{self.last_vote_id})"
+
+
+class GameRevision(models.Model):
+    """One saved version of a game's content, stored as a snapshot or a line diff."""
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='revisions')
+    number = models.PositiveIntegerField()
+    author = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    is_snapshot = models.BooleanField(default=False)
+    # Full markdown for snapshots, a JSON line delta against the previous revision otherwise
+    data = models.TextField()
+    content_length = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['game', 'number']
+        unique_together = ('game', 'number')
+
+    def __str__(self):
+        return f"{self.game_id} r{self.number}"
+
+
+class SearchLog(models.Model):
+    """One search served by the game list, waiting to be rolled up."""
+    signature = models.CharField(max_length=40)
+    query = models.CharField(max_length=255, blank=True)
+    shape = models.CharField(max_length=255)
+    criteria = models.JSONField()
+    result_count = models.PositiveIntegerField()
+    duration_ms = models.FloatField()
+    cache_hit = models.BooleanField(default=False)
+    created_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.query or '(no query)'} ({self.result_count} results)"
+
+
+class SearchQueryStat(models.Model):
+    """Daily totals of one canonical search."""
+    day = models.DateField()
+    signature = models.CharField(max_length=40)
+    query = models.CharField(max_length=255, blank=True)
+    shape = models.CharField(max_length=255)
+    criteria = models.JSONField()
+    search_count = models.PositiveIntegerField(default=0)
+    zero_result_count = models.PositiveIntegerField(default=0)
+    cache_hit_count = models.PositiveIntegerField(default=0)
+    total_duration_ms = models.FloatField(default=0)
+    max_duration_ms = models.FloatField(default=0)
+
+    class Meta:
+        unique_together = ('day', 'signature')
+        indexes = [
+            models.Index(fields=['day', 'shape']),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.query or '(no query)'}: {self.search_count}"
+
+
+# File extensions of the accepted upload formats
+ORIGINAL_IMAGE_EXTENSIONS = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp", "GIF": "gif"}
+
+
+class GameImage(models.Model):
+    """A setup diagram or photo attached to a game.
+
+    Originals are stored under their SHA-256 digest, so identical uploads
+    share one file and one set of renditions.
+    """
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='images')
+    image = models.ImageField(upload_to='game-images/originals/')
+    content_hash = models.CharField(max_length=64, db_index=True, editable=False)
+    width = models.PositiveIntegerField(default=0, editable=False)
+    height = models.PositiveIntegerField(default=0, editable=False)
+    caption = models.CharField(max_length=255, blank=True)
+    position = models.PositiveIntegerField(default=0)
+    uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['game', 'position', 'id']
+
+    def __str__(self):
+        return self.caption or f"{self.game_id}: {self.content_hash[:12]}"
+
+    def clean(self):
+        # Only fresh uploads are read; stored originals were accepted before
+        if not self.image or self.image._committed:
+            return
+        try:
+            with Image.open(self.image.file) as image:
+                image_format = image.format
+        except (UnidentifiedImageError, OSError):
+            image_format = None
+        finally:
+            self.image.file.seek(0)
+        if image_format not in ORIGINAL_IMAGE_EXTENSIONS:
+            accepted = ", ".join(ORIGINAL_IMAGE_EXTENSIONS)
+            raise ValidationError({'image': f"Unsupported image format; upload one of {accepted}."})
+
+
+class Material(models.Model):
+    """A normalized material name, e.g. 'ball' or 'augenbinde'."""
+    name = models.CharField(max_length=100, unique=True)
+
+    def __str__(self):
+        return self.name
+
+
+class GameMaterial(models.Model):
+    """Inverted index entry: a game requires a material."""
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='required_materials')
+    material = models.ForeignKey(Material, on_delete=models.CASCADE, related_name='game_entries')
+
+    class Meta:
+        unique_together = ('game', 'material')
+        indexes = [
+            models.Index(fields=['material', 'game']),
+        ]
+
+    def __str__(self):
+        return f"{self.game_id}: {self.material_id}"
+
+
+class GameSignature(models.Model):
+    """MinHash signature of a game's title and content, for near-duplicate detection."""
+    game = models.OneToOneField(Game, on_delete=models.CASCADE, primary_key=True, related_name='signature')
+    signature = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Signature of {self.game_id}"
+
+
+class GameSignatureBand(models.Model):
+    """LSH bucket of one band of a game's signature; games sharing a bucket are candidates."""
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='signature_bands')
+    band = models.PositiveSmallIntegerField()
+    bucket = models.BigIntegerField()
+
+    class Meta:
+        unique_together = ('game', 'band')
+        indexes = [
+            models.Index(fields=['band', 'bucket']),
+        ]
+
+    def __str__(self):
+        return f"{self.game_id}: band {self.band}"
+
+
+class DuplicateFlag(models.Model):
+    """A game that is likely a re-submission of an older one, for moderators to review."""
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='duplicate_flags')
+    duplicate_of = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='+')
+    similarity = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    resolved = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = ('game', 'duplicate_of')
+        indexes = [
+            models.Index(fields=['resolved', '-created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.game_id} ~ {self.duplicate_of_id} ({self.similarity:.2f})"
+
+
+class VoteBucket(models.Model):
+    """Net change of a game's upvotes and downvotes within one hour."""
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='vote_buckets')
+    hour = models.DateTimeField()
+    # Changed and deleted votes subtract, so the counts can be negative
+    upvotes = models.IntegerField(default=0)
+    downvotes = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('game', 'hour')
+        indexes = [
+            models.Index(fields=['hour']),
+        ]
+
+    def __str__(self):
+        return f"{self.game_id} @ {self.hour:%Y-%m-%d %H:00}: +{self.upvotes} -{self.downvotes}"
+
+
+class GameTombstone(models.Model):
+    """Record of a deleted game, so mirrors can remove it."""
+    game_id = models.BigIntegerField(unique=True)
+    slug = models.SlugField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at', 'game_id']),
+        ]
+
+    def __str__(self):
+        return f"{self.slug} (deleted {self.deleted_at:%Y-%m-%d})"
+
+
+class SitemapShard(models.Model):
+    """Time the newest game or revision of a sitemap shard was saved, listed in the sitemap index."""
+    shard = models.PositiveIntegerField(primary_key=True)
+    lastmod = models.DateTimeField()
+
+    def __str__(self):
+        return f"sitemap-{self.shard} ({self.lastmod:%Y-%m-%d %H:%M})"
@@ -0,0 +1,168 @@
+"""
+Session planner of the wiki app.
+
+Assembles a program of games that fills a time budget for one group. The
+candidates are the best-rated games passing the regular search filters; a
+beam search then extends programs one game at a time, keeping the
+PLANNER_BEAM_WIDTH best programs of each length. Programs are scored by how
+much of the time they fill, the ratings of their games and how much the
+physical intensity changes between consecutive games, so calm games follow
+active ones. The search stops at PLANNER_TIME_BUDGET seconds and returns the
+best program found so far.
+"""
+
+import time
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+from django.conf import settings
+
+from .services import search_games
+
+# Estimated minutes of play per duration index 1-10
+DURATION_MINUTES = (5, 10, 15, 20, 25, 30, 45, 60, 90, 120)
+# Minutes of explaining and setting up between two games
+TRANSITION_MINUTES = 5
+MAX_TOTAL_MINUTES = 8 * 60
+MAX_CANDIDATES = 150
+DEFAULT_BEAM_WIDTH = 40
+DEFAULT_TIME_BUDGET = 0.25
+
+# Score weights of a program
+FILL_WEIGHT = 3.0
+RATING_WEIGHT = 1.0
+ALTERNATION_WEIGHT = 1.0
+
+
+class Candidate(NamedTuple):
+    """A game that may be scheduled."""
+
+    slug: str
+    title: str
+    minutes: int
+    physical_index: int
+    rating: float
+
+
+class Program(NamedTuple):
+    """A sequence of candidates with its running totals."""
+
+    games: Tuple[int, ...]
+    minutes: int
+    rating_sum: float
+    alternation_sum: float
+
+
+def get_game_minutes(duration_index: int) -> int:
+    """Return the estimated minutes of play for a duration index."""
+    return DURATION_MINUTES[min(max(duration_index, 1), len(DURATION_MINUTES)) - 1]
+
+
+def get_candidates(total_minutes: int, **criteria: Any) -> List[Candidate]:
+    """Return the best-rated games that pass the search filters and fit into the time."""
+    longest_index = max(index for index, minutes in enumerate(DURATION_MINUTES, 1) if minutes <= total_minutes)
+    criteria["max_duration_index"] = min(criteria.get("max_duration_index", 10), longest_index)
+    rows = search_games(sort_by="upvotes", **criteria).values_list(
+        "slug", "title", "duration_index", "physical_index", "upvote_count", "downvote_count"
+    )[:MAX_CANDIDATES]
+    return [
+        Candidate(
+            slug=slug,
+            title=title,
+            minutes=get_game_minutes(duration_index),
+            physical_index=physical_index,
+            # Laplace-smoothed share of upvotes, 0.5 for unrated games
+            rating=(upvotes + 1) / (upvotes + downvotes + 2),
+        )
+        for slug, title, duration_index, physical_index, upvotes, downvotes in rows
+    ]
+
+
+def _score(program: Program, total_minutes: int) -> float:
+    """Return the score of a program; higher is better."""
+    if not program.games:
+        return 0.0
+    alternation = program.alternation_sum / (len(program.games) - 1) if len(program.games) > 1 else 0.0
+    return (
+        FILL_WEIGHT * program.minutes / total_minutes
+        + RATING_WEIGHT * program.rating_sum / len(program.games)
+        + ALTERNATION_WEIGHT * alternation
+    )
+
+
+def _program_minutes(program: Program, candidate: Candidate) -> int:
+    """Return the minutes of a program after appending a candidate."""
+    return program.minutes + candidate.minutes + (TRANSITION_MINUTES if program.games else 0)
+
+
+def plan_session(total_minutes: int, **criteria: Any) -> Dict[str, Any]:
+    """
+    Plan a program of games for the given time.
+
+    Args:
+        total_minutes: Length of the session
+        **criteria: Filters of search_games, e.g. age_group_filter or max_physical_index
+
+    Returns:
+        Dictionary with the scheduled games and their start minutes, the
+        minutes used, the number of candidates and whether the search
+        finished within the time budget
+    """
+    deadline = time.monotonic() + getattr(settings, "PLANNER_TIME_BUDGET", DEFAULT_TIME_BUDGET)
+    beam_width = getattr(settings, "PLANNER_BEAM_WIDTH", DEFAULT_BEAM_WIDTH)
+    candidates = get_candidates(total_minutes, **criteria) if total_minutes >= DURATION_MINUTES[0] else []
+
+    best = Program((), 0, 0.0, 0.0)
+    beam = [best]
+    complete = True
+    while beam:
+        extensions: Dict[Tuple[frozenset, int], Program] = {}
+        for program in beam:
+            if time.monotonic() > deadline:
+                complete = False
+                break
+            last = candidates[program.games[-1]] if program.games else None
+            for position, candidate in enumerate(candidates):
+                minutes = _program_minutes(program, candidate)
+                if minutes > total_minutes or position in program.games:
+                    continue
+                change = abs(candidate.physical_index - last.physical_index) / 9 if last else 0.0
+                extended = Program(
+                    program.games + (position,),
+                    minutes,
+                    program.rating_sum + candidate.rating,
+                    program.alternation_sum + change,
+                )
+                # Programs with the same games ending in the same game only differ in their order
+                key = (frozenset(extended.games), position)
+                if key not in extensions or _score(extended, total_minutes) > _score(extensions[key], total_minutes):
+                    extensions[key] = extended
+        beam = sorted(extensions.values(), key=lambda program: _score(program, total_minutes), reverse=True)[:beam_width]
+        if beam and _score(beam[0], total_minutes) > _score(best, total_minutes):
+            best = beam[0]
+        if not complete:
+            break
+
+    return {
+        "games": _schedule(best, candidates),
+        "total_minutes": best.minutes,
+        "candidate_count": len(candidates),
+        "complete": complete,
+    }
+
+
+def _schedule(program: Program, candidates: List[Candidate]) -> List[Dict[str, Any]]:
+    """Return the games of a program with their start minutes."""
+    schedule = []
+    start = 0
+    for position in program.games:
+        candidate = candidates[position]
+        schedule.append({
+            "slug": candidate.slug,
+            "title": candidate.title,
+            "start_minute": start,
+            "minutes": candidate.minutes,
+            "physical_index": candidate.physical_index,
+        })
+        start += candidate.minutes + TRANSITION_MINUTES
+    return schedule
+
@@ -0,0 +1,272 @@
+"""
+Item-to-item game recommendations for the wiki app.
+
+Votes form a sparse user-by-game matrix. Cosine similarities between game
+columns are computed with sparse matrix products, and the top-k similar
+games per game are stored in the GameRecommendation table. A user's
+recommendations merge the stored neighbours of the games they upvoted.
+
+When votes on a game are saved or deleted, only that game and the games
+listing it are recomputed, from the votes of the users who voted on them.
+Popular games are recomputed from a sample of their latest voters and the
+games those voters share most, so a refresh reads a bounded number of votes.
+"""
+
+import time
+from collections import defaultdict
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from scipy import sparse
+
+from .models import Game, GameCard, GameRecommendation, RecommendationCheckpoint, Vote
+
+TOP_K = 20
+BLOCK_SIZE = 256
+VOTE_CHUNK_SIZE = 50000
+# Bounds of the votes read by one incremental refresh
+MAX_COVOTERS = 2000
+MAX_CANDIDATE_GAMES = 5000
+
+
+def load_vote_matrix(chunk_size: int = VOTE_CHUNK_SIZE) -> Tuple[sparse.csc_matrix, np.ndarray]:
+    """Stream all votes into a sparse user-by-game matrix and return it with its game ids."""
+    chunks = list(_stream_votes(chunk_size))
+    votes = np.concatenate(chunks) if chunks else np.empty((0, 3), dtype=np.int64)
+    return _build_vote_matrix(votes)
+
+
+def load_affected_vote_matrix(game_ids: set) -> Tuple[sparse.csc_matrix, np.ndarray, np.ndarray]:
+    """
+    Load the votes needed to recompute the recommendations of the given games.
+
+    A game's similarities only depend on the users who voted on it, so the
+    matrix holds the votes of at most MAX_COVOTERS of those users, the latest
+    first, on the given games and at most MAX_CANDIDATE_GAMES games they
+    voted on most. Column norms are read from the vote counts of the game
+    cards, as most columns of the matrix are partial.
+
+    Returns:
+        Tuple of the sparse user-by-game matrix, its game ids and the norm of
+        each of its game columns
+    """
+    voters = list(
+        Vote.objects.filter(game_id__in=game_ids).values("user_id").annotate(last_vote_id=Max("id"))
+        .order_by("-last_vote_id").values_list("user_id", flat=True)[:MAX_COVOTERS]
+    )
+    candidates = set(
+        Vote.objects.filter(user_id__in=voters).exclude(game_id__in=game_ids)
+        .values("game_id").annotate(covotes=Count("id")).order_by("-covotes", "game_id")
+        .values_list("game_id", flat=True)[:MAX_CANDIDATE_GAMES]
+    )
+    rows = list(
+        Vote.objects.filter(user_id__in=voters, game_id__in=candidates | set(game_ids))
+        .values_list("user_id", "game_id", "value")
+    )
+    matrix, matrix_game_ids = _build_vote_matrix(np.array(rows, dtype=np.int64).reshape(len(rows), 3))
+
+    # Votes are +1 or -1, so the squared norm of a column is its number of votes
+    counts = {
+        game_id: upvotes + downvotes
+        for game_id, upvotes, downvotes in GameCard.objects.filter(game_id__in=matrix_game_ids.tolist())
+        .values_list("game_id", "upvote_count", "downvote_count")
+    }
+    full_norms = np.sqrt(np.array([counts.get(game_id, 0) for game_id in matrix_game_ids.tolist()], dtype=np.float64))
+    # Cards missing or written before the latest votes must not leave a norm below its column's
+    return matrix, matrix_game_ids, np.maximum(full_norms, _column_norms(matrix))
+
+
+def _build_vote_matrix(votes: np.ndarray) -> Tuple[sparse.csc_matrix, np.ndarray]:
+    """Return the sparse user-by-game matrix of (user_id, game_id, value) rows and its game ids."""
+    user_ids, user_index = np.unique(votes[:, 0], return_inverse=True)
+    game_ids, game_index = np.unique(votes[:, 1], return_inverse=True)
+    matrix = sparse.csc_matrix(
+        (votes[:, 2].astype(np.float32), (user_index, game_index)),
+        shape=(len(user_ids), len(game_ids)),
+    )
+    return matrix, game_ids
+
+
+def _stream_votes(chunk_size: int) -> Iterator[np.ndarray]:
+    """Yield (user_id, game_id, value) arrays in keyset-paginated chunks."""
+    last_id = 0
+    while True:
+        chunk = list(
+            Vote.objects.filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", "user_id", "game_id", "value")[:chunk_size]
+        )
+        if not chunk:
+            return
+        array = np.array(chunk, dtype=np.int64)
+        last_id = int(array[-1, 0])
+        yield array[:, 1:]
+
+
+def _changed_vote_chunks(
+    checkpoint: RecommendationCheckpoint, chunk_size: int
+) -> Iterator[List[Tuple]]:
+    """Yield (updated_at, id, game_id) chunks of votes changed since the checkpoint."""
+    updated_at, last_id = checkpoint.last_vote_updated_at, checkpoint.last_vote_id
+    while True:
+        queryset = Vote.objects.order_by("updated_at", "id")
+        if updated_at is not None:
+            queryset = queryset.filter(
+                Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=last_id)
+            )
+        chunk = list(queryset.values_list("updated_at", "id", "game_id")[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        updated_at, last_id = chunk[-1][0], chunk[-1][1]
+
+
+def refresh_recommendations(game_ids: Iterable[int], top_k: int = TOP_K) -> int:
+    """
+    Recompute the recommendations of games whose votes changed.
+
+    The games listing a changed game are recomputed as well, as their
+    similarity to it changed. Returns the number of games recomputed.
+    """
+    refresh_ids = _with_referrers(set(game_ids))
+    if not refresh_ids:
+        return 0
+    matrix, matrix_game_ids, norms = load_affected_vote_matrix(refresh_ids)
+    _replace_recommendations(refresh_ids, matrix, matrix_game_ids, top_k, norms)
+    return len(refresh_ids)
+
+
+def update_recommendations(
+    top_k: int = TOP_K,
+    max_seconds: Optional[float] = None,
+    chunk_size: int = VOTE_CHUNK_SIZE,
+) -> int:
+    """
+    Recompute recommendations for games whose votes changed since the last run.
+
+    Vote signals already queue a refresh per game. This run is the safety net
+    for votes written without signals, e.g. by imports; it cannot tell them
+    apart, so it recomputes every game with changed votes again. Changed
+    votes are processed in chunks and the checkpoint advances after each
+    one, so a run that hits max_seconds resumes where it stopped. Returns
+    the number of changed votes processed.
+    """
+    deadline = time.monotonic() + max_seconds if max_seconds else None
+    checkpoint, _ = RecommendationCheckpoint.objects.get_or_create(pk=1)
+
+    processed = 0
+    for chunk in _changed_vote_chunks(checkpoint, chunk_size):
+        refresh_recommendations({game_id for _, _, game_id in chunk}, top_k)
+        checkpoint.last_vote_updated_at, checkpoint.last_vote_id = chunk[-1][0], chunk[-1][1]
+        checkpoint.save()
+        processed += len(chunk)
+        if deadline and time.monotonic() >= deadline:
+            break
+    return processed
+
+
+def rebuild_recommendations(top_k: int = TOP_K, chunk_size: int = VOTE_CHUNK_SIZE) -> int:
+    """Recompute recommendations for every game and move the checkpoint to the newest vote."""
+    latest = Vote.objects.order_by("-updated_at", "-id").values_list("updated_at", "id").first()
+    matrix, game_ids = load_vote_matrix(chunk_size)
+    rows = _compute_recommendations(matrix, game_ids, np.arange(len(game_ids)), top_k)
+
+    with transaction.atomic():
+        GameRecommendation.objects.all().delete()
+        GameRecommendation.objects.bulk_create(rows, batch_size=1000)
+        RecommendationCheckpoint.objects.update_or_create(pk=1, defaults={
+            "last_vote_updated_at": latest[0] if latest else None,
+            "last_vote_id": latest[1] if latest else 0,
+        })
+    return matrix.nnz
+
+
+def _with_referrers(game_ids: set) -> set:
+    """Add the games whose stored recommendations include any of the given games."""
+    referrers = GameRecommendation.objects.filter(
+        recommended_game_id__in=game_ids
+    ).values_list("game_id", flat=True)
+    return game_ids | set(referrers)
+
+
+def _replace_recommendations(
+    refresh_ids: set, matrix: sparse.csc_matrix, game_ids: np.ndarray, top_k: int, norms: np.ndarray
+) -> None:
+    """Swap the stored recommendations of the given games for fresh ones."""
+    columns = np.flatnonzero(np.isin(game_ids, list(refresh_ids)))
+    rows = _compute_recommendations(matrix, game_ids, columns, top_k, norms)
+
+    with transaction.atomic():
+        GameRecommendation.objects.filter(game_id__in=refresh_ids).delete()
+        GameRecommendation.objects.bulk_create(rows, batch_size=1000)
+
+
+def _column_norms(matrix: sparse.csc_matrix) -> np.ndarray:
+    """Return the Euclidean norm of every column."""
+    return np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+
+
+def _compute_recommendations(
+    matrix: sparse.csc_matrix,
+    game_ids: np.ndarray,
+    columns: np.ndarray,
+    top_k: int,
+    norms: Optional[np.ndarray] = None,
+) -> List[GameRecommendation]:
+    """Compute the top cosine neighbours of the given game columns in blocks."""
+    if norms is None:
+        norms = _column_norms(matrix)
+    rows = []
+    for start in range(0, len(columns), BLOCK_SIZE):
+        block_columns = columns[start:start + BLOCK_SIZE]
+        products = (matrix[:, block_columns].T @ matrix).tocsr()
+        for offset, column in enumerate(block_columns):
+            neighbours, scores = _top_neighbours(products, offset, column, norms, top_k)
+            rows.extend(
+                GameRecommendation(
+                    game_id=int(game_ids[column]),
+                    recommended_game_id=int(game_ids[neighbour]),
+                    rank=rank,
+                    score=float(score),
+                )
+                for rank, (neighbour, score) in enumerate(zip(neighbours, scores))
+            )
+    return rows
+
+
+def _top_neighbours(
+    products: sparse.csr_matrix, offset: int, column: int, norms: np.ndarray, top_k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the most similar positively correlated games for one product row."""
+    start, end = products.indptr[offset], products.indptr[offset + 1]
+    neighbours = products.indices[start:end]
+    scores = products.data[start:end] / (norms[column] * norms[neighbours])
+
+    keep = (neighbours != column) & (scores > 0)
+    neighbours, scores = neighbours[keep], scores[keep]
+    order = np.argsort(-scores, kind="stable")[:top_k]
+    return neighbours[order], scores[order]
+
+
+def get_recommendations_for_user(user, limit: int = TOP_K) -> List[Tuple[Game, float]]:
+    """Merge the stored neighbours of a user's upvoted games into a ranked list."""
+    votes = dict(Vote.objects.filter(user=user).values_list("game_id", "value"))
+    upvoted = [game_id for game_id, value in votes.items() if value > 0]
+    entries = (
+        GameRecommendation.objects.filter(game_id__in=upvoted)
+        .exclude(recommended_game_id__in=list(votes))
+        .select_related("recommended_game")
+        .only("score", "recommended_game__title", "recommended_game__slug",
+              "recommended_game__short_description")
+    )
+
+    scores: defaultdict = defaultdict(float)
+    games = {}
+    for entry in entries:
+        scores[entry.recommended_game_id] += entry.score
+        games[entry.recommended_game_id] = entry.recommended_game
+
+    ranked = sorted(scores, key=lambda game_id: (-scores[game_id], game_id))[:limit]
+    return [(games[game_id], scores[game_id]) for game_id in ranked]
@@ -0,0 +1,231 @@
+"""
+Revision history for game pages.
+
+Every change to a game's markdown is stored as a GameRevision. Most
+revisions hold a compact line delta against the previous revision; every
+REVISION_SNAPSHOT_INTERVAL revisions a full snapshot is stored instead, so
+rebuilding any revision applies at most interval - 1 deltas to the nearest
+snapshot before it.
+
+A delta is a JSON list of operations applied to the previous text's lines:
+``[start, end]`` copies those lines and a string inserts new text.
+"""
+
+import difflib
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import Length
+
+from .models import Game, GameRevision
+
+DEFAULT_SNAPSHOT_INTERVAL = 10
+
+Operation = Any  # [start, end] to copy previous lines, or a string to insert
+
+
+def get_snapshot_interval() -> int:
+    """Return the number of revisions between two full snapshots."""
+    return max(1, getattr(settings, "REVISION_SNAPSHOT_INTERVAL", DEFAULT_SNAPSHOT_INTERVAL))
+
+
+def _lines(text: str) -> List[str]:
+    """Split a text into lines that join back to the same text."""
+    return text.splitlines(keepends=True)
+
+
+def encode_delta(old_text: str, new_text: str) -> str:
+    """Return the delta that turns old_text into new_text."""
+    old_lines = _lines(old_text)
+    new_lines = _lines(new_text)
+    operations: List[Operation] = []
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, old_start, old_end, new_start, new_end in matcher.get_opcodes():
+        if tag == "equal":
+            operations.append([old_start, old_end])
+        elif new_end > new_start:
+            operations.append("".join(new_lines[new_start:new_end]))
+    return json.dumps(operations, separators=(",", ":"))
+
+
+def apply_delta(old_text: str, delta: str) -> str:
+    """Return the text produced by applying a delta to old_text."""
+    old_lines = _lines(old_text)
+    parts = []
+    for operation in json.loads(delta):
+        if isinstance(operation, str):
+            parts.append(operation)
+        else:
+            parts.extend(old_lines[operation[0]:operation[1]])
+    return "".join(parts)
+
+
+def _load_chain(game_id: int, number: Optional[int] = None) -> Optional[Tuple[int, int, str]]:
+    """Rebuild a revision from its nearest snapshot.
+
+    Args:
+        game_id: The game whose history is read.
+        number: The revision to rebuild; the latest one if None.
+
+    Returns:
+        The number of the snapshot it was rebuilt from, the revision number
+        and its content, or None if the revision does not exist.
+    """
+    snapshots = GameRevision.objects.filter(game_id=game_id, is_snapshot=True)
+    if number is not None:
+        snapshots = snapshots.filter(number__lte=number)
+    snapshot = snapshots.order_by("-number").values_list("number", "data").first()
+    if snapshot is None:
+        return None
+
+    snapshot_number, text = snapshot
+    current_number = snapshot_number
+    deltas = GameRevision.objects.filter(game_id=game_id, number__gt=current_number)
+    if number is not None:
+        deltas = deltas.filter(number__lte=number)
+    for delta_number, delta in deltas.order_by("number").values_list("number", "data"):
+        if delta_number != current_number + 1:
+            # A missing revision breaks the chain of deltas
+            return None
+        current_number = delta_number
+        text = apply_delta(text, delta)
+
+    if number is not None and current_number != number:
+        return None
+    return snapshot_number, current_number, text
+
+
+def record_revision(game: Game, author=None) -> Optional[GameRevision]:
+    """Store the current content of a game as a new revision.
+
+    Args:
+        game: The saved game.
+        author: The user who made the edit, if known.
+
+    Returns:
+        The new revision, or None if the content did not change.
+    """
+    content = game.markdown_content or ""
+    with transaction.atomic():
+        # Serialize concurrent edits of the same game so revision numbers stay unique
+        Game.objects.select_for_update().filter(pk=game.pk).exists()
+        latest = _load_chain(game.pk)
+        if latest is None:
+            # No history yet, or a broken one that a new snapshot starts over from
+            last_number = GameRevision.objects.filter(game=game).aggregate(last=Max("number"))["last"]
+            number, is_snapshot = (last_number or 0) + 1, True
+        else:
+            last_snapshot, latest_number, latest_content = latest
+            if latest_content == content:
+                return None
+            number = latest_number + 1
+            is_snapshot = number - last_snapshot >= get_snapshot_interval()
+
+        return GameRevision.objects.create(
+            game=game,
+            number=number,
+            author=author,
+            is_snapshot=is_snapshot,
+            data=content if is_snapshot else encode_delta(latest_content, content),
+            content_length=len(content),
+        )
+
+
+def list_revisions(game_id: int) -> List[GameRevision]:
+    """Return the revisions of a game, newest first, without their data."""
+    return list(
+        GameRevision.objects.filter(game_id=game_id)
+        .select_related("author")
+        .defer("data")
+        .order_by("-number")
+    )
+
+
+def get_revision(game_id: int, number: int) -> Optional[Tuple[GameRevision, str]]:
+    """Return a revision and its rebuilt content, or None if it does not exist."""
+    revision = (
+        GameRevision.objects.filter(game_id=game_id, number=number)
+        .select_related("author")
+        .defer("data")
+        .first()
+    )
+    chain = _load_chain(game_id, number) if revision is not None else None
+    if chain is None:
+        return None
+    return revision, chain[2]
+
+
+def diff_revisions(game_id: int, from_number: int, to_number: int) -> Optional[str]:
+    """Return a unified diff between two revisions, or None if either is missing."""
+    old = _load_chain(game_id, from_number)
+    new = _load_chain(game_id, to_number)
+    if old is None or new is None:
+        return None
+    return "".join(difflib.unified_diff(
+        _lines(old[2]), _lines(new[2]), fromfile=f"r{from_number}", tofile=f"r{to_number}"
+    ))
+
+
+def get_storage_report(game_ids: Optional[Iterable[int]] = None) -> Dict[str, Any]:
+    """Compare the stored history size with storing every revision in full.
+
+    Args:
+        game_ids: Restrict the report to these games; all games if None.
+
+    Returns:
+        Revision and snapshot counts, stored and full sizes in characters
+        and the ratio between them.
+    """
+    revisions = GameRevision.objects.all()
+    if game_ids is not None:
+        revisions = revisions.filter(game_id__in=list(game_ids))
+    totals = revisions.aggregate(
+        revisions=Count("id"),
+        snapshots=Count("id", filter=Q(is_snapshot=True)),
+        stored_size=Sum(Length("data")),
+        full_size=Sum("content_length"),
+    )
+    stored_size = totals["stored_size"] or 0
+    full_size = totals["full_size"] or 0
+    return {
+        "revisions": totals["revisions"],
+        "snapshots": totals["snapshots"],
+        "stored_size": stored_size,
+        "full_size": full_size,
+        "ratio": stored_size / full_size if full_size else 1.0,
+    }
+
+
+def compact_revisions(game_id: int, interval: Optional[int] = None) -> int:
+    """Re-encode a game's history with a snapshot every interval revisions.
+
+    Args:
+        game_id: The game whose history is rewritten.
+        interval: Revisions between snapshots; the configured interval if None.
+
+    Returns:
+        The number of revisions that were rewritten.
+    """
+    interval = interval or get_snapshot_interval()
+    with transaction.atomic():
+        revisions = list(
+            GameRevision.objects.select_for_update()
+            .filter(game_id=game_id).only("id", "is_snapshot", "data").order_by("number")
+        )
+        changed = []
+        previous = ""
+        for index, revision in enumerate(revisions):
+            content = revision.data if revision.is_snapshot else apply_delta(previous, revision.data)
+            is_snapshot = index % interval == 0
+            data = content if is_snapshot else encode_delta(previous, content)
+            if is_snapshot != revision.is_snapshot or data != revision.data:
+                revision.is_snapshot = is_snapshot
+                revision.data = data
+                changed.append(revision)
+            previous = content
+
+        GameRevision.objects.bulk_update(changed, ["is_snapshot", "data"], batch_size=500)
+    return len(changed)
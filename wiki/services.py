@@ -2,13 +2,31 @@
 Search utilities for the wiki app.
 
 This module provides search functionalities for games in the wiki app,
-separating the complex search logic from the API endpoints.
+separating the complex search logic from the API endpoints. Game lists are
+searched and served from the denormalized GameCard table.
+
+Search queries are parsed into a canonical list of terms, so queries that
+differ only in case, spacing or term order share the same cached result
+ids. Query syntax:
+- Words must all match: outdoor fangen
+- Quoted phrases match as a whole: "capture the flag"
+- A leading minus excludes a word or phrase: -indoor
+- title:, description: and content: restrict a term to one field:
+  title:fangen, -content:"mit ball"
 """
 
-from typing import List
+import hashlib
+import inspect
+import json
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from django.conf import settings
+from django.core.cache import cache
 from django.db.models import Q, Count, Case, When, IntegerField, QuerySet
-from django.db import connection
-from .models import Game
+from django.db import DEFAULT_DB_ALIAS, connection, router
+from .fuzzy import find_similar_titles
+from .models import Game, GameCard
+from .trending import get_trending_game_ids
 
 # For PostgreSQL full-text search
 try:
@@ -17,6 +35,121 @@ try:
 except ImportError:
     HAS_POSTGRES_SEARCH = False
 
+# Text searches with fewer exact results also get typo-tolerant title matches
+FUZZY_MIN_RESULTS = 3
+
+# Maximum number of slugs accepted by a single batch lookup
+MAX_BATCH_SLUGS = 50
+
+# Model columns needed to serve each API response field
+GAME_FIELD_COLUMNS = {
+    "title": ["title"],
+    "short_description": ["short_description"],
+    "slug": ["slug"],
+    "difficulty_index": ["difficulty_index"],
+    "group_size_index": ["group_size_index"],
+    "preperation_index": ["preperation_index"],
+    "physical_index": ["physical_index"],
+    "duration_index": ["duration_index"],
+    "tags": [],
+    "age_groups": [],
+    "upvote_count": [],
+    "downvote_count": [],
+    "markdown_content": ["markdown_content"],
+    "creator_username": ["creator__username"],
+    "created_at": ["created_at"],
+}
+
+# Response fields of a game in list results, in response order
+GAME_LIST_FIELDS = [
+    "title",
+    "short_description",
+    "slug",
+    "difficulty_index",
+    "group_size_index",
+    "preperation_index",
+    "physical_index",
+    "duration_index",
+    "tags",
+    "age_groups",
+    "upvote_count",
+    "downvote_count",
+]
+
+# Card columns searched for each 'search_in' option
+TEXT_SEARCH_COLUMNS = {
+    "title": "title",
+    "description": "short_description",
+    "content": "game__markdown_content",
+}
+
+# Optional quoted phrase or word, with a leading minus and a field operator
+QUERY_TOKEN_PATTERN = re.compile(r'(-?)(?:(\w+):)?(?:"([^"]*)"?|(\S+))')
+ALPHANUMERIC = re.compile(r"\w")
+
+# Ordered result ids are cached per query and filters for this many seconds
+DEFAULT_SEARCH_CACHE_TIMEOUT = 60
+# Results beyond this many ids are paginated from the database
+SEARCH_CACHE_MAX_IDS = 1000
+SEARCH_CACHE_VERSION_KEY = "game_search:version"
+
+
+class QueryTerm(NamedTuple):
+    """A word or phrase of a parsed search query."""
+
+    text: str
+    field: Optional[str] = None
+    negated: bool = False
+    phrase: bool = False
+
+    def __str__(self) -> str:
+        text = f'"{self.text}"' if self.phrase else self.text
+        field = f"{self.field}:" if self.field else ""
+        return f"{'-' if self.negated else ''}{field}{text}"
+
+
+class ParsedQuery(NamedTuple):
+    """The canonical form of a search query: its distinct terms in sorted order."""
+
+    terms: Tuple[QueryTerm, ...]
+
+    def __str__(self) -> str:
+        return " ".join(str(term) for term in self.terms)
+
+    @property
+    def positive_terms(self) -> List[QueryTerm]:
+        return [term for term in self.terms if not term.negated]
+
+
+def parse_query(query: str) -> ParsedQuery:
+    """Parse a search query into its canonical term list.
+
+    Args:
+        query: The raw query, e.g. 'Outdoor "Capture the Flag" -indoor title:fangen'
+
+    Returns:
+        ParsedQuery with case-folded, de-duplicated and sorted terms; unknown
+        field operators are searched as part of the word
+    """
+    terms = set()
+    for negation, field, phrase, word in QUERY_TOKEN_PATTERN.findall(query):
+        if field and field.casefold() not in TEXT_SEARCH_COLUMNS:
+            if word:
+                word = f"{field}:{word}"
+            field = ""
+
+        text = " ".join((phrase if phrase or not word else word).casefold().split())
+        if not ALPHANUMERIC.search(text):
+            continue
+        terms.add(QueryTerm(
+            text=text,
+            field=field.casefold() or None,
+            negated=bool(negation),
+            phrase=" " in text,
+        ))
+
+    return ParsedQuery(tuple(sorted(terms, key=lambda term: (term.negated, term.field or "", term.text))))
+
 def search_games(
     query: str = "",
     search_in: List[str] = ["all"],
@@ -33,6 +166,7 @@ def search_games(
     min_duration_index: int = 0,
     max_duration_index: int = 10,
     sort_by: str = "relevance",
+    fields: Optional[List[str]] = None,
 ) -> QuerySet:
     """
     Search and filter games based on various criteria.
@@ -52,23 +186,23 @@ def search_games(
         max_physical_index: Maximum physical activity level (1-10)
         min_duration_index: Minimum game duration level (1-10)
         max_duration_index: Maximum game duration level (1-10)
-        sort_by: Sort results by: 'relevance', 'title', 'newest', 'upvotes'
+        sort_by: Sort results by: 'relevance', 'title', 'newest', 'upvotes', 'trending'
+        fields: Response fields to load card columns for; loads all if None
 
     Returns:
-        QuerySet of filtered and sorted Game objects
+        QuerySet of filtered and sorted GameCard objects
     """
-    games_queryset = Game.objects.all()
-
-    if query:
-        games_queryset = _apply_text_search(games_queryset, query, search_in)
+    games_queryset = GameCard.objects.all()
+    if fields is not None:
+        games_queryset = games_queryset.only("slug", *fields)
 
     if tag_filter:
         for tag in tag_filter:
-            games_queryset = games_queryset.filter(tags__name=tag)
+            games_queryset = games_queryset.filter(game__tags__name=tag)
 
     if age_group_filter:
         for age_group in age_group_filter:
-            games_queryset = games_queryset.filter(age_groups__name=age_group)
+            games_queryset = games_queryset.filter(game__age_groups__string_title=age_group)
 
     games_queryset = games_queryset.filter(
         difficulty_index__gte=min_difficulty_index,
@@ -83,45 +217,116 @@ def search_games(
         duration_index__lte=max_duration_index,
     )
 
+    if query:
+        games_queryset = _apply_text_search_with_fallback(games_queryset, query, search_in)
+
     games_queryset = _apply_sorting(games_queryset, sort_by)
 
     return games_queryset
 
-def _apply_text_search(queryset: QuerySet, query: str, search_in: List[str]) -> QuerySet:
-    """Apply text search to the queryset."""
+def get_field_columns(fields: List[str]) -> List[str]:
+    """Return the model columns needed to serve the given response fields."""
+    columns = ["slug"]
+    for field in fields:
+        columns.extend(GAME_FIELD_COLUMNS.get(field, []))
+    return list(dict.fromkeys(columns))
+
+def _project_columns(queryset: QuerySet, fields: List[str]) -> QuerySet:
+    """Restrict the loaded columns to those needed for the given fields."""
+    columns = get_field_columns(fields)
+    if "creator__username" in columns:
+        queryset = queryset.select_related("creator")
+    return queryset.only(*columns)
+
+def _apply_text_search_with_fallback(queryset: QuerySet, query: str, search_in: List[str]) -> QuerySet:
+    """Apply text search, adding fuzzy title matches when it finds too few games."""
+    parsed = parse_query(query)
+    exact_queryset = _apply_text_search(queryset, parsed, search_in)
+
+    fuzzy_text = " ".join(
+        term.text for term in parsed.positive_terms
+        if term.field == "title" or (term.field is None and _searches_titles(search_in))
+    )
+    if not fuzzy_text:
+        return exact_queryset
+
+    exact_ids = list(exact_queryset.values_list("pk", flat=True)[:FUZZY_MIN_RESULTS])
+    if len(exact_ids) >= FUZZY_MIN_RESULTS:
+        return exact_queryset
+
+    fuzzy_ids = [pk for pk in find_similar_titles(fuzzy_text) if pk not in exact_ids]
+    if not fuzzy_ids:
+        return exact_queryset
+    return _rank_by_ids(queryset, exact_ids + fuzzy_ids)
+
+def _searches_titles(search_in: List[str]) -> bool:
+    """Return whether the searched fields include the title."""
+    return not search_in or "all" in search_in or "title" in search_in
+
+def _rank_by_ids(queryset: QuerySet, ids: List[int]) -> QuerySet:
+    """Restrict the queryset to the given ids, ordered as listed."""
+    ranking = Case(
+        *[When(pk=pk, then=position) for position, pk in enumerate(ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(pk__in=ids).annotate(fuzzy_rank=ranking).order_by("fuzzy_rank")
+
+def _apply_text_search(queryset: QuerySet, parsed: ParsedQuery, search_in: List[str]) -> QuerySet:
+    """Apply the terms of a parsed query to the queryset."""
+    if not parsed.terms:
+        return queryset
+
     if HAS_POSTGRES_SEARCH and connection.vendor == 'postgresql':
-        search_vector = SearchVector('title', weight='A') + \
-                       SearchVector('short_description', weight='B') + \
-                       SearchVector('markdown_content', weight='C')
-        search_query = SearchQuery(query)
+        return _apply_postgres_search(queryset, parsed)
+    return queryset.filter(_compile_text_filter(parsed, search_in))
+
+def _apply_postgres_search(queryset: QuerySet, parsed: ParsedQuery) -> QuerySet:
+    """Filter and rank by full-text search; field terms only search their column."""
+    general_terms = [term for term in parsed.terms if term.field is None]
+    if general_terms:
+        search_vector = SearchVector(TEXT_SEARCH_COLUMNS['title'], weight='A') + \
+                       SearchVector(TEXT_SEARCH_COLUMNS['description'], weight='B') + \
+                       SearchVector(TEXT_SEARCH_COLUMNS['content'], weight='C')
+        search_query = _compile_search_query(general_terms)
         queryset = queryset.annotate(
             search=search_vector,
             rank=SearchRank(search_vector, search_query)
         ).filter(search=search_query).order_by('-rank')
-    else:
-        search_query = Q()
-
-        fields_to_search = []
-        if "all" in search_in or not search_in:
-            fields_to_search = ["title", "short_description", "markdown_content"]
-        else:
-            if "title" in search_in:
-                fields_to_search.append("title")
-            if "description" in search_in:
-                fields_to_search.append("short_description")
-            if "content" in search_in:
-                fields_to_search.append("markdown_content")
-
-        for term in query.split():
-            term_query = Q()
-            for field in fields_to_search:
-                term_query |= Q(**{f"{field}__icontains": term})
-            search_query &= term_query
-
-        queryset = queryset.filter(search_query)
 
+    for field, column in TEXT_SEARCH_COLUMNS.items():
+        field_terms = [term for term in parsed.terms if term.field == field]
+        if field_terms:
+            queryset = queryset.annotate(**{f"{field}_search": SearchVector(column)}).filter(
+                **{f"{field}_search": _compile_search_query(field_terms)}
+            )
     return queryset
 
+def _compile_search_query(terms: List[QueryTerm]) -> "SearchQuery":
+    """Combine query terms into one PostgreSQL full-text query."""
+    compiled = None
+    for term in terms:
+        term_query = SearchQuery(term.text, search_type="phrase" if term.phrase else "plain")
+        if term.negated:
+            term_query = ~term_query
+        compiled = term_query if compiled is None else compiled & term_query
+    return compiled
+
+def _compile_text_filter(parsed: ParsedQuery, search_in: List[str]) -> Q:
+    """Compile query terms into substring matches for databases without full-text search."""
+    if "all" in search_in or not search_in:
+        default_columns = list(TEXT_SEARCH_COLUMNS.values())
+    else:
+        default_columns = [column for field, column in TEXT_SEARCH_COLUMNS.items() if field in search_in]
+
+    search_query = Q()
+    for term in parsed.terms:
+        columns = [TEXT_SEARCH_COLUMNS[term.field]] if term.field else default_columns
+        term_query = Q()
+        for column in columns:
+            term_query |= Q(**{f"{column}__icontains": term.text})
+        search_query &= ~term_query if term.negated else term_query
+    return search_query
+
 def _apply_sorting(queryset: QuerySet, sort_by: str) -> QuerySet:
     """Apply sorting to the queryset."""
     if sort_by == "title":
@@ -129,38 +334,134 @@ def _apply_sorting(queryset: QuerySet, sort_by: str) -> QuerySet:
     elif sort_by == "newest":
         queryset = queryset.order_by("-created_at")
     elif sort_by == "upvotes":
-        queryset = queryset.annotate(
-            upvote_count=Count(
-                Case(
-                    When(votes__value=1, then=1),
-                    output_field=IntegerField()
-                )
-            )
-        ).order_by("-upvote_count")
+        queryset = queryset.order_by("-upvote_count")
+    elif sort_by == "trending":
+        # Games outside the cached top list follow by all-time upvotes
+        trending_ids = get_trending_game_ids()
+        queryset = queryset.order_by(
+            Case(
+                *[When(pk=game_id, then=position) for position, game_id in enumerate(trending_ids)],
+                default=len(trending_ids),
+                output_field=IntegerField(),
+            ),
+            "-upvote_count",
+            "-created_at",
+        )
 
     return queryset
 
-def get_paginated_games(queryset: QuerySet, start_index: int, amount: int) -> List[Game]:
+# Criteria left out by a caller are cached like their explicit defaults
+SEARCH_CRITERIA_DEFAULTS = {
+    name: parameter.default
+    for name, parameter in inspect.signature(search_games).parameters.items()
+    if name != "fields"
+}
+
+class SearchResults:
+    """The ordered ids of a game search, served page by page."""
+
+    def __init__(
+        self,
+        ids: List[int],
+        total_count: int,
+        criteria: Dict[str, Any],
+        fields: Optional[List[str]] = None,
+        cache_hit: bool = False,
+    ):
+        self.ids = ids
+        self.total_count = total_count
+        self.criteria = criteria
+        self.fields = fields
+        self.cache_hit = cache_hit
+
+    def page(self, start_index: int, amount: int) -> List[GameCard]:
+        """Return the cards of one page in result order."""
+        end_index = start_index + amount
+        if end_index > len(self.ids) and len(self.ids) < self.total_count:
+            return list(search_games(fields=self.fields, **self.criteria)[start_index:end_index])
+
+        page_ids = self.ids[start_index:end_index]
+        cards = GameCard.objects.all()
+        if self.fields is not None:
+            cards = cards.only("slug", *self.fields)
+        cards_by_id = cards.in_bulk(page_ids)
+        # Games deleted since the ids were cached are skipped
+        return [cards_by_id[pk] for pk in page_ids if pk in cards_by_id]
+
+def get_search_results(fields: Optional[List[str]] = None, **criteria: Any) -> SearchResults:
+    """
+    Search games with ordered result ids cached per canonical query and filters.
+
+    Args:
+        fields: Response fields to load card columns for; loads all if None
+        **criteria: Search criteria as accepted by search_games
+
+    Returns:
+        SearchResults whose pages are read by id from the GameCard table
+    """
+    cache_key = _get_search_cache_key(criteria)
+    cached = cache.get(cache_key)
+    cache_hit = cached is not None
+    if not cache_hit:
+        queryset = search_games(**criteria)
+        ids = list(queryset.values_list("pk", flat=True)[:SEARCH_CACHE_MAX_IDS + 1])
+        total_count = len(ids) if len(ids) <= SEARCH_CACHE_MAX_IDS else queryset.count()
+        cached = {"ids": ids[:SEARCH_CACHE_MAX_IDS], "total_count": total_count}
+        cache.set(cache_key, cached, getattr(settings, "SEARCH_CACHE_TIMEOUT", DEFAULT_SEARCH_CACHE_TIMEOUT))
+
+    return SearchResults(cached["ids"], cached["total_count"], criteria, fields, cache_hit)
+
+def get_canonical_criteria(criteria: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the search criteria with defaults filled in and the query and filters normalized."""
+    criteria = {**SEARCH_CRITERIA_DEFAULTS, **criteria}
+    search_in = criteria["search_in"] or ["all"]
+    return {
+        **criteria,
+        "query": str(parse_query(criteria["query"])),
+        "search_in": ["all"] if "all" in search_in else sorted(set(search_in)),
+        "tag_filter": sorted(set(criteria["tag_filter"])),
+        "age_group_filter": sorted(set(criteria["age_group_filter"])),
+    }
+
+def get_search_signature(criteria: Dict[str, Any]) -> str:
+    """Return a digest identifying searches with the same canonical criteria."""
+    canonical = json.dumps(get_canonical_criteria(criteria), sort_keys=True)
+    return hashlib.sha1(canonical.encode()).hexdigest()
+
+def _get_search_cache_key(criteria: Dict[str, Any]) -> str:
+    """Return the cache key of the canonical form of the search criteria."""
+    # Replicas may lag behind, so they get their own entries
+    database = "primary" if router.db_for_read(GameCard) == DEFAULT_DB_ALIAS else "replica"
+    version = cache.get_or_set(SEARCH_CACHE_VERSION_KEY, 0, None)
+    return f"game_search:{version}:{database}:{get_search_signature(criteria)}"
+
+def invalidate_search_results() -> None:
+    """Drop all cached search results, e.g. after game cards changed."""
+    try:
+        cache.incr(SEARCH_CACHE_VERSION_KEY)
+    except ValueError:
+        cache.add(SEARCH_CACHE_VERSION_KEY, 1, None)
+
+def get_paginated_games(results: SearchResults, start_index: int, amount: int) -> List[GameCard]:
     """
-    Get a paginated subset of games from a queryset.
+    Get a paginated subset of games from search results.
 
     Args:
-        queryset: QuerySet of Game objects
+        results: SearchResults of a game search
         start_index: Starting index for pagination (0-based)
         amount: Number of games to return
 
     Returns:
-        List of Game objects
+        List of GameCard objects
     """
-    end_index = start_index + amount
-    return list(queryset[start_index:end_index])
+    return results.page(start_index, amount)
 
-def get_pagination_metadata(queryset: QuerySet, amount: int) -> dict:
+def get_pagination_metadata(results: SearchResults, amount: int) -> dict:
     """
-    Get pagination metadata for a queryset.
+    Get pagination metadata for search results.
 
     Args:
-        queryset: QuerySet of Game objects
+        results: SearchResults of a game search
         amount: Number of games per page
 
     Returns:
@@ -168,7 +469,7 @@ def get_pagination_metadata(queryset: QuerySet, amount: int) -> dict:
         - total_count: Total number of games
         - total_pages: Total number of pages
     """
-    total_count = queryset.count()
+    total_count = results.total_count
     total_pages = (total_count + amount - 1) // amount if amount > 0 else 0
 
     return {
@@ -176,17 +477,66 @@ def get_pagination_metadata(queryset: QuerySet, amount: int) -> dict:
         "total_pages": total_pages
     }
 
-def get_game_by_slug(slug: str):
+def build_game_list_response(
+    results: SearchResults, start_index: int, amount: int, fields: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """Build the paginated game list payload served by the list endpoint and the list page."""
+    response_fields = fields or GAME_LIST_FIELDS
+    cards = get_paginated_games(results, start_index, amount)
+
+    return {
+        "games": [{field: getattr(card, field) for field in response_fields} for card in cards],
+        "pagination": get_pagination_metadata(results, amount),
+    }
+
+def get_game_by_slug(slug: str, fields: Optional[List[str]] = None):
     """
     Get a game by its slug.
     
     Args:
         slug: The unique slug identifier for the game
+        fields: Response fields to load columns for; loads all columns if None
         
     Returns:
         Game object or None if not found
     """
     try:
-        return Game.objects.get(slug=slug)
+        return _game_detail_queryset(fields).get(slug=slug)
     except Game.DoesNotExist:
         return None
+
+def get_games_by_slugs(slugs: List[str], fields: Optional[List[str]] = None) -> Dict[str, Game]:
+    """
+    Get many games by their slugs with a constant number of queries.
+
+    Args:
+        slugs: The unique slug identifiers of the games
+        fields: Response fields to load columns for; loads all columns if None
+
+    Returns:
+        Dictionary mapping each found slug to its Game object
+    """
+    queryset = _game_detail_queryset(fields).filter(slug__in=slugs)
+    queryset = _annotate_vote_counts(queryset.prefetch_related("tags", "age_groups"))
+    return {game.slug: game for game in queryset}
+
+def get_games_by_ids(game_ids: List[int]) -> Dict[int, Game]:
+    """Get the full details of many games by their ids with a constant number of queries."""
+    if not game_ids:
+        return {}
+    queryset = _game_detail_queryset(None).filter(id__in=game_ids)
+    queryset = _annotate_vote_counts(queryset.prefetch_related("tags", "age_groups"))
+    return {game.id: game for game in queryset}
+
+def _game_detail_queryset(fields: Optional[List[str]]) -> QuerySet:
+    """Return the base queryset for game detail lookups."""
+    if fields is None:
+        return Game.objects.select_related("creator")
+    return _project_columns(Game.objects.all(), fields)
+
+def _annotate_vote_counts(queryset: QuerySet) -> QuerySet:
+    """Annotate up- and downvote totals so they need no per-game queries."""
+    return queryset.annotate(
+        upvote_total=Count("votes", filter=Q(votes__value=1)),
+        downvote_total=Count("votes", filter=Q(votes__value=-1)),
+    )
@@ -0,0 +1,391 @@
+"""
+Signal handlers for the wiki app.
+
+Keeps derived data such as the game cards and the search indexes in sync
+with game, tag and vote edits; expensive rebuilds are queued as jobs.
+"""
+
+from typing import List, Set
+
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from core.jobs import enqueue
+
+from .cards import get_game_ids_for_age_group, get_game_ids_for_tag, refresh_game_cards, refresh_vote_counts
+from .changes import record_tombstone, touch_games
+from .fuzzy import trigram_index
+from .images import store_original
+from .models import AgeGroup, Game, GameImage, GameRecommendation, GameRevision, SimilarGame, Tag, Vote
+from .revisions import record_revision
+from .sitemaps import record_shard_change
+from .suggest import suggestion_index
+from .trending import record_vote_change
+from .tasks import (
+    check_game_duplicates_task,
+    generate_image_renditions_task,
+    refresh_recommendations_task,
+    refresh_similar_games_task,
+    update_game_materials_task,
+    update_similar_games_task,
+)
+
+M2M_CHANGE_ACTIONS = ("post_add", "post_remove", "post_clear")
+
+# Games between their pre_delete and post_delete; their votes are deleted in between
+_deleted_game_ids: Set[int] = set()
+
+
+@receiver(pre_delete, sender=Game)
+def remember_deleted_game(sender, instance, **kwargs):
+    """Remember a game while its votes are deleted with it."""
+    _deleted_game_ids.add(instance.pk)
+
+
+@receiver(post_delete, sender=Game)
+def forget_deleted_game(sender, instance, **kwargs):
+    """Forget a game once it is deleted."""
+    _deleted_game_ids.discard(instance.pk)
+
+
+def _is_game_deleted(game_id: int) -> bool:
+    """Return whether a game is being deleted, so vote cascades skip its derived data."""
+    return game_id in _deleted_game_ids
+
+
+@receiver(post_save, sender=Game)
+def refresh_card_on_game_save(sender, instance, raw=False, **kwargs):
+    """Rebuild the list card of a saved game."""
+    if raw:
+        return
+    refresh_game_cards([instance.pk])
+
+
+@receiver(m2m_changed, sender=Game.tags.through)
+@receiver(m2m_changed, sender=Game.age_groups.through)
+def remember_cleared_relations(sender, instance, action, reverse, model, **kwargs):
+    """Remember the related objects before a clear, which reports no pk_set."""
+    if action != "pre_clear":
+        return
+    if reverse:
+        filters, column = {f"{instance._meta.model_name}_id": instance.pk}, "game_id"
+    else:
+        filters, column = {"game_id": instance.pk}, f"{model._meta.model_name}_id"
+    instance._cleared_pks = list(sender.objects.filter(**filters).values_list(column, flat=True))
+
+
+def _get_changed_pks(instance, action: str, pk_set) -> List[int]:
+    """Return the related objects added, removed or cleared by an m2m change."""
+    if action == "post_clear":
+        return getattr(instance, "_cleared_pks", [])
+    return list(pk_set or [])
+
+
+def _get_changed_game_ids(instance, action: str, reverse: bool, pk_set) -> List[int]:
+    """Return the games whose tags or age groups an m2m change touched."""
+    return _get_changed_pks(instance, action, pk_set) if reverse else [instance.pk]
+
+
+@receiver(m2m_changed, sender=Game.tags.through)
+@receiver(m2m_changed, sender=Game.age_groups.through)
+def refresh_cards_on_m2m_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Rebuild the cards of games whose tags or age groups changed."""
+    if action not in M2M_CHANGE_ACTIONS:
+        return
+    refresh_game_cards(_get_changed_game_ids(instance, action, reverse, pk_set))
+
+
+@receiver(post_save, sender=Tag)
+def refresh_cards_on_tag_save(sender, instance, raw=False, **kwargs):
+    """Rebuild the cards showing a renamed tag."""
+    if raw:
+        return
+    refresh_game_cards(get_game_ids_for_tag(instance.pk))
+
+
+@receiver(post_save, sender=AgeGroup)
+def refresh_cards_on_age_group_save(sender, instance, raw=False, **kwargs):
+    """Rebuild the cards showing a changed age group."""
+    if raw:
+        return
+    refresh_game_cards(get_game_ids_for_age_group(instance.pk))
+
+
+@receiver(pre_delete, sender=Tag)
+def remember_tag_card_games(sender, instance, **kwargs):
+    """Remember the games showing a tag before it is deleted."""
+    instance._card_game_ids = get_game_ids_for_tag(instance.pk)
+
+
+@receiver(pre_delete, sender=AgeGroup)
+def remember_age_group_card_games(sender, instance, **kwargs):
+    """Remember the games showing an age group before it is deleted."""
+    instance._card_game_ids = get_game_ids_for_age_group(instance.pk)
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=AgeGroup)
+def refresh_cards_after_delete(sender, instance, **kwargs):
+    """Rebuild the cards that showed a deleted tag or age group."""
+    refresh_game_cards(getattr(instance, "_card_game_ids", []))
+
+
+@receiver(post_save, sender=Vote)
+@receiver(post_delete, sender=Vote)
+def refresh_card_vote_counts(sender, instance, **kwargs):
+    """Recount the votes shown on a game's card."""
+    refresh_vote_counts(instance.game_id)
+
+
+@receiver(post_save, sender=Game)
+def update_similar_games_on_save(sender, instance, raw=False, **kwargs):
+    """Queue a refresh of the similar-game index after a game is saved."""
+    if raw:
+        return
+    _enqueue_similar_games_update(instance.pk)
+
+
+@receiver(m2m_changed, sender=Game.tags.through)
+@receiver(m2m_changed, sender=Game.age_groups.through)
+def update_similar_games_on_m2m_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Queue a refresh of the similar-game index after tags or age groups change."""
+    if action not in M2M_CHANGE_ACTIONS:
+        return
+    for game_id in _get_changed_game_ids(instance, action, reverse, pk_set):
+        _enqueue_similar_games_update(game_id)
+
+
+def _enqueue_similar_games_update(game_id: int) -> None:
+    """Queue one similar-game update per game, however many edits it gets."""
+    enqueue(update_similar_games_task, key=f"similar-games:{game_id}", game_id=game_id)
+
+
+@receiver(pre_delete, sender=Game)
+def remember_similar_game_referrers(sender, instance, **kwargs):
+    """Remember which games list a game as neighbour before it is deleted."""
+    instance._similar_referrer_ids = list(
+        SimilarGame.objects.filter(similar_game=instance).values_list("game_id", flat=True)
+    )
+
+
+@receiver(post_delete, sender=Game)
+def refresh_similar_game_referrers(sender, instance, **kwargs):
+    """Queue a refill of the neighbour lists that pointed to a deleted game."""
+    referrer_ids = getattr(instance, "_similar_referrer_ids", [])
+    if referrer_ids:
+        enqueue(refresh_similar_games_task, game_ids=referrer_ids)
+
+
+@receiver(post_save, sender=Game)
+def update_suggestions_on_game_save(sender, instance, **kwargs):
+    """Index the title of a saved game for typeahead suggestions."""
+    suggestion_index.update("game", instance.pk, instance.title, instance.slug)
+
+
+@receiver(post_delete, sender=Game)
+def remove_game_suggestions(sender, instance, **kwargs):
+    """Remove a deleted game from typeahead suggestions."""
+    suggestion_index.remove("game", instance.pk)
+
+
+@receiver(post_save, sender=Tag)
+def update_suggestions_on_tag_save(sender, instance, **kwargs):
+    """Index the name of a saved tag for typeahead suggestions."""
+    suggestion_index.update("tag", instance.pk, instance.name)
+
+
+@receiver(post_delete, sender=Tag)
+def remove_tag_suggestions(sender, instance, **kwargs):
+    """Remove a deleted tag from typeahead suggestions."""
+    suggestion_index.remove("tag", instance.pk)
+
+
+@receiver(m2m_changed, sender=Game.tags.through)
+def update_tag_popularity(sender, instance, action, reverse, pk_set, **kwargs):
+    """Re-rank tags whose number of games changed."""
+    if action not in M2M_CHANGE_ACTIONS:
+        return
+    tag_ids = [instance.pk] if reverse else (pk_set or [])
+    for tag_id in tag_ids:
+        suggestion_index.set_popularity("tag", tag_id, Game.objects.filter(tags=tag_id).count())
+
+
+@receiver(post_save, sender=Vote)
+@receiver(post_delete, sender=Vote)
+def update_game_popularity(sender, instance, **kwargs):
+    """Re-rank a game after its votes changed."""
+    upvotes = Vote.objects.filter(game_id=instance.game_id, value=1).count()
+    suggestion_index.set_popularity("game", instance.game_id, upvotes)
+
+
+@receiver(post_save, sender=Vote)
+@receiver(post_delete, sender=Vote)
+def enqueue_recommendation_refresh(sender, instance, **kwargs):
+    """Queue one recommendation refresh per game whose votes were saved or deleted."""
+    if _is_game_deleted(instance.game_id):
+        return
+    enqueue(
+        refresh_recommendations_task,
+        key=f"recommendations:{instance.game_id}",
+        game_ids=[instance.game_id],
+    )
+
+
+@receiver(pre_delete, sender=Game)
+def remember_recommendation_referrers(sender, instance, **kwargs):
+    """Remember which games recommend a game before it is deleted."""
+    instance._recommendation_referrer_ids = list(
+        GameRecommendation.objects.filter(recommended_game=instance).values_list("game_id", flat=True)
+    )
+
+
+@receiver(post_delete, sender=Game)
+def refresh_recommendation_referrers(sender, instance, **kwargs):
+    """Queue a refill of the recommendations that pointed to a deleted game."""
+    referrer_ids = getattr(instance, "_recommendation_referrer_ids", [])
+    if referrer_ids:
+        enqueue(refresh_recommendations_task, game_ids=referrer_ids)
+
+
+@receiver(post_save, sender=Game)
+def update_fuzzy_index_on_game_save(sender, instance, **kwargs):
+    """Index the title trigrams of a saved game for fuzzy search."""
+    trigram_index.update(instance.pk, instance.title)
+
+
+@receiver(post_delete, sender=Game)
+def remove_game_from_fuzzy_index(sender, instance, **kwargs):
+    """Remove a deleted game from fuzzy search."""
+    trigram_index.remove(instance.pk)
+
+
+@receiver(pre_save, sender=Game)
+def remember_content_change(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Remember whether a save changes the markdown, so unchanged saves skip the revision history."""
+    if raw:
+        return
+    if update_fields is not None and "markdown_content" not in update_fields:
+        instance._content_changed = False
+        return
+    stored = Game.objects.filter(pk=instance.pk).values_list("markdown_content", flat=True)[:1] if instance.pk else []
+    instance._content_changed = not stored or (stored[0] or "") != (instance.markdown_content or "")
+
+
+@receiver(post_save, sender=Game)
+def record_game_revision(sender, instance, raw=False, **kwargs):
+    """Store a new revision when the content of a game changed."""
+    if raw or not getattr(instance, "_content_changed", True):
+        return
+    record_revision(instance, author=getattr(instance, "_revision_author", None))
+
+
+@receiver(post_save, sender=Game)
+@receiver(post_save, sender=GameRevision)
+def update_sitemap_shard(sender, instance, created, raw=False, **kwargs):
+    """Move the last modification of the sitemap shard listing a new game or revision."""
+    if raw or not created:
+        return
+    record_shard_change(instance.pk if sender is Game else instance.game_id, instance.created_at)
+
+
+@receiver(pre_save, sender=GameImage)
+def store_uploaded_image(sender, instance, raw=False, **kwargs):
+    """Store a new upload under its content hash instead of its file name."""
+    # An uncommitted file is a fresh upload; stored files are left alone
+    if raw or not instance.image or instance.image._committed:
+        return
+    store_original(instance)
+    instance._renditions_pending = True
+
+
+@receiver(post_save, sender=GameImage)
+def enqueue_image_renditions(sender, instance, raw=False, **kwargs):
+    """Queue rendering the renditions of a new upload."""
+    if raw or not getattr(instance, "_renditions_pending", False):
+        return
+    instance._renditions_pending = False
+    enqueue(generate_image_renditions_task, key=f"image-renditions:{instance.content_hash}", content_hash=instance.content_hash)
+
+
+@receiver(post_save, sender=Game)
+def index_materials_on_game_save(sender, instance, raw=False, **kwargs):
+    """Queue the indexing of the materials listed in a saved game."""
+    if raw:
+        return
+    enqueue(update_game_materials_task, key=f"materials:{instance.pk}", game_id=instance.pk)
+
+
+@receiver(post_save, sender=Game)
+def check_duplicates_on_game_save(sender, instance, raw=False, **kwargs):
+    """Queue the near-duplicate check of a saved game."""
+    if raw:
+        return
+    enqueue(check_game_duplicates_task, key=f"duplicates:{instance.pk}", game_id=instance.pk)
+
+
+@receiver(pre_save, sender=Vote)
+def remember_previous_vote_value(sender, instance, raw=False, **kwargs):
+    """Remember the stored value of a changed vote for the trending buckets and user stats."""
+    if raw or instance.pk is None:
+        instance._previous_value = None
+        return
+    instance._previous_value = Vote.objects.filter(pk=instance.pk).values_list("value", flat=True).first()
+
+
+@receiver(post_save, sender=Vote)
+def record_trending_vote(sender, instance, created, raw=False, **kwargs):
+    """Add a new or changed vote to the game's current trending bucket."""
+    if raw:
+        return
+    previous_value = None if created else getattr(instance, "_previous_value", None)
+    record_vote_change(
+        instance.game_id,
+        upvotes=(instance.value == 1) - (previous_value == 1),
+        downvotes=(instance.value == -1) - (previous_value == -1),
+    )
+
+
+@receiver(post_delete, sender=Vote)
+def record_trending_vote_removal(sender, instance, **kwargs):
+    """Subtract a deleted vote in the game's current trending bucket."""
+    if _is_game_deleted(instance.game_id):
+        return
+    record_vote_change(instance.game_id, upvotes=-(instance.value == 1), downvotes=-(instance.value == -1))
+
+
+@receiver(m2m_changed, sender=Game.tags.through)
+@receiver(m2m_changed, sender=Game.age_groups.through)
+def touch_games_on_m2m_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Mark games whose tags or age groups changed for the change feed."""
+    if action not in M2M_CHANGE_ACTIONS:
+        return
+    touch_games(_get_changed_game_ids(instance, action, reverse, pk_set))
+
+
+@receiver(post_save, sender=Tag)
+def touch_games_on_tag_save(sender, instance, created, raw=False, **kwargs):
+    """Mark the games showing a renamed tag for the change feed."""
+    if raw or created:
+        return
+    touch_games(get_game_ids_for_tag(instance.pk))
+
+
+@receiver(post_save, sender=AgeGroup)
+def touch_games_on_age_group_save(sender, instance, created, raw=False, **kwargs):
+    """Mark the games showing a changed age group for the change feed."""
+    if raw or created:
+        return
+    touch_games(get_game_ids_for_age_group(instance.pk))
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=AgeGroup)
+def touch_games_after_delete(sender, instance, **kwargs):
+    """Mark the games that showed a deleted tag or age group for the change feed."""
+    touch_games(getattr(instance, "_card_game_ids", []))
+
+
+@receiver(post_delete, sender=Game)
+def record_game_tombstone(sender, instance, **kwargs):
+    """Leave a tombstone of a deleted game for the change feed."""
+    record_tombstone(instance.pk, instance.slug)
@@ -0,0 +1,327 @@
+"""
+Similar-game index for the wiki app.
+
+Games are compared by a weighted feature vector built from their five 1-10
+indices, their tags and their age groups. The nearest neighbours of every
+game are precomputed into the SimilarGame table, so a lookup is a single
+indexed read.
+
+Workers keep the feature vectors of the archive in memory and, before each
+update, reload only the rows of games changed or deleted since their last
+sync, so an edit does not reload the whole archive.
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .changes import DEFAULT_SETTLE_SECONDS
+from .models import Game, GameTombstone, SimilarGame
+
+INDEX_FIELDS = [
+    "difficulty_index",
+    "group_size_index",
+    "preperation_index",
+    "physical_index",
+    "duration_index",
+]
+
+# Feature weights; indices are scaled to 0-1 before weighting
+INDEX_WEIGHT = 1.0
+TAG_WEIGHT = 0.5
+AGE_GROUP_WEIGHT = 0.5
+
+TOP_K = 10
+BLOCK_SIZE = 512
+# The cached matrix is reloaded completely after this many seconds
+DEFAULT_MATRIX_MAX_AGE = 60 * 60
+
+
+class FeatureMatrix:
+    """Feature vectors of the archive, kept in memory and updated row by row."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._loaded_at: Optional[float] = None
+        self._synced_at: Optional[datetime] = None
+        self._reset()
+
+    def _reset(self) -> None:
+        self._game_ids: List[int] = []
+        self._positions: Dict[int, int] = {}
+        self._indices = np.zeros((0, len(INDEX_FIELDS)))
+        self._tags = np.zeros((0, 0))
+        self._age_groups = np.zeros((0, 0))
+        self._tag_columns: Dict[int, int] = {}
+        self._age_group_columns: Dict[int, int] = {}
+
+    def load(self) -> None:
+        """Load the features of every game from the database."""
+        with self._lock:
+            self._load()
+
+    def get(self, changed_game_ids: Iterable[int] = ()) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return all game ids and their weighted feature vectors.
+
+        Args:
+            changed_game_ids: Games to reload even if their change is not visible
+                from their updated_at yet
+
+        Returns:
+            Tuple of the game ids and a feature matrix with one row per game;
+            both are copies the caller may keep
+        """
+        with self._lock:
+            max_age = getattr(settings, "SIMILAR_GAMES_MATRIX_MAX_AGE", DEFAULT_MATRIX_MAX_AGE)
+            if self._loaded_at is None or time.monotonic() - self._loaded_at > max_age:
+                self._load()
+            else:
+                self._sync(set(changed_game_ids))
+            features = np.hstack([
+                self._indices / 10.0 * INDEX_WEIGHT,
+                self._tags * TAG_WEIGHT,
+                self._age_groups * AGE_GROUP_WEIGHT,
+            ])
+            return np.array(self._game_ids, dtype=np.int64), features
+
+    def _load(self) -> None:
+        synced_at = timezone.now()
+        self._reset()
+        self._set_rows(
+            Game.objects.order_by("id").values_list("id", *INDEX_FIELDS),
+            Game.tags.through.objects.values_list("game_id", "tag_id"),
+            Game.age_groups.through.objects.values_list("game_id", "agegroup_id"),
+        )
+        self._loaded_at, self._synced_at = time.monotonic(), synced_at
+
+    def _sync(self, changed_game_ids: Set[int]) -> None:
+        """Reload the games changed and drop the games deleted since the last sync."""
+        synced_at = timezone.now()
+        # Overlaps the last sync so edits committed late with an earlier updated_at are seen
+        since = self._synced_at - timedelta(
+            seconds=getattr(settings, "CHANGE_FEED_SETTLE_SECONDS", DEFAULT_SETTLE_SECONDS)
+        )
+        changed_game_ids.update(Game.objects.filter(updated_at__gte=since).values_list("id", flat=True))
+        deleted_game_ids = set(
+            GameTombstone.objects.filter(deleted_at__gte=since).values_list("game_id", flat=True)
+        )
+        if changed_game_ids:
+            rows = list(Game.objects.filter(id__in=changed_game_ids).values_list("id", *INDEX_FIELDS))
+            found_ids = {row[0] for row in rows}
+            deleted_game_ids = (deleted_game_ids | changed_game_ids) - found_ids
+            self._set_rows(
+                rows,
+                Game.tags.through.objects.filter(game_id__in=found_ids).values_list("game_id", "tag_id"),
+                Game.age_groups.through.objects.filter(game_id__in=found_ids).values_list("game_id", "agegroup_id"),
+            )
+        self._drop_rows(deleted_game_ids)
+
+        # Deletes that left no tombstone, e.g. bulk deletes, cannot be synced row by row
+        if len(self._game_ids) != Game.objects.count():
+            self._load()
+            return
+        self._synced_at = synced_at
+
+    def _set_rows(
+        self,
+        rows: Iterable[tuple],
+        tag_pairs: Iterable[Tuple[int, int]],
+        age_group_pairs: Iterable[Tuple[int, int]],
+    ) -> None:
+        """Insert or replace the feature rows of games from their (id, *indices) rows and m2m pairs."""
+        rows = list(rows)
+        if not rows:
+            return
+        game_ids = [row[0] for row in rows]
+        new_ids = [game_id for game_id in game_ids if game_id not in self._positions]
+        for game_id in new_ids:
+            self._positions[game_id] = len(self._game_ids)
+            self._game_ids.append(game_id)
+        self._indices = _add_rows(self._indices, len(new_ids))
+        self._tags = _add_rows(self._tags, len(new_ids))
+        self._age_groups = _add_rows(self._age_groups, len(new_ids))
+
+        positions = [self._positions[game_id] for game_id in game_ids]
+        self._indices[positions] = np.array([row[1:] for row in rows], dtype=np.float64)
+        self._tags = _set_one_hot(self._tags, self._tag_columns, positions, self._positions, tag_pairs)
+        self._age_groups = _set_one_hot(
+            self._age_groups, self._age_group_columns, positions, self._positions, age_group_pairs
+        )
+
+    def _drop_rows(self, game_ids: Set[int]) -> None:
+        """Remove the feature rows of deleted games."""
+        positions = [self._positions[game_id] for game_id in game_ids if game_id in self._positions]
+        if not positions:
+            return
+        self._indices = np.delete(self._indices, positions, axis=0)
+        self._tags = np.delete(self._tags, positions, axis=0)
+        self._age_groups = np.delete(self._age_groups, positions, axis=0)
+        self._game_ids = [game_id for game_id in self._game_ids if game_id not in game_ids]
+        self._positions = {game_id: position for position, game_id in enumerate(self._game_ids)}
+
+
+def _add_rows(matrix: np.ndarray, count: int) -> np.ndarray:
+    """Return the matrix with count zero rows appended."""
+    if not count:
+        return matrix
+    return np.vstack([matrix, np.zeros((count, matrix.shape[1]))])
+
+
+def _set_one_hot(
+    matrix: np.ndarray,
+    columns: Dict[int, int],
+    rows: List[int],
+    positions: Dict[int, int],
+    pairs: Iterable[Tuple[int, int]],
+) -> np.ndarray:
+    """Replace the indicator rows of a game-by-value matrix from (game_id, value_id) pairs."""
+    pairs = [(game_id, value_id) for game_id, value_id in pairs if game_id in positions]
+    new_values = sorted({value_id for _, value_id in pairs} - columns.keys())
+    for value_id in new_values:
+        columns[value_id] = len(columns)
+    if new_values:
+        # Columns of deleted tags stay as zeros, which does not change any distance
+        matrix = np.hstack([matrix, np.zeros((matrix.shape[0], len(new_values)))])
+    matrix[rows] = 0.0
+    if pairs:
+        matrix[
+            [positions[game_id] for game_id, _ in pairs],
+            [columns[value_id] for _, value_id in pairs],
+        ] = 1.0
+    return matrix
+
+
+feature_matrix = FeatureMatrix()
+
+
+def _block_distances(block: np.ndarray, features: np.ndarray) -> np.ndarray:
+    """Return the squared distances between a block of games and every game."""
+    block_norms = np.einsum("ij,ij->i", block, block)
+    feature_norms = np.einsum("ij,ij->i", features, features)
+    distances = block_norms[:, None] + feature_norms[None, :] - 2.0 * (block @ features.T)
+    return np.maximum(distances, 0.0)
+
+
+def _nearest(distances: np.ndarray, positions: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Return neighbour positions and distances per row, nearest first."""
+    distances[np.arange(len(positions)), positions] = np.inf
+    k = min(top_k, distances.shape[1] - 1)
+    if k <= 0:
+        return np.empty((len(positions), 0), dtype=np.int64), np.empty((len(positions), 0))
+
+    nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    nearest_distances = np.take_along_axis(distances, nearest, axis=1)
+    order = np.argsort(nearest_distances, axis=1, kind="stable")
+    nearest = np.take_along_axis(nearest, order, axis=1)
+    return nearest, np.sqrt(np.take_along_axis(nearest_distances, order, axis=1))
+
+
+def _compute_rows(
+    game_ids: np.ndarray, features: np.ndarray, positions: np.ndarray, top_k: int
+) -> List[SimilarGame]:
+    """Compute the neighbour rows for the games at the given positions."""
+    rows = []
+    for start in range(0, len(positions), BLOCK_SIZE):
+        block_positions = positions[start:start + BLOCK_SIZE]
+        distances = _block_distances(features[block_positions], features)
+        nearest, nearest_distances = _nearest(distances, block_positions, top_k)
+        for position, neighbours, neighbour_distances in zip(block_positions, nearest, nearest_distances):
+            rows.extend(
+                SimilarGame(
+                    game_id=int(game_ids[position]),
+                    similar_game_id=int(game_ids[neighbour]),
+                    rank=rank,
+                    distance=float(distance),
+                )
+                for rank, (neighbour, distance) in enumerate(zip(neighbours, neighbour_distances))
+            )
+    return rows
+
+
+def rebuild_similar_games(top_k: int = TOP_K) -> int:
+    """Recompute the neighbour table for the whole archive and return its size."""
+    feature_matrix.load()
+    game_ids, features = feature_matrix.get()
+    rows = _compute_rows(game_ids, features, np.arange(len(game_ids)), top_k)
+
+    with transaction.atomic():
+        SimilarGame.objects.all().delete()
+        SimilarGame.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def refresh_similar_games(game_ids_to_refresh: Iterable[int], top_k: int = TOP_K) -> None:
+    """Recompute the neighbour rows of the given games only."""
+    refresh_ids = set(game_ids_to_refresh)
+    if not refresh_ids:
+        return
+
+    game_ids, features = feature_matrix.get()
+    _replace_rows(refresh_ids, game_ids, features, top_k)
+
+
+def update_similar_games(game_id: int, top_k: int = TOP_K) -> None:
+    """Refresh the neighbours of a changed game and of every game it affects."""
+    game_ids, features = feature_matrix.get(changed_game_ids=[game_id])
+    position = np.flatnonzero(game_ids == game_id)
+    if not len(position):
+        return
+
+    refresh_ids = {game_id}
+    refresh_ids.update(
+        SimilarGame.objects.filter(similar_game_id=game_id).values_list("game_id", flat=True)
+    )
+    refresh_ids.update(_games_with_closer_neighbour(game_ids, features, int(position[0]), top_k))
+    _replace_rows(refresh_ids, game_ids, features, top_k)
+
+
+def _games_with_closer_neighbour(
+    game_ids: np.ndarray, features: np.ndarray, position: int, top_k: int
+) -> List[int]:
+    """Return the games for which the given game now beats their worst neighbour."""
+    distances = np.sqrt(_block_distances(features[[position]], features)[0])
+    worst = np.full(len(game_ids), np.inf)
+    worst_by_game = dict(
+        SimilarGame.objects.filter(rank=top_k - 1).values_list("game_id", "distance")
+    )
+    for index, other_id in enumerate(game_ids.tolist()):
+        worst[index] = worst_by_game.get(other_id, np.inf)
+
+    closer = distances < worst
+    closer[position] = False
+    return game_ids[closer].tolist()
+
+
+def _replace_rows(
+    refresh_ids: set, game_ids: np.ndarray, features: np.ndarray, top_k: int
+) -> None:
+    """Swap the stored neighbour rows of the given games for fresh ones."""
+    positions = np.flatnonzero(np.isin(game_ids, list(refresh_ids)))
+    rows = _compute_rows(game_ids, features, positions, top_k)
+
+    with transaction.atomic():
+        SimilarGame.objects.filter(game_id__in=refresh_ids).delete()
+        SimilarGame.objects.bulk_create(rows, batch_size=1000)
+
+
+def get_similar_games(slug: str, limit: int = TOP_K) -> List[SimilarGame]:
+    """Return the precomputed neighbours of a game, nearest first."""
+    return list(
+        SimilarGame.objects.filter(game__slug=slug)
+        .select_related("similar_game")
+        .only(
+            "rank",
+            "distance",
+            "similar_game__title",
+            "similar_game__slug",
+            "similar_game__short_description",
+        )
+        .order_by("rank")[:limit]
+    )
@@ -0,0 +1,256 @@
+"""
+Sitemaps and the Atom feed of the wiki app.
+
+Game pages are listed in sitemap shards of at most SITEMAP_SHARD_SIZE URLs,
+shard n holding the games with ids in (n * size, (n + 1) * size], plus a
+sitemap index. Shards are streamed from keyset-paginated queries on the
+primary key, so memory stays constant and no query reads more than one chunk.
+The last modification of each shard is kept in SitemapShard as games and
+revisions are saved, so the index never aggregates over all games at
+request time. The generate_sitemaps command recomputes these shards and
+writes all documents to SITEMAP_ROOT; the views serve these files when
+present and generate the documents otherwise.
+"""
+
+import io
+import os
+import tempfile
+from datetime import datetime
+from typing import Callable, Dict, IO, Iterator, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed
+
+from .models import Game, GameCard, GameRevision, SitemapShard
+
+SITEMAP_SHARD_SIZE = 50000
+ITERATION_CHUNK_SIZE = 2000
+FEED_SIZE = 50
+FEED_TITLE = "Massive Game Archive: Neue Spiele"
+INDEX_CACHE_KEY = "sitemaps:index"
+FEED_CACHE_KEY = "sitemaps:feed"
+DEFAULT_CACHE_TIMEOUT = 60 * 60
+
+SITEMAP_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+SITEMAP_NAMESPACE = "http://www.sitemaps.org/schemas/sitemap/0.9"
+
+# Builds an absolute URL from a site-relative path
+UrlBuilder = Callable[[str], str]
+
+
+def get_sitemap_root() -> str:
+    """Return the directory that pre-generated documents are written to."""
+    return str(getattr(settings, "SITEMAP_ROOT", os.path.join(settings.BASE_DIR, "sitemaps")))
+
+
+def get_pregenerated_path(name: str) -> Optional[str]:
+    """Return the path of a pre-generated document if it exists."""
+    path = os.path.join(get_sitemap_root(), name)
+    return path if os.path.isfile(path) else None
+
+
+def get_shard_filename(shard: int) -> str:
+    """Return the file name of a pre-generated shard."""
+    return f"sitemap-{shard}.xml"
+
+
+def _shard_expression(id_field: str):
+    """Return the expression computing the shard of a game id."""
+    return (F(id_field) - 1) / SITEMAP_SHARD_SIZE
+
+
+def get_shard(game_id: int) -> int:
+    """Return the shard that lists a game."""
+    return (game_id - 1) // SITEMAP_SHARD_SIZE
+
+
+def compute_shard_lastmods() -> Dict[int, datetime]:
+    """Return each non-empty shard with the time its newest game or revision was saved."""
+    lastmods = {}
+    for shard, created_at in (
+        Game.objects.annotate(shard=_shard_expression("id")).values("shard")
+        .annotate(lastmod=Max("created_at")).order_by().values_list("shard", "lastmod")
+    ):
+        lastmods[shard] = created_at
+    for shard, created_at in (
+        GameRevision.objects.annotate(shard=_shard_expression("game_id")).values("shard")
+        .annotate(lastmod=Max("created_at")).order_by().values_list("shard", "lastmod")
+    ):
+        if shard in lastmods:
+            lastmods[shard] = max(lastmods[shard], created_at)
+    return lastmods
+
+
+def record_shard_change(game_id: int, moment: datetime) -> None:
+    """Move the last modification of a game's shard to the time it was saved."""
+    shard = get_shard(game_id)
+    if SitemapShard.objects.filter(shard=shard).update(lastmod=moment):
+        return
+    try:
+        with transaction.atomic():
+            SitemapShard.objects.create(shard=shard, lastmod=moment)
+    except IntegrityError:
+        # Another save created the shard in the meantime
+        SitemapShard.objects.filter(shard=shard).update(lastmod=moment)
+
+
+def refresh_shard_lastmods() -> List[Tuple[int, str]]:
+    """Recompute the stored shards, dropping shards whose games were all deleted."""
+    lastmods = compute_shard_lastmods()
+    with transaction.atomic():
+        SitemapShard.objects.exclude(shard__in=list(lastmods)).delete()
+        SitemapShard.objects.bulk_create(
+            [SitemapShard(shard=shard, lastmod=lastmod) for shard, lastmod in lastmods.items()],
+            update_conflicts=True,
+            unique_fields=["shard"],
+            update_fields=["lastmod"],
+        )
+    return [(shard, lastmods[shard].isoformat()) for shard in sorted(lastmods)]
+
+
+def get_shard_lastmods() -> List[Tuple[int, str]]:
+    """Return the stored shards with their last modification, in shard order."""
+    return [
+        (shard, lastmod.isoformat())
+        for shard, lastmod in SitemapShard.objects.order_by("shard").values_list("shard", "lastmod")
+    ]
+
+
+def iter_shard_games(shard: int) -> Iterator[Tuple[str, str]]:
+    """Yield the slug and last modification time of each game in a shard, in id order."""
+    latest_revision = GameRevision.objects.filter(game=OuterRef("pk")).order_by("-number").values("created_at")[:1]
+    last_id = shard * SITEMAP_SHARD_SIZE
+    end_id = last_id + SITEMAP_SHARD_SIZE
+    while True:
+        rows = list(
+            Game.objects.filter(id__gt=last_id, id__lte=end_id)
+            .order_by("id")
+            .annotate(lastmod=Coalesce(Subquery(latest_revision), "created_at"))
+            .values_list("id", "slug", "lastmod")[:ITERATION_CHUNK_SIZE]
+        )
+        for _, slug, lastmod in rows:
+            yield slug, lastmod.isoformat()
+        if len(rows) < ITERATION_CHUNK_SIZE:
+            return
+        last_id = rows[-1][0]
+
+
+def stream_sitemap_index(build_url: UrlBuilder, shards: List[Tuple[int, str]]) -> Iterator[str]:
+    """Yield the sitemap index listing the given shards."""
+    yield SITEMAP_HEADER
+    yield f'<sitemapindex xmlns="{SITEMAP_NAMESPACE}">\n'
+    for shard, lastmod in shards:
+        location = escape(build_url(reverse("sitemap_shard", kwargs={"shard": shard})))
+        yield f"<sitemap><loc>{location}</loc><lastmod>{lastmod}</lastmod></sitemap>\n"
+    yield "</sitemapindex>\n"
+
+
+def stream_sitemap_shard(build_url: UrlBuilder, shard: int) -> Iterator[str]:
+    """Yield the sitemap of one shard chunk by chunk."""
+    yield SITEMAP_HEADER
+    yield f'<urlset xmlns="{SITEMAP_NAMESPACE}">\n'
+    for slug, lastmod in iter_shard_games(shard):
+        location = escape(build_url(reverse("game_detail", kwargs={"slug": slug})))
+        yield f"<url><loc>{location}</loc><lastmod>{lastmod}</lastmod></url>\n"
+    yield "</urlset>\n"
+
+
+def write_feed(build_url: UrlBuilder, outfile: IO[str]) -> None:
+    """Write the Atom feed of the newest games, read from the game cards."""
+    feed = Atom1Feed(
+        title=FEED_TITLE,
+        link=build_url(reverse("game_list")),
+        description="",
+        feed_url=build_url(reverse("game_feed")),
+        language="de",
+    )
+    cards = GameCard.objects.only("slug", "title", "short_description", "created_at").order_by("-created_at")
+    for card in cards[:FEED_SIZE]:
+        link = build_url(reverse("game_detail", kwargs={"slug": card.slug}))
+        feed.add_item(
+            title=card.title,
+            link=link,
+            description=card.short_description or "",
+            unique_id=link,
+            pubdate=card.created_at,
+            updateddate=card.created_at,
+        )
+    feed.write(outfile, "utf-8")
+
+
+def get_cached_index(build_url: UrlBuilder) -> str:
+    """Return the sitemap index from the stored shards, cached for SITEMAP_CACHE_TIMEOUT seconds."""
+    key = f"{INDEX_CACHE_KEY}:{build_url('/')}"
+    index = cache.get(key)
+    if index is None:
+        index = "".join(stream_sitemap_index(build_url, get_shard_lastmods()))
+        cache.set(key, index, getattr(settings, "SITEMAP_CACHE_TIMEOUT", DEFAULT_CACHE_TIMEOUT))
+    return index
+
+
+def get_cached_feed(build_url: UrlBuilder) -> str:
+    """Return the Atom feed, cached for SITEMAP_CACHE_TIMEOUT seconds."""
+    key = f"{FEED_CACHE_KEY}:{build_url('/')}"
+    feed = cache.get(key)
+    if feed is None:
+        outfile = io.StringIO()
+        write_feed(build_url, outfile)
+        feed = outfile.getvalue()
+        cache.set(key, feed, getattr(settings, "SITEMAP_CACHE_TIMEOUT", DEFAULT_CACHE_TIMEOUT))
+    return feed
+
+
+def generate_sitemap_files(base_url: str, root: Optional[str] = None) -> Dict[str, int]:
+    """
+    Write the sitemap index, all shards and the feed to files.
+
+    Args:
+        base_url: Scheme and host the URLs are built with, e.g. 'https://example.org'
+        root: Output directory; SITEMAP_ROOT if None
+
+    Returns:
+        Dictionary with the number of shards written and stale shards removed
+    """
+    root = root or get_sitemap_root()
+    os.makedirs(root, exist_ok=True)
+    base_url = base_url.rstrip("/")
+
+    def build_url(path: str) -> str:
+        return f"{base_url}{path}"
+
+    shards = refresh_shard_lastmods()
+    for shard, _ in shards:
+        _write_atomically(
+            root, get_shard_filename(shard), lambda outfile: outfile.writelines(stream_sitemap_shard(build_url, shard))
+        )
+    _write_atomically(root, "feed.atom", lambda outfile: write_feed(build_url, outfile))
+    # The index is replaced last so it never lists a shard that is not written yet
+    _write_atomically(root, "sitemap.xml", lambda outfile: outfile.writelines(stream_sitemap_index(build_url, shards)))
+
+    current = {get_shard_filename(shard) for shard, _ in shards}
+    stale = [
+        name for name in os.listdir(root)
+        if name.startswith("sitemap-") and name.endswith(".xml") and name not in current
+    ]
+    for name in stale:
+        os.remove(os.path.join(root, name))
+    return {"shards": len(shards), "removed": len(stale)}
+
+
+def _write_atomically(root: str, name: str, write: Callable[[IO[str]], None]) -> None:
+    """Write a file next to its destination and move it into place."""
+    descriptor, temp_path = tempfile.mkstemp(dir=root, prefix=f".{name}.")
+    try:
+        with os.fdopen(descriptor, "w", encoding="utf-8") as outfile:
+            write(outfile)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, os.path.join(root, name))
+    except BaseException:
+        os.remove(temp_path)
+        raise
@@ -0,0 +1,149 @@
+"""
+Typeahead suggestions for the wiki app.
+
+Game titles and tag names are kept in an in-memory sorted array that is
+searched with bisect, so suggestions never reach the database. Every entry
+of the prefix range is ranked by popularity; the ranking of the long ranges
+of one- and two-letter prefixes is cached until an entry in them changes.
+The index is built on first use, kept current by model signals and rebuilt
+in the background after SUGGEST_INDEX_TTL seconds to pick up changes made by
+other processes.
+"""
+
+import bisect
+import heapq
+import time
+from typing import Dict, List, Optional, Tuple
+
+from django.db.models import Count, Q
+
+from .indexes import InMemoryIndex
+from .models import Game, Tag
+
+MAX_SUGGESTIONS = 20
+# Rankings of prefixes up to this length are cached
+CACHED_PREFIX_LENGTH = 2
+
+# Entries are (key, kind, id) where kind is "game" or "tag"
+Entry = Tuple[str, str, int]
+Item = Tuple[str, int]
+
+
+def normalize_prefix(text: str) -> str:
+    """Return the form of a text used for prefix matching."""
+    return " ".join(text.casefold().split())
+
+
+def _word_keys(text: str) -> List[str]:
+    """Return a key for each word start so inner words match as well."""
+    words = normalize_prefix(text).split(" ")
+    return [" ".join(words[index:]) for index in range(len(words)) if words[index]]
+
+
+class SuggestionIndex(InMemoryIndex):
+    """Sorted prefix index over game titles and tag names."""
+
+    ttl_setting = "SUGGEST_INDEX_TTL"
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._entries: List[Entry] = []
+        self._labels: Dict[Item, Tuple[str, Optional[str]]] = {}
+        self._popularity: Dict[Item, int] = {}
+        self._ranked: Dict[str, List[Item]] = {}
+
+    def build(self) -> None:
+        """Load every game title and tag name from the database."""
+        games = list(Game.objects.annotate(
+            popularity=Count("votes", filter=Q(votes__value=1))
+        ).values_list("id", "title", "slug", "popularity"))
+        tags = list(Tag.objects.annotate(
+            popularity=Count("games")
+        ).values_list("id", "name", "popularity"))
+
+        labels: Dict[Item, Tuple[str, Optional[str]]] = {}
+        popularity: Dict[Item, int] = {}
+        for game_id, title, slug, upvotes in games:
+            labels[("game", game_id)], popularity[("game", game_id)] = (title, slug), upvotes
+        for tag_id, name, game_total in tags:
+            labels[("tag", tag_id)], popularity[("tag", tag_id)] = (name, None), game_total
+
+        entries = sorted(
+            (key, kind, item_id)
+            for (kind, item_id), (label, _) in labels.items()
+            for key in _word_keys(label)
+        )
+        with self._lock:
+            self._entries, self._labels, self._popularity = entries, labels, popularity
+            self._ranked = {}
+            self._built_at = time.monotonic()
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Dict[str, Optional[str]]]:
+        """Return the most popular titles and tags starting with the prefix."""
+        self._ensure_fresh()
+        key = normalize_prefix(prefix)
+        if not key:
+            return []
+
+        with self._lock:
+            if len(key) > CACHED_PREFIX_LENGTH or limit > MAX_SUGGESTIONS:
+                return [self._describe(item) for item in self._rank(key, limit)]
+            if key not in self._ranked:
+                self._ranked[key] = self._rank(key, MAX_SUGGESTIONS)
+            return [self._describe(item) for item in self._ranked[key][:limit]]
+
+    def _rank(self, key: str, limit: int) -> List[Item]:
+        """Return the most popular distinct items whose keys start with the given key."""
+        start = bisect.bisect_left(self._entries, (key,))
+        end = bisect.bisect_left(self._entries, (key + "\U0010ffff",), start)
+        items = {(kind, item_id) for _, kind, item_id in self._entries[start:end]}
+        return heapq.nsmallest(limit, items, key=lambda item: (-self._popularity.get(item, 0), self._labels[item][0]))
+
+    def _forget_rankings(self, label: str) -> None:
+        """Drop the cached rankings of the prefixes a label appears under."""
+        for key in _word_keys(label):
+            for length in range(1, CACHED_PREFIX_LENGTH + 1):
+                self._ranked.pop(key[:length], None)
+
+    def _describe(self, item: Item) -> Dict[str, Optional[str]]:
+        label, slug = self._labels[item]
+        return {"kind": item[0], "label": label, "slug": slug}
+
+    def update(self, kind: str, item_id: int, label: str, slug: Optional[str] = None) -> None:
+        """Insert or replace the entries of a game or tag."""
+        with self._lock:
+            if self._built_at is None:
+                return
+            self._remove_entries((kind, item_id))
+            self._labels[(kind, item_id)] = (label, slug)
+            self._popularity.setdefault((kind, item_id), 0)
+            self._forget_rankings(label)
+            for key in _word_keys(label):
+                bisect.insort(self._entries, (key, kind, item_id))
+
+    def remove(self, kind: str, item_id: int) -> None:
+        """Drop the entries of a deleted game or tag."""
+        with self._lock:
+            self._remove_entries((kind, item_id))
+            self._labels.pop((kind, item_id), None)
+            self._popularity.pop((kind, item_id), None)
+
+    def set_popularity(self, kind: str, item_id: int, popularity: int) -> None:
+        """Update the popularity used to rank a game or tag."""
+        with self._lock:
+            if (kind, item_id) in self._labels and self._popularity.get((kind, item_id)) != popularity:
+                self._popularity[(kind, item_id)] = popularity
+                self._forget_rankings(self._labels[(kind, item_id)][0])
+
+    def _remove_entries(self, item: Item) -> None:
+        label = self._labels.get(item)
+        if label is None:
+            return
+        self._forget_rankings(label[0])
+        for key in _word_keys(label[0]):
+            index = bisect.bisect_left(self._entries, (key, *item))
+            if index < len(self._entries) and self._entries[index] == (key, *item):
+                del self._entries[index]
+
+
+suggestion_index = SuggestionIndex()
@@ -0,0 +1,52 @@
+"""
+Background tasks of the wiki app.
+
+Enqueued by the signal handlers and executed by the run_workers command, so
+index rebuilds do not slow down the request that triggered them.
+"""
+
+from typing import List
+
+from core.jobs import task
+
+from .dedup import check_game_duplicates
+from .images import generate_renditions
+from .materials import update_game_materials
+from .recommendations import refresh_recommendations
+from .similarity import refresh_similar_games, update_similar_games
+
+
+@task("wiki.update_similar_games")
+def update_similar_games_task(game_id: int) -> None:
+    """Refresh the similar-game index around a changed game."""
+    update_similar_games(game_id)
+
+
+@task("wiki.refresh_similar_games")
+def refresh_similar_games_task(game_ids: List[int]) -> None:
+    """Recompute the neighbour lists of the given games."""
+    refresh_similar_games(game_ids)
+
+
+@task("wiki.refresh_recommendations")
+def refresh_recommendations_task(game_ids: List[int]) -> None:
+    """Recompute the recommendations around games whose votes changed."""
+    refresh_recommendations(game_ids)
+
+
+@task("wiki.generate_image_renditions")
+def generate_image_renditions_task(content_hash: str) -> None:
+    """Render the missing renditions of an uploaded image."""
+    generate_renditions(content_hash)
+
+
+@task("wiki.check_game_duplicates")
+def check_game_duplicates_task(game_id: int) -> None:
+    """Flag a saved game if it is a near-duplicate of an older one."""
+    check_game_duplicates(game_id)
+
+
+@task("wiki.update_game_materials")
+def update_game_materials_task(game_id: int) -> None:
+    """Re-index the materials listed in a saved game's content."""
+    update_game_materials(game_id)
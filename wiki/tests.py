@@ -1 +1,943 @@
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from datetime import timedelta
+from unittest import mock
 
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, connection
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.forms import modelform_factory
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from wiki.analytics import (
+    SearchLogBuffer,
+    flush_search_logs,
+    get_latency_by_shape,
+    get_top_searches,
+    log_search,
+    rollup_search_logs,
+    search_log_buffer,
+    warm_search_cache,
+)
+from PIL import Image
+
+from wiki.cards import CARD_UPDATE_FIELDS, build_cards
+from wiki.fuzzy import TrigramIndex
+from wiki.images import get_all_specs
+from wiki.indexes import DEFAULT_INDEX_TTL
+from wiki.materials import extract_materials
+from wiki.models import (
+    AgeGroup, DuplicateFlag, Game, GameCard, GameImage, GameMaterial, GameRecommendation, GameRevision, SearchLog, SearchQueryStat,
+    SimilarGame, SitemapShard, Tag, Vote, VoteBucket,
+)
+from wiki.recommendations import get_recommendations_for_user, load_affected_vote_matrix, rebuild_recommendations
+from wiki.revisions import compact_revisions, get_revision, get_storage_report
+from wiki.services import GAME_LIST_FIELDS, get_paginated_games, get_search_results, parse_query
+from wiki.similarity import TOP_K, feature_matrix, rebuild_similar_games
+from wiki.suggest import SuggestionIndex
+
+class AdminQueryCountTests(TestCase):
+    """Admin pages run the same number of queries however many rows they show."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser("admin", password="secret")
+        cls.tag = Tag.objects.create(name="outdoor")
+        cls.age_group = AgeGroup.objects.create(string_title="Kids", minimum_age=6, maximum_age=12)
+        cls.rows = 0
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def _add_rows(self, count):
+        """Add games, each with a vote by a new user."""
+        User = get_user_model()
+        for _ in range(count):
+            self.rows += 1
+            user = User.objects.create_user(f"voter{self.rows}")
+            game = Game.objects.create(title=f"Game {self.rows}", creator=user)
+            game.tags.add(self.tag)
+            game.age_groups.add(self.age_group)
+            Vote.objects.create(user=user, game=game, value=1)
+
+    def _count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assertConstantQueries(self, url):
+        self._add_rows(2)
+        # Fills the content type cache
+        self.client.get(url)
+        few = self._count_queries(url)
+        self._add_rows(20)
+        self.assertEqual(self._count_queries(url), few)
+
+    def test_vote_changelist(self):
+        self.assertConstantQueries(reverse("admin:wiki_vote_changelist"))
+
+    def test_game_changelist(self):
+        self.assertConstantQueries(reverse("admin:wiki_game_changelist"))
+
+    def test_game_change_form_does_not_list_users(self):
+        self._add_rows(1)
+        url = reverse("admin:wiki_game_change", args=[Game.objects.get().pk])
+        self.assertConstantQueries(url)
+        self.assertNotContains(self.client.get(url), "voter22")
+
+    def test_changelist_count_is_capped(self):
+        self._add_rows(3)
+        with mock.patch("wiki.admin.ADMIN_COUNT_LIMIT", 2):
+            response = self.client.get(reverse("admin:wiki_vote_changelist"))
+        self.assertEqual(response.context["cl"].result_count, 2)
+
+
+class GameBatchTests(TestCase):
+    """The batch endpoint fetches any number of games in a constant number of queries."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        creator = User.objects.create_user("creator")
+        tags = [Tag.objects.create(name=f"tag{number}") for number in range(3)]
+        age_group = AgeGroup.objects.create(string_title="Kids", minimum_age=6, maximum_age=12)
+        voters = [User.objects.create_user(f"voter{number}") for number in range(3)]
+        cls.games = []
+        for number in range(6):
+            game = Game.objects.create(title=f"Spiel {number}", creator=creator, markdown_content="Regeln")
+            game.tags.set(tags[:number % 3 + 1])
+            game.age_groups.add(age_group)
+            for voter in voters[:number % 3 + 1]:
+                Vote.objects.create(user=voter, game=game, value=1 if number % 2 else -1)
+            cls.games.append(game)
+
+    def setUp(self):
+        cache.clear()
+
+    def _get_batch(self, slugs):
+        response = self.client.get("/wiki/api/v1/games/batch", {"slug": slugs})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        # Games with creators and vote counts, their tags and their age groups
+        for size in (1, 6):
+            with self.subTest(size=size), self.assertNumQueries(3):
+                batch = self._get_batch([game.slug for game in self.games[:size]])
+            self.assertEqual(len(batch["games"]), size)
+
+    def test_missing_slugs_are_listed(self):
+        batch = self._get_batch([self.games[1].slug, "gibt-es-nicht", self.games[0].slug])
+        self.assertEqual([game["slug"] for game in batch["games"]], [self.games[1].slug, self.games[0].slug])
+        self.assertEqual(batch["missing"], ["gibt-es-nicht"])
+        self.assertEqual(batch["games"][0]["upvote_count"], 2)
+
+
+class GameCardTests(TestCase):
+    """Game cards match a fresh build after every write to their inputs."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.creator = User.objects.create_user("creator")
+        cls.tags = [Tag.objects.create(name=f"tag{number}") for number in range(2)]
+        cls.age_group = AgeGroup.objects.create(string_title="Kids", minimum_age=6, maximum_age=12)
+        cls.games = []
+        for number in range(3):
+            game = Game.objects.create(title=f"Spiel {number}", creator=cls.creator)
+            game.tags.set(cls.tags)
+            game.age_groups.add(cls.age_group)
+            cls.games.append(game)
+        cls.vote = Vote.objects.create(user=User.objects.create_user("voter"), game=cls.games[0], value=1)
+
+    def assertCardsAreFresh(self):
+        stored = {card.game_id: card for card in GameCard.objects.all()}
+        for fresh in build_cards(Game.objects.values_list("id", flat=True)):
+            self.assertEqual(
+                {field: getattr(stored[fresh.game_id], field) for field in CARD_UPDATE_FIELDS},
+                {field: getattr(fresh, field) for field in CARD_UPDATE_FIELDS},
+            )
+
+    def test_cards_follow_every_write(self):
+        def rename_game():
+            self.games[0].title = "Neuer Titel"
+            self.games[0].save()
+
+        def rename_tag():
+            self.tags[0].name = "umbenannt"
+            self.tags[0].save()
+
+        def change_age_group():
+            self.age_group.maximum_age = 14
+            self.age_group.save()
+
+        def change_vote():
+            self.vote.value = -1
+            self.vote.save()
+
+        writes = [
+            ("game renamed", rename_game),
+            ("tag renamed", rename_tag),
+            ("age group changed", change_age_group),
+            ("vote changed", change_vote),
+            ("vote deleted", self.vote.delete),
+            ("tag games cleared", self.tags[1].games.clear),
+            ("game tags cleared", self.games[1].tags.clear),
+            ("tag deleted", self.tags[0].delete),
+            ("age group games cleared", self.age_group.games.clear),
+        ]
+        for description, write in writes:
+            with self.subTest(description):
+                write()
+                self.assertCardsAreFresh()
+
+
+class SearchQueryParserTests(SimpleTestCase):
+    """Queries that differ only in case, spacing or order share one canonical form."""
+
+    def test_equivalent_queries_share_canonical_form(self):
+        canonical = {str(parse_query(query)) for query in ("Outdoor  Fangen", "fangen outdoor", "FANGEN outdoor")}
+        self.assertEqual(canonical, {"fangen outdoor"})
+
+    def test_phrases_negation_and_fields(self):
+        parsed = parse_query('-indoor Title:"Capture  the Flag" "ball" unknown:op -')
+        self.assertEqual(str(parsed), 'ball unknown:op title:"capture the flag" -indoor')
+
+
+class SearchResultCacheTests(TestCase):
+    """Pages of one search are read from its cached result ids."""
+
+    @classmethod
+    def setUpTestData(cls):
+        creator = get_user_model().objects.create_user("creator")
+        for number in range(6):
+            Game.objects.create(
+                title=f"Fangen {number}",
+                short_description="outdoor" if number % 2 else "indoor",
+                creator=creator,
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_later_pages_only_load_cards(self):
+        self.assertEqual(get_search_results(query="Fangen outdoor").total_count, 3)
+        with self.assertNumQueries(1):
+            results = get_search_results(query="OUTDOOR  fangen", fields=["title"])
+            titles = [card.title for card in get_paginated_games(results, 1, 2)]
+        self.assertEqual(len(titles), 2)
+
+    def test_negation_and_field_terms(self):
+        self.assertEqual(get_search_results(query="fangen -outdoor").total_count, 3)
+        self.assertEqual(get_search_results(query="description:indoor -content:indoor").total_count, 3)
+        exact_match = Game.objects.get(title="Fangen 1")
+        self.assertEqual(get_search_results(query='title:"fangen 1"').ids[0], exact_match.pk)
+
+    def test_changed_cards_invalidate_results(self):
+        self.assertEqual(get_search_results(query="outdoor").total_count, 3)
+        Game.objects.create(title="Neues Spiel", short_description="outdoor", creator=get_user_model().objects.get())
+        self.assertEqual(get_search_results(query="outdoor").total_count, 4)
+
+    def test_list_page_embeds_the_first_api_page(self):
+        page = self.client.get(reverse("game_list")).context["initial_games"]
+        response = self.client.get("/wiki/api/v1/games", {"amount": 20})
+        self.assertEqual(page, response.json())
+
+
+class GameListFieldsTests(TestCase):
+    """The game list returns only the requested fields and rejects unknown ones."""
+
+    @classmethod
+    def setUpTestData(cls):
+        creator = get_user_model().objects.create_user("creator")
+        Game.objects.create(title="Fangen", short_description="Alle gegen einen", creator=creator)
+        Game.objects.create(title="Verstecken", creator=creator)
+
+    def setUp(self):
+        cache.clear()
+
+    def _list_games(self, **params):
+        return self.client.get("/wiki/api/v1/games", {"sort_by": "title", **params})
+
+    def test_only_requested_fields_are_returned(self):
+        for fields in (["title,slug"], ["title", "slug"], [" title , slug ,"]):
+            with self.subTest(fields=fields):
+                response = self._list_games(fields=fields)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    response.json()["games"],
+                    [{"title": "Fangen", "slug": "fangen"}, {"title": "Verstecken", "slug": "verstecken"}],
+                )
+
+    def test_all_fields_without_a_selection(self):
+        games = self._list_games().json()["games"]
+        self.assertEqual([list(game) for game in games], [GAME_LIST_FIELDS] * 2)
+        # Fields that were set are kept even when they are empty
+        self.assertIsNone(games[1]["short_description"])
+
+    def test_unknown_fields_are_rejected(self):
+        response = self._list_games(fields=["title,creator,markdown_content"])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"error": "Unknown fields: creator, markdown_content"})
+
+
+class SearchAnalyticsTests(TestCase):
+    """Searches are logged, rolled up and replayed to warm the cache."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Game.objects.create(title="Fangen", creator=get_user_model().objects.create_user("creator"))
+
+    def setUp(self):
+        cache.clear()
+        # Drop searches buffered by other tests
+        search_log_buffer.flush()
+        SearchLog.objects.all().delete()
+
+    def _search(self, query):
+        response = self.client.get("/wiki/api/v1/games", {"q": query})
+        self.assertEqual(response.status_code, 200)
+
+    def test_logs_are_written_in_batches_and_rolled_up(self):
+        self._search("Fangen")
+        self._search("fangen ")
+        self.assertEqual(SearchLog.objects.count(), 0)
+        self.assertEqual(flush_search_logs(), 2)
+        self._search("xyzzy")
+        self._search("xyzzy")
+        flush_search_logs()
+
+        self.assertEqual(rollup_search_logs(), 4)
+        self.assertEqual(SearchLog.objects.count(), 0)
+        top = get_top_searches()
+        self.assertEqual(sorted((search["query"], search["searches"]) for search in top), [("fangen", 2), ("xyzzy", 2)])
+        self.assertEqual([search["query"] for search in get_top_searches(zero_results=True)], ["xyzzy"])
+        self.assertEqual([shape["shape"] for shape in get_latency_by_shape()], ["terms=1 sort=relevance"])
+
+        self._search("FANGEN")
+        self._search("FANGEN")
+        flush_search_logs()
+        rollup_search_logs()
+        self.assertEqual(SearchQueryStat.objects.get(query="fangen").search_count, 4)
+
+    def test_failed_writes_are_kept_for_the_next_flush(self):
+        self._search("fangen")
+        with (
+            mock.patch.object(SearchLog.objects, "bulk_create", side_effect=DatabaseError("database is locked")),
+            self.assertLogs("wiki.analytics", "ERROR"),
+        ):
+            self.assertEqual(flush_search_logs(), 0)
+        self.assertEqual(flush_search_logs(), 1)
+        self.assertEqual(SearchLog.objects.count(), 1)
+
+    def test_warm_up_fills_the_result_cache(self):
+        self._search("fangen")
+        self._search("fangen")
+        flush_search_logs()
+        rollup_search_logs()
+        cache.clear()
+
+        self.assertEqual(warm_search_cache(top=5), 1)
+        self.assertTrue(get_search_results(query="Fangen").cache_hit)
+
+
+@override_settings(SEARCH_LOG_BACKGROUND_FLUSH=True, SEARCH_LOG_BATCH_SIZE=2, SEARCH_LOG_FLUSH_INTERVAL=60)
+class SearchLogFlushTests(TransactionTestCase):
+    """Buffered search logs are written by a background thread, never by the request."""
+
+    def setUp(self):
+        self.buffer = SearchLogBuffer()
+        for patcher in (
+            mock.patch("wiki.analytics.search_log_buffer", self.buffer),
+            mock.patch("wiki.analytics.atexit.register"),
+        ):
+            self.register_at_exit = patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _wait_for_logs(self, count):
+        deadline = time.monotonic() + 5
+        while SearchLog.objects.count() < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(SearchLog.objects.count(), count)
+
+    def test_full_batch_is_written_in_the_background(self):
+        with self.assertNumQueries(0):
+            log_search({"query": "fangen"}, 1, 0.01)
+        log_search({"query": "xyzzy"}, 0, 0.01)
+        self._wait_for_logs(2)
+        # Whatever is left is written when the process exits
+        self.register_at_exit.assert_called_once_with(self.buffer._flush_at_exit)
+
+    @override_settings(SEARCH_LOG_FLUSH_INTERVAL=0.01)
+    def test_idle_buffer_is_written_after_the_interval(self):
+        log_search({"query": "fangen"}, 1, 0.01)
+        self._wait_for_logs(1)
+
+
+class SitemapTests(TestCase):
+    """Sitemap shards are streamed by id range or served from generated files."""
+
+    def setUp(self):
+        cache.clear()
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        self.enterContext(override_settings(SITEMAP_ROOT=self.root.name))
+        self.enterContext(mock.patch("wiki.views.SITEMAP_SHARD_SIZE", 2))
+        self.enterContext(mock.patch("wiki.sitemaps.SITEMAP_SHARD_SIZE", 2))
+        creator = get_user_model().objects.create_user("creator")
+        self.games = [Game.objects.create(title=f"Spiel {number}", creator=creator) for number in range(3)]
+
+    def test_shards_stream_their_id_range(self):
+        first_shard = (self.games[0].pk - 1) // 2
+        index = self.client.get("/wiki/sitemap.xml").content.decode()
+        self.assertIn(f"/wiki/sitemap-{first_shard}.xml", index)
+
+        shards = {}
+        for game in self.games:
+            shard = (game.pk - 1) // 2
+            if shard not in shards:
+                response = self.client.get(f"/wiki/sitemap-{shard}.xml")
+                shards[shard] = b"".join(response.streaming_content).decode()
+            self.assertIn(f"/wiki/game/{game.slug}/</loc>", shards[shard])
+        self.assertEqual(sum(shard.count("<url>") for shard in shards.values()), 3)
+        self.assertEqual(self.client.get(f"/wiki/sitemap-{max(shards) + 1}.xml").status_code, 404)
+
+    def test_index_reads_only_the_stored_shards(self):
+        with self.assertNumQueries(1), CaptureQueriesContext(connection) as queries:
+            self.client.get("/wiki/sitemap.xml")
+        self.assertNotIn("wiki_game", queries[0]["sql"])
+
+        # A deleted shard stays listed until the next generate_sitemaps run recomputes the shards
+        shards = {(game.pk - 1) // 2 for game in self.games}
+        self.assertEqual(set(SitemapShard.objects.values_list("shard", flat=True)), shards)
+        Game.objects.filter(pk=self.games[-1].pk).delete()
+        call_command("generate_sitemaps", "https://example.org", stdout=mock.Mock())
+        shards = {(game.pk - 1) // 2 for game in self.games[:-1]}
+        self.assertEqual(set(SitemapShard.objects.values_list("shard", flat=True)), shards)
+
+    def test_generated_files_are_served(self):
+        call_command("generate_sitemaps", "https://example.org", stdout=mock.Mock())
+        response = self.client.get("/wiki/sitemap.xml")
+        self.assertIn(b"https://example.org/wiki/sitemap-", b"".join(response.streaming_content))
+        feed = b"".join(self.client.get("/wiki/feed.atom").streaming_content).decode()
+        self.assertEqual(feed.count("<entry>"), 3)
+
+
+class GameImageTests(TestCase):
+    """Uploads are stored by content and renditions are rendered on first request."""
+
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=self.media_root.name))
+        self.game = Game.objects.create(title="Fangen", creator=get_user_model().objects.create_user("creator"))
+
+    def _upload(self, name):
+        image = io.BytesIO()
+        Image.new("RGBA", (800, 400), (200, 30, 30, 128)).save(image, "PNG")
+        return GameImage.objects.create(game=self.game, image=SimpleUploadedFile(name, image.getvalue()))
+
+    def test_identical_uploads_share_one_file(self):
+        first, second = self._upload("aufbau.png"), self._upload("kopie.png")
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual((first.width, first.height), (800, 400))
+        originals = os.listdir(os.path.join(self.media_root.name, "game-images", "originals", first.content_hash[:2]))
+        self.assertEqual(originals, [f"{first.content_hash}.png"])
+
+    def test_renditions_are_rendered_on_first_request(self):
+        game_image = self._upload("aufbau.png")
+        response = self.client.get(f"/wiki/images/{game_image.content_hash}-320.jpg")
+        self.assertEqual(response.status_code, 301)
+        with Image.open(os.path.join(self.media_root.name, response["Location"].removeprefix("/media/"))) as rendition:
+            self.assertEqual((rendition.size, rendition.format), ((320, 160), "JPEG"))
+
+        srcsets = self.client.get(f"/wiki/api/v1/games/{self.game.slug}/images").json()[0]
+        self.assertIn(f"/wiki/images/{game_image.content_hash}-640.webp 640w", srcsets["webp_srcset"])
+        self.assertEqual(self.client.get(f"/wiki/images/{game_image.content_hash}-321.jpg").status_code, 404)
+
+    def test_unsupported_formats_are_field_errors(self):
+        bitmap = io.BytesIO()
+        Image.new("RGB", (10, 10)).save(bitmap, "BMP")
+        form = modelform_factory(GameImage, fields=["game", "image"])(
+            {"game": self.game.pk}, {"image": SimpleUploadedFile("aufbau.bmp", bitmap.getvalue())},
+        )
+        self.assertFalse(form.is_valid())
+        self.assertIn("Unsupported image format", form.errors["image"][0])
+
+    @override_settings(IMAGE_RENDER_TIMEOUT=0.01)
+    def test_slow_renditions_fall_back_to_the_original(self):
+        game_image = self._upload("aufbau.png")
+        pending = Future()
+        with mock.patch("wiki.images.get_process_pool") as get_pool:
+            get_pool.return_value.submit.return_value = pending
+            response = self.client.get(f"/wiki/images/{game_image.content_hash}-320.jpg")
+        self.assertEqual((response.status_code, response["Location"]), (302, game_image.image.url))
+
+        # The late renditions are stored and served from then on
+        pending.set_result({(width, image_format): b"rendition" for width, image_format in get_all_specs()})
+        self.assertEqual(self.client.get(f"/wiki/images/{game_image.content_hash}-320.jpg").status_code, 301)
+
+
+@override_settings(JOB_QUEUE_EAGER=True)
+class MaterialIndexTests(TestCase):
+    """Materials are extracted after save and matched as a subset of what the user has."""
+
+    @classmethod
+    def setUpTestData(cls):
+        creator = get_user_model().objects.create_user("creator")
+        contents = {
+            "Völkerball": "## Material\n\n- 2 Bälle\n- Kreide (optional)\n\n## Ablauf\n\n- Werfen",
+            "Blinde Kuh": "**Was ihr braucht:**\n\n* eine Augenbinde\n* Seil - ca. 5 m",
+            "Seilspringen": "## Material\n\n- Seil\n- Stoppuhr",
+            "Fangen": "Keine Materialien nötig.",
+        }
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.games = {
+                title: Game.objects.create(title=title, markdown_content=content, creator=creator)
+                for title, content in contents.items()
+            }
+
+    def test_materials_are_normalized(self):
+        self.assertEqual(extract_materials("## Materials\n\n- Balls\n- 3x Rope per team\n- [Blindfolds](/x) and a chair"),
+                         {"ball", "rope", "blindfold", "chair"})
+        self.assertEqual(GameMaterial.objects.filter(game=self.games["Fangen"]).count(), 0)
+
+    def test_games_with_all_materials_at_hand(self):
+        response = self.client.get("/wiki/api/v1/games/by-materials", {"materials": "Augenbinde, Seil, bälle"})
+        games = response.json()["games"]
+        self.assertEqual([game["slug"] for game in games], [self.games["Blinde Kuh"].slug, self.games["Völkerball"].slug])
+        self.assertEqual(games[0]["materials"], ["augenbinde", "seil"])
+
+    def test_rejects_invalid_pagination(self):
+        for params in ({"start_index": -5}, {"amount": 0}, {"amount": -1}):
+            with self.subTest(**params):
+                response = self.client.get("/wiki/api/v1/games/by-materials", {"materials": "seil", **params})
+                self.assertEqual(response.status_code, 422)
+                self.assertEqual(self.client.get("/wiki/api/v1/games", params).status_code, 422)
+
+    def test_edits_and_backfill_update_the_index(self):
+        game = self.games["Seilspringen"]
+        game.markdown_content = "## Material\n\n- Seil"
+        with self.captureOnCommitCallbacks(execute=True):
+            game.save()
+        response = self.client.get("/wiki/api/v1/games/by-materials", {"materials": "seil"})
+        self.assertEqual([game["slug"] for game in response.json()["games"]], [game.slug])
+
+        GameMaterial.objects.all().delete()
+        call_command("build_material_index", "--batch-size", "2", stdout=mock.Mock())
+        self.assertEqual(GameMaterial.objects.count(), 4)
+
+
+class SessionPlannerTests(TestCase):
+    """Programs fill the time budget and alternate physical intensity."""
+
+    @classmethod
+    def setUpTestData(cls):
+        creator = get_user_model().objects.create_user("creator")
+        kids = AgeGroup.objects.create(string_title="Kinder", minimum_age=6, maximum_age=12)
+        for number, (duration_index, physical_index) in enumerate([(6, 9), (6, 8), (6, 2), (7, 1), (8, 5)]):
+            game = Game.objects.create(
+                title=f"Spiel {number}", creator=creator, duration_index=duration_index, physical_index=physical_index
+            )
+            game.age_groups.add(kids)
+        Game.objects.create(title="Ohne Altersgruppe", creator=creator, duration_index=6)
+
+    def test_program_fits_and_alternates(self):
+        response = self.client.get("/wiki/api/v1/planner", {"total_minutes": 100, "age_group_filter": "Kinder"})
+        plan = response.json()
+        self.assertEqual(plan["candidate_count"], 5)
+        self.assertEqual(plan["total_minutes"], 100)
+        intensities = [game["physical_index"] for game in plan["games"]]
+        self.assertTrue(all(abs(first - second) >= 6 for first, second in zip(intensities, intensities[1:])))
+        self.assertEqual(plan["games"][-1]["start_minute"] + plan["games"][-1]["minutes"], 100)
+
+    def test_rejects_invalid_time(self):
+        self.assertEqual(self.client.get("/wiki/api/v1/planner", {"total_minutes": 0}).status_code, 400)
+
+
+@override_settings(JOB_QUEUE_EAGER=True)
+class DuplicateDetectionTests(TestCase):
+    """Re-submissions are flagged on save and clustered by the archive scan."""
+
+    CONTENT = (
+        "Alle stehen im Kreis. Ein Kind geht außen herum und legt ein Taschentuch hinter ein anderes Kind. "
+        "Dieses muss aufspringen, den Leger fangen, bevor er den freien Platz erreicht, sonst ist es selbst dran."
+    )
+
+    def setUp(self):
+        self.creator = get_user_model().objects.create_user("creator")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.original = Game.objects.create(title="Plumpsack", markdown_content=self.CONTENT, creator=self.creator)
+            Game.objects.create(title="Fangen", markdown_content="Einer fängt, alle anderen laufen weg.", creator=self.creator)
+
+    def test_resubmission_is_flagged(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            copy = Game.objects.create(
+                title="Der Plumpsack geht um",
+                markdown_content=self.CONTENT.replace("Taschentuch", "Tuch") + " Viel Spaß!",
+                creator=self.creator,
+            )
+        flag = DuplicateFlag.objects.get()
+        self.assertEqual((flag.game, flag.duplicate_of), (copy, self.original))
+        self.assertGreaterEqual(flag.similarity, 0.7)
+
+        # Saving the original again does not flag it as a duplicate of its copy
+        DuplicateFlag.objects.all().delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.original.save()
+        self.assertEqual(list(DuplicateFlag.objects.values_list("game", "duplicate_of")), [(copy.pk, self.original.pk)])
+
+    @mock.patch("wiki.dedup.MAX_BUCKET_SIZE", 1)
+    def test_oversized_buckets_are_skipped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Game.objects.create(title="Plumpsack 2", markdown_content=self.CONTENT, creator=self.creator)
+        self.assertFalse(DuplicateFlag.objects.exists())
+
+    def test_archive_scan_lists_clusters(self):
+        # Imported without signals, so only the scan signs it
+        Game.objects.bulk_create([
+            Game(title="Plumpsack (Kopie)", slug="plumpsack-kopie", markdown_content=self.CONTENT, creator=self.creator)
+        ])
+        stdout = io.StringIO()
+        call_command("find_duplicates", "--workers", "1", "--json", stdout=stdout, stderr=io.StringIO())
+        clusters = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        self.assertEqual([sorted(member["slug"] for member in cluster) for cluster in clusters], [["plumpsack", "plumpsack-kopie"]])
+
+
+class TrendingTests(TestCase):
+    """Trending ranks games by recent, time-decayed vote changes from the hourly buckets."""
+
+    def setUp(self):
+        cache.clear()
+        users = [get_user_model().objects.create_user(f"user{number}") for number in range(3)]
+        self.old_favourite, self.new_hit, self.quiet = [
+            Game.objects.create(title=title, creator=users[0]) for title in ("Klassiker", "Neuer Hit", "Ruhig")
+        ]
+        for user in users:
+            Vote.objects.create(user=user, game=self.new_hit, value=1)
+        self.vote = Vote.objects.create(user=users[0], game=self.quiet, value=1)
+
+    def test_vote_changes_are_bucketed(self):
+        self.vote.value = -1
+        with CaptureQueriesContext(connection) as queries:
+            self.vote.save()
+        # The stored value is read once for the buckets and the user stats
+        self.assertEqual(sum(query["sql"].startswith('SELECT "wiki_vote"."value"') for query in queries), 1)
+        bucket = VoteBucket.objects.get(game=self.quiet)
+        self.assertEqual((bucket.upvotes, bucket.downvotes), (0, 1))
+        self.vote.delete()
+        bucket.refresh_from_db()
+        self.assertEqual((bucket.upvotes, bucket.downvotes), (0, 0))
+
+    def test_deleting_a_voted_game_writes_no_buckets(self):
+        game_id = self.new_hit.pk
+        self.new_hit.delete()
+        self.assertFalse(VoteBucket.objects.filter(game_id=game_id).exists())
+        self.assertEqual(VoteBucket.objects.filter(game=self.quiet).count(), 1)
+
+    def test_trending_sort_uses_recent_buckets(self):
+        # Many votes two weeks ago fall out of the window
+        VoteBucket.objects.create(
+            game=self.old_favourite, hour=timezone.now() - timedelta(days=14), upvotes=50, downvotes=0
+        )
+        # A request computes the missing top list without writing
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/wiki/api/v1/games", {"sort_by": "trending", "fields": "slug"})
+        self.assertFalse([query for query in queries if not query["sql"].startswith("SELECT")])
+        slugs = [game["slug"] for game in response.json()["games"]]
+        self.assertEqual(slugs[:2], [self.new_hit.slug, self.quiet.slug])
+
+        call_command("refresh_trending", stdout=io.StringIO())
+        self.assertFalse(VoteBucket.objects.filter(game=self.old_favourite).exists())
+
+
+@override_settings(CHANGE_FEED_SETTLE_SECONDS=0)
+class ChangeFeedTests(TestCase):
+    """Mirrors page through the changes since their cursor, including deletions."""
+
+    def setUp(self):
+        self.creator = get_user_model().objects.create_user("creator")
+        self.games = [Game.objects.create(title=f"Spiel {number}", creator=self.creator) for number in range(3)]
+
+    def _sync(self, cursor="", limit=100):
+        response = self.client.get("/wiki/api/v1/games/changes", {"since": cursor, "limit": limit})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_sync_returns_only_changes_since_cursor(self):
+        first = self._sync(limit=2)
+        rest = self._sync(first["cursor"], limit=2)
+        self.assertTrue(first["has_more"])
+        self.assertFalse(rest["has_more"])
+        self.assertEqual([change["id"] for change in first["changes"] + rest["changes"]], [game.pk for game in self.games])
+        cursor = rest["cursor"]
+        self.assertEqual(self._sync(cursor)["changes"], [])
+
+        tagged, deleted, voted = self.games
+        deleted_id = deleted.pk
+        tag = Tag.objects.create(name="Draußen")
+        tagged.tags.add(tag)
+        deleted.delete()
+        Vote.objects.create(user=self.creator, game=voted, value=1)
+        changes = self._sync(cursor)["changes"]
+        self.assertEqual([(change["id"], change["deleted"]) for change in changes], [
+            (tagged.pk, False), (deleted_id, True),
+        ])
+        self.assertEqual(changes[0]["game"]["tags"], ["Draußen"])
+
+        cursor = self._sync(cursor)["cursor"]
+        tag.games.clear()
+        self.assertEqual([change["id"] for change in self._sync(cursor)["changes"]], [tagged.pk])
+
+    def test_invalid_and_expired_cursors(self):
+        for cursor in ("gestern", "1-", "-1-1", "99999999999999999999-1", "-99999999999999999999-1"):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.client.get("/wiki/api/v1/games/changes", {"since": cursor}).status_code, 400)
+        self.assertEqual(self.client.get("/wiki/api/v1/games/changes", {"since": "0-1"}).status_code, 410)
+
+
+class SimilarGameTests(TestCase):
+    """Similar games are precomputed per game, served nearest first and updated row by row."""
+
+    def setUp(self):
+        self.creator = get_user_model().objects.create_user("creator")
+        self.games = [
+            Game.objects.create(title=f"Spiel {number}", creator=self.creator, difficulty_index=difficulty)
+            for number, difficulty in enumerate((1, 2, 4, 8))
+        ]
+        rebuild_similar_games()
+
+    def _neighbours(self):
+        return set(SimilarGame.objects.values_list("game_id", "similar_game_id", "rank"))
+
+    @override_settings(JOB_QUEUE_EAGER=True)
+    def test_edits_update_the_index_without_reloading_the_archive(self):
+        tag = Tag.objects.create(name="draußen")
+        with mock.patch.object(feature_matrix, "_load", wraps=feature_matrix._load) as load:
+            with self.captureOnCommitCallbacks(execute=True):
+                newcomer = Game.objects.create(title="Neu", creator=self.creator, difficulty_index=1)
+                newcomer.tags.add(tag)
+                self.games[3].delete()
+        load.assert_not_called()
+
+        incremental = self._neighbours()
+        rebuild_similar_games()
+        self.assertEqual(incremental, self._neighbours())
+        self.assertIn((self.games[0].pk, newcomer.pk, 2), incremental)
+
+    @override_settings(JOB_QUEUE_EAGER=True)
+    def test_clearing_a_tag_updates_its_games(self):
+        tag = Tag.objects.create(name="draußen")
+        tag.games.add(self.games[0], self.games[3])
+        rebuild_similar_games()
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.games.clear()
+
+        incremental = self._neighbours()
+        rebuild_similar_games()
+        self.assertEqual(incremental, self._neighbours())
+
+    def test_similar_games_are_nearest_first(self):
+        response = self.client.get(f"/wiki/api/v1/games/{self.games[0].slug}/similar", {"limit": 2})
+        self.assertEqual([game["slug"] for game in response.json()], [self.games[1].slug, self.games[2].slug])
+
+    def test_rejects_invalid_limit(self):
+        for limit in (0, -1, TOP_K + 1):
+            with self.subTest(limit=limit):
+                response = self.client.get(f"/wiki/api/v1/games/{self.games[0].slug}/similar", {"limit": limit})
+                self.assertEqual(response.status_code, 422)
+
+
+@override_settings(JOB_QUEUE_EAGER=True)
+class RecommendationTests(TestCase):
+    """Vote changes refresh the recommendations of the affected games only."""
+
+    def setUp(self):
+        User = get_user_model()
+        creator = User.objects.create_user("creator")
+        self.games = [Game.objects.create(title=f"Spiel {number}", creator=creator) for number in range(4)]
+        self.users = [User.objects.create_user(f"voter{number}") for number in range(3)]
+        with self.captureOnCommitCallbacks(execute=True):
+            for user, game_numbers in zip(self.users, ((0, 1, 2), (0, 1), (2, 3))):
+                for number in game_numbers:
+                    Vote.objects.create(user=user, game=self.games[number], value=1)
+
+    def _recommendations(self):
+        return {
+            (game_id, recommended_id, rank): round(score, 6)
+            for game_id, recommended_id, rank, score in GameRecommendation.objects.values_list(
+                "game_id", "recommended_game_id", "rank", "score"
+            )
+        }
+
+    def test_vote_changes_match_a_full_rebuild(self):
+        with mock.patch("wiki.recommendations.load_vote_matrix") as load_vote_matrix:
+            with self.captureOnCommitCallbacks(execute=True):
+                Vote.objects.filter(user=self.users[2], game=self.games[2]).get().delete()
+                Vote.objects.create(user=self.users[1], game=self.games[3], value=-1)
+        load_vote_matrix.assert_not_called()
+
+        incremental = self._recommendations()
+        rebuild_recommendations()
+        self.assertEqual(incremental, self._recommendations())
+
+    def test_deleted_votes_are_reflected(self):
+        self.assertIn(self.games[3].pk, [game.pk for game, _ in get_recommendations_for_user(self.users[0])])
+        with self.captureOnCommitCallbacks(execute=True):
+            Vote.objects.filter(user=self.users[2], game=self.games[3]).delete()
+        self.assertNotIn(self.games[3].pk, [game.pk for game, _ in get_recommendations_for_user(self.users[0])])
+
+    @mock.patch("wiki.recommendations.MAX_CANDIDATE_GAMES", 1)
+    @mock.patch("wiki.recommendations.MAX_COVOTERS", 1)
+    def test_refresh_reads_a_bounded_sample(self):
+        matrix, game_ids, norms = load_affected_vote_matrix({self.games[0].pk})
+        # The latest voter of game 0 and the one other game they voted on most
+        self.assertEqual(matrix.shape, (1, 2))
+        self.assertEqual(game_ids.tolist(), [self.games[0].pk, self.games[1].pk])
+        self.assertEqual(norms.tolist(), [2 ** 0.5, 2 ** 0.5])
+
+    def test_rejects_invalid_limit(self):
+        self.client.force_login(self.users[0])
+        for limit in (0, -1, 51):
+            with self.subTest(limit=limit):
+                response = self.client.get("/wiki/api/v1/users/me/recommendations", {"limit": limit})
+                self.assertEqual(response.status_code, 422)
+
+
+class SuggestionTests(TestCase):
+    """Suggestions rank every title and tag under a prefix by popularity."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        creator = User.objects.create_user("creator")
+        cls.voters = [User.objects.create_user(f"voter{number}") for number in range(2)]
+        cls.games = [Game.objects.create(title=f"Fangen {number}", creator=creator) for number in range(30)]
+        for voter in cls.voters:
+            Vote.objects.create(user=voter, game=cls.games[-1], value=1)
+
+    def setUp(self):
+        self.index = SuggestionIndex()
+        patcher = mock.patch("wiki.signals.suggestion_index", self.index)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _labels(self, prefix, limit=3):
+        return [item["label"] for item in self.index.suggest(prefix, limit=limit)]
+
+    @mock.patch("wiki.suggest.CACHED_PREFIX_LENGTH", 1)
+    def test_popular_titles_win_at_any_position(self):
+        for prefix in ("f", "fangen"):
+            with self.subTest(prefix=prefix):
+                self.assertEqual(self._labels(prefix, limit=1), ["Fangen 29"])
+
+        # Cached rankings follow vote changes
+        Vote.objects.create(user=self.voters[0], game=self.games[3], value=1)
+        Vote.objects.create(user=self.voters[1], game=self.games[3], value=1)
+        Vote.objects.create(user=get_user_model().objects.create_user("voter2"), game=self.games[3], value=1)
+        self.assertEqual(self._labels("f", limit=2), ["Fangen 3", "Fangen 29"])
+
+    def test_rejects_invalid_limit(self):
+        for limit in (0, -3, 21):
+            with self.subTest(limit=limit):
+                response = self.client.get("/wiki/api/v1/games/suggest", {"prefix": "fa", "limit": limit})
+                self.assertEqual(response.status_code, 422)
+
+
+class InMemoryIndexTests(SimpleTestCase):
+    """Stale in-memory indexes keep serving while one background rebuild runs."""
+
+    def _assert_rebuilt_once_in_background(self, index, search, expected):
+        index._built_at -= 10 * DEFAULT_INDEX_TTL
+        started, release = threading.Event(), threading.Event()
+        with mock.patch.object(index, "build", side_effect=lambda: (started.set(), release.wait(5))) as build:
+            self.assertEqual(search(), expected)
+            self.assertTrue(started.wait(5))
+            self.assertEqual(search(), expected)
+            release.set()
+            self.assertTrue(index._build_lock.acquire(timeout=5))
+        build.assert_called_once()
+
+    def test_suggestion_index(self):
+        index = SuggestionIndex()
+        index._built_at = time.monotonic()
+        index.update("game", 1, "Fangen", "fangen")
+        self._assert_rebuilt_once_in_background(index, lambda: [item["slug"] for item in index.suggest("fan")], ["fangen"])
+
+    def test_trigram_index(self):
+        index = TrigramIndex()
+        index._built_at = time.monotonic()
+        index.update(1, "Völkerball")
+        self._assert_rebuilt_once_in_background(index, lambda: index.search("Voelkerbal"), [1])
+
+
+@override_settings(REVISION_SNAPSHOT_INTERVAL=3)
+class RevisionTests(TestCase):
+    """Every revision rebuilds from its snapshot and deltas, before and after compaction."""
+
+    def setUp(self):
+        creator = get_user_model().objects.create_user("creator")
+        self.game = Game.objects.create(title="Fangen", markdown_content="", creator=creator)
+        self.contents = []
+        for number in range(8):
+            lines = [f"Regel {index}: {'neu' if index == number else 'alt'}\n" for index in range(number + 1)]
+            self.game.markdown_content = "## Ablauf\n\n" + "".join(lines) + ("Ende" if number % 2 else "")
+            self.game.save()
+            self.contents.append(self.game.markdown_content)
+
+    def _assert_revisions_rebuild(self):
+        for number, content in enumerate(self.contents, start=2):
+            with self.subTest(number=number):
+                self.assertEqual(get_revision(self.game.pk, number)[1], content)
+
+    def test_revisions_round_trip(self):
+        self.assertEqual(
+            list(GameRevision.objects.filter(game=self.game, is_snapshot=True).values_list("number", flat=True)),
+            [1, 4, 7],
+        )
+        self._assert_revisions_rebuild()
+        self.assertLess(get_storage_report([self.game.pk])["ratio"], 1.0)
+
+    def test_compaction_keeps_every_revision(self):
+        self.assertGreater(compact_revisions(self.game.pk, interval=5), 0)
+        self.assertEqual(
+            list(GameRevision.objects.filter(game=self.game, is_snapshot=True).values_list("number", flat=True)),
+            [1, 6],
+        )
+        self._assert_revisions_rebuild()
+        self.assertEqual(compact_revisions(self.game.pk, interval=5), 0)
+
+    def test_unchanged_saves_skip_the_history(self):
+        for description, save in [
+            ("same content", self.game.save),
+            ("other fields", lambda: self.game.save(update_fields=["title"])),
+        ]:
+            with self.subTest(description), CaptureQueriesContext(connection) as queries:
+                save()
+            self.assertFalse(any("wiki_gamerevision" in query["sql"] for query in queries))
+        self.assertEqual(GameRevision.objects.filter(game=self.game).count(), len(self.contents) + 1)
+
+    def test_unknown_and_broken_revisions(self):
+        self.assertIsNone(get_revision(self.game.pk, 99))
+        GameRevision.objects.filter(game=self.game, number__in=[1, 5]).delete()
+        for number in (2, 6):
+            with self.subTest(number=number):
+                self.assertIsNone(get_revision(self.game.pk, number))
+                response = self.client.get(f"/wiki/api/v1/games/{self.game.slug}/revisions/{number}")
+                self.assertEqual(response.status_code, 404)
+
+        self.game.markdown_content = "Neu angefangen"
+        self.game.save()
+        self.assertEqual(get_revision(self.game.pk, 10)[1], "Neu angefangen")
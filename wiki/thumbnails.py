@@ -0,0 +1,55 @@
+"""
+Image resizing for game image renditions.
+
+This module only depends on Pillow so its functions can run in worker
+processes that never set up Django.
+"""
+
+import io
+from typing import Dict, Iterable, Tuple
+
+from PIL import Image, ImageOps
+
+# Encoder options per rendition format
+FORMAT_OPTIONS = {
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+    "jpeg": {"format": "JPEG", "quality": 82, "optimize": True, "progressive": True},
+}
+JPEG_BACKGROUND = (255, 255, 255)
+
+
+def render_renditions(source: bytes, specs: Iterable[Tuple[int, str]]) -> Dict[Tuple[int, str], bytes]:
+    """Decode an image once and encode it at several widths and formats.
+
+    Args:
+        source: The original image file
+        specs: (width, format) pairs; images are never scaled up
+
+    Returns:
+        Dictionary mapping each spec to the encoded rendition
+    """
+    with Image.open(io.BytesIO(source)) as original:
+        image = ImageOps.exif_transpose(original)
+        image.load()
+
+    renditions = {}
+    for width, image_format in specs:
+        resized = image.copy()
+        resized.thumbnail((width, resized.height), Image.Resampling.LANCZOS)
+        renditions[(width, image_format)] = _encode(resized, image_format)
+    return renditions
+
+
+def _encode(image: Image.Image, image_format: str) -> bytes:
+    """Encode an image, flattening transparency for formats without it."""
+    if image_format == "jpeg" and image.mode != "RGB":
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, JPEG_BACKGROUND)
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    elif image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "PA") else "RGB")
+
+    output = io.BytesIO()
+    image.save(output, **FORMAT_OPTIONS[image_format])
+    return output.getvalue()
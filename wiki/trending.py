@@ -0,0 +1,128 @@
+"""
+Trending games of the wiki app.
+
+Vote writes add their change in upvotes and downvotes to an hourly
+VoteBucket per game, so trending scores never scan the vote table. A game's
+score is the sum of its net votes over the buckets of the last
+TRENDING_WINDOW_HOURS, each halved per TRENDING_HALF_LIFE_HOURS of age. The
+ranked top list is cached and recomputed by the refresh_trending command,
+which also drops buckets that left the window; requests only read them.
+"""
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import Vote, VoteBucket
+
+DEFAULT_WINDOW_HOURS = 7 * 24
+DEFAULT_HALF_LIFE_HOURS = 24
+TOP_LIST_SIZE = 1000
+TOP_LIST_CACHE_KEY = "trending:top"
+# The top list outlives the hourly refresh, so requests never have to compute it
+TOP_LIST_CACHE_TIMEOUT = 2 * 60 * 60
+
+
+def get_bucket_hour(moment: datetime) -> datetime:
+    """Return the start of the hour bucket a moment falls into."""
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def record_vote_change(game_id: int, upvotes: int, downvotes: int, moment: Optional[datetime] = None) -> None:
+    """Add a change in a game's votes to its current hour bucket."""
+    if not upvotes and not downvotes:
+        return
+    hour = get_bucket_hour(moment or timezone.now())
+    updated = VoteBucket.objects.filter(game_id=game_id, hour=hour).update(
+        upvotes=F("upvotes") + upvotes, downvotes=F("downvotes") + downvotes
+    )
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            VoteBucket.objects.create(game_id=game_id, hour=hour, upvotes=upvotes, downvotes=downvotes)
+    except IntegrityError:
+        # Another vote created the bucket in the meantime
+        VoteBucket.objects.filter(game_id=game_id, hour=hour).update(
+            upvotes=F("upvotes") + upvotes, downvotes=F("downvotes") + downvotes
+        )
+
+
+def get_window_start(now: Optional[datetime] = None) -> datetime:
+    """Return the start of the oldest bucket that counts towards the scores."""
+    hours = getattr(settings, "TRENDING_WINDOW_HOURS", DEFAULT_WINDOW_HOURS)
+    return get_bucket_hour(now or timezone.now()) - timedelta(hours=hours - 1)
+
+
+def compute_trending_scores(now: Optional[datetime] = None) -> Dict[int, float]:
+    """Return the time-decayed net votes of every game voted on within the window."""
+    now = now or timezone.now()
+    half_life = getattr(settings, "TRENDING_HALF_LIFE_HOURS", DEFAULT_HALF_LIFE_HOURS)
+    scores: Dict[int, float] = {}
+    for game_id, hour, upvotes, downvotes in (
+        VoteBucket.objects.filter(hour__gte=get_window_start(now)).values_list("game_id", "hour", "upvotes", "downvotes")
+    ):
+        age_hours = max((now - hour).total_seconds() / 3600, 0.0)
+        scores[game_id] = scores.get(game_id, 0.0) + (upvotes - downvotes) * 0.5 ** (age_hours / half_life)
+    return scores
+
+
+def prune_vote_buckets(now: Optional[datetime] = None) -> int:
+    """Drop the buckets that left the window and return their number."""
+    deleted, _ = VoteBucket.objects.filter(hour__lt=get_window_start(now)).delete()
+    return deleted
+
+
+def refresh_trending(now: Optional[datetime] = None) -> List[int]:
+    """Recompute the top list and cache it.
+
+    Returns:
+        The ids of the top TOP_LIST_SIZE games with a positive score, best first
+    """
+    scores = compute_trending_scores(now)
+    trending = [game_id for game_id, score in scores.items() if score > 0]
+    top = sorted(trending, key=lambda game_id: (-scores[game_id], game_id))[:TOP_LIST_SIZE]
+    cache.set(TOP_LIST_CACHE_KEY, top, TOP_LIST_CACHE_TIMEOUT)
+    return top
+
+
+def get_trending_game_ids() -> List[int]:
+    """Return the cached top list, computing it if it expired."""
+    top = cache.get(TOP_LIST_CACHE_KEY)
+    if top is None:
+        top = refresh_trending()
+    return top
+
+
+def rebuild_vote_buckets(now: Optional[datetime] = None) -> int:
+    """
+    Rebuild the buckets of the window from the votes, e.g. after deploying the rollup.
+
+    Votes are counted in the hour they were last changed; earlier values of
+    changed votes are not known anymore.
+
+    Returns:
+        The number of buckets written
+    """
+    window_start = get_window_start(now)
+    rows = (
+        Vote.objects.filter(updated_at__gte=window_start)
+        .annotate(hour=TruncHour("updated_at", tzinfo=dt_timezone.utc))
+        .values("game_id", "hour")
+        .annotate(upvotes=Count("id", filter=Q(value=1)), downvotes=Count("id", filter=Q(value=-1)))
+        .order_by()
+    )
+    buckets = [
+        VoteBucket(game_id=row["game_id"], hour=row["hour"], upvotes=row["upvotes"], downvotes=row["downvotes"])
+        for row in rows
+    ]
+    with transaction.atomic():
+        VoteBucket.objects.all().delete()
+        VoteBucket.objects.bulk_create(buckets, batch_size=1000)
+    return len(buckets)
@@ -6,5 +6,13 @@ from wiki.api import api
 urlpatterns = [
     path("", views.game_list, name="game_list"),
     path("game/<slug:slug>/", views.game_detail, name="game_detail"),
+    path("sitemap.xml", views.sitemap_index, name="sitemap_index"),
+    path("sitemap-<int:shard>.xml", views.sitemap_shard, name="sitemap_shard"),
+    path("feed.atom", views.game_feed, name="game_feed"),
+    path(
+        "images/<slug:content_hash>-<int:width>.<slug:extension>",
+        views.game_image_rendition,
+        name="game_image_rendition",
+    ),
     path("api/v1/", api.urls)
 ]
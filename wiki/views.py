@@ -1,16 +1,39 @@
 from django.shortcuts import render, get_object_or_404
-from django.http import Http404
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponsePermanentRedirect,
+    HttpResponseRedirect,
+    StreamingHttpResponse,
+)
+from core.db_router import get_read_alias, replica_reads, use_replica
+from wiki.images import EXTENSION_FORMATS, get_game_images, get_original_url, get_rendition_url
 from wiki.models import Tag, AgeGroup, Game
-from wiki.services import get_game_by_slug
+from wiki.services import build_game_list_response, get_game_by_slug, get_search_results
+from wiki.sitemaps import (
+    SITEMAP_SHARD_SIZE,
+    get_cached_feed,
+    get_cached_index,
+    get_pregenerated_path,
+    get_shard_filename,
+    stream_sitemap_shard,
+)
 
+# Must match the page size used by game_list.js
+GAMES_PER_PAGE = 20
+
+@replica_reads
 def game_list(request):
     context = {
         'tags': Tag.get_all_tags(),
         'age_groups': AgeGroup.get_all_age_groups(),
+        'initial_games': build_game_list_response(get_search_results(), 0, GAMES_PER_PAGE),
     }
 
     return render(request, 'wiki/game_list.html', context)
 
+@replica_reads
 def game_detail(request, slug):
     game = get_game_by_slug(slug)
     if not game:
@@ -18,6 +41,62 @@ def game_detail(request, slug):
     
     context = {
         'game': game,
+        'images': get_game_images(game.pk),
     }
     
     return render(request, 'wiki/game_detail.html', context)
+
+def _serve_pregenerated(name, content_type):
+    """Return a response for a document written by generate_sitemaps, if there is one."""
+    path = get_pregenerated_path(name)
+    if path is None:
+        return None
+    return FileResponse(open(path, 'rb'), content_type=content_type)
+
+def _with_replica(chunks, alias):
+    """Keep reading from the view's replica while a streamed response is generated."""
+    with use_replica(alias):
+        yield from chunks
+
+@replica_reads
+def sitemap_index(request):
+    response = _serve_pregenerated('sitemap.xml', 'application/xml')
+    if response is None:
+        response = HttpResponse(get_cached_index(request.build_absolute_uri), content_type='application/xml')
+    return response
+
+@replica_reads
+def sitemap_shard(request, shard):
+    response = _serve_pregenerated(get_shard_filename(shard), 'application/xml')
+    if response is not None:
+        return response
+
+    first_id = shard * SITEMAP_SHARD_SIZE
+    if not Game.objects.filter(id__gt=first_id, id__lte=first_id + SITEMAP_SHARD_SIZE).exists():
+        raise Http404(f"Sitemap shard {shard} is empty")
+    chunks = stream_sitemap_shard(request.build_absolute_uri, shard)
+    return StreamingHttpResponse(
+        _with_replica(chunks, get_read_alias()),
+        content_type='application/xml',
+    )
+
+@replica_reads
+def game_feed(request):
+    response = _serve_pregenerated('feed.atom', 'application/atom+xml; charset=utf-8')
+    if response is None:
+        response = HttpResponse(get_cached_feed(request.build_absolute_uri), content_type='application/atom+xml; charset=utf-8')
+    return response
+
+def game_image_rendition(request, content_hash, width, extension):
+    try:
+        url = get_rendition_url(content_hash, width, EXTENSION_FORMATS.get(extension, ''))
+    except TimeoutError:
+        # Send this request to the original while the pool finishes the rendition
+        url = get_original_url(content_hash)
+        if url is None:
+            raise Http404("Unknown image rendition")
+        return HttpResponseRedirect(url)
+    if url is None:
+        raise Http404("Unknown image rendition")
+    # Renditions never change, so the redirect to their file may be cached for good
+    return HttpResponsePermanentRedirect(url)